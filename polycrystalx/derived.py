@@ -0,0 +1,206 @@
+"""Derived quantities from cellwise stress and strain
+
+These functions operate on arrays of cell values, with tensors as arrays of
+shape (n, 3, 3), so that each quantity is computed for all cells at once.
+"""
+import numpy as np
+
+
+def hydrostatic(sig):
+    """Hydrostatic (mean) stress
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       stress tensors
+
+    Returns
+    -------
+    array (n)
+       one third of the trace of each tensor
+    """
+    return np.trace(sig, axis1=1, axis2=2) / 3.
+
+
+def pressure(sig):
+    """Hydrostatic pressure
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       stress tensors
+
+    Returns
+    -------
+    array (n)
+       the negative of the hydrostatic stress
+    """
+    return -hydrostatic(sig)
+
+
+def deviator(sig):
+    """Deviatoric part of tensors
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       tensors
+
+    Returns
+    -------
+    array (n, 3, 3)
+       deviatoric parts
+    """
+    return sig - hydrostatic(sig).reshape(-1, 1, 1) * np.identity(3)
+
+
+def invariants(sig):
+    """Stress invariants
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       stress tensors
+
+    Returns
+    -------
+    array (n, 3)
+       for each tensor, the first invariant (trace) and the second and third
+       invariants of the deviator, (I1, J2, J3)
+    """
+    dev = deviator(sig)
+    inv = np.zeros((len(sig), 3))
+    inv[:, 0] = np.trace(sig, axis1=1, axis2=2)
+    inv[:, 1] = 0.5 * np.einsum("nij,nij->n", dev, dev)
+    inv[:, 2] = np.linalg.det(dev)
+
+    return inv
+
+
+def von_mises(sig):
+    """Von Mises equivalent stress
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       stress tensors
+
+    Returns
+    -------
+    array (n)
+       von Mises stress, sqrt(3 J2)
+    """
+    dev = deviator(sig)
+    return np.sqrt(1.5 * np.einsum("nij,nij->n", dev, dev))
+
+
+def principal(sig):
+    """Principal values and directions
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       symmetric tensors
+
+    Returns
+    -------
+    values: array (n, 3)
+       principal values in descending order
+    directions: array (n, 3, 3)
+       principal directions, as columns in the same order as `values`
+    """
+    values, directions = np.linalg.eigh(sig)
+
+    return values[:, ::-1], directions[:, :, ::-1]
+
+
+def strain_energy_density(sig, eps):
+    """Elastic strain energy density
+
+    Parameters
+    ----------
+    sig: array (n, 3, 3)
+       stress tensors
+    eps: array (n, 3, 3)
+       elastic strain tensors
+
+    Returns
+    -------
+    array (n)
+       strain energy density, sig:eps / 2
+    """
+    return 0.5 * np.einsum("nij,nij->n", sig, eps)
+
+
+def hotspots(values, gids, k):
+    """Find the cells with the largest values in each grain
+
+    Parameters
+    ----------
+    values: array (n)
+       cell values
+    gids: array (n)
+       grain ID of each cell
+    k: int
+       maximum number of cells to select per grain
+
+    Returns
+    -------
+    array
+       indices of selected cells, ordered by grain ID and then by
+       decreasing value
+    """
+    order = np.lexsort((-values, gids))
+    sorted_gids = gids[order]
+    first = np.searchsorted(sorted_gids, sorted_gids, side="left")
+    rank = np.arange(len(order)) - first
+
+    return order[rank < k]
+
+
+derived_fields = (
+    "von_mises", "pressure", "stress_invariants", "principal_stress",
+    "strain_energy"
+)
+
+
+def compute(names, sig, eps, elastic_eps=None):
+    """Compute named derived fields
+
+    Parameters
+    ----------
+    names: list of str
+       names of fields, from `derived_fields`
+    sig: array (n, 3, 3)
+       stress tensors
+    eps: array (n, 3, 3)
+       strain tensors
+    elastic_eps: array (n, 3, 3), optional
+       elastic strain tensors for the strain energy; defaults to `eps`
+
+    Returns
+    -------
+    dict
+       arrays of cell values by name; "principal_stress" also adds the
+       principal directions as "principal_directions"
+    """
+    fields = {}
+    for name in names:
+        if name == "von_mises":
+            fields[name] = von_mises(sig)
+        elif name == "pressure":
+            fields[name] = pressure(sig)
+        elif name == "stress_invariants":
+            fields[name] = invariants(sig)
+        elif name == "principal_stress":
+            fields[name], fields["principal_directions"] = principal(sig)
+        elif name == "strain_energy":
+            e = eps if elastic_eps is None else elastic_eps
+            fields[name] = strain_energy_density(sig, e)
+        else:
+            avail = " | ".join(derived_fields)
+            raise ValueError(
+                f"derived field ({name}) not available: must be one of {avail}"
+            )
+
+    return fields
@@ -0,0 +1,274 @@
+"""Grain-sorted layout of cellwise fields
+
+The usual output files hold cell data in the order of the distributed mesh,
+so finding the cells of one grain means reading a whole dataset. In the
+grain-sorted layout, the cell values are permuted so that the cells of each
+grain are contiguous, in order of grain ID. The cells of grain `g` are in
+rows `offsets[g]` to `offsets[g + 1]`, so they are read with a single
+hyperslab read.
+
+The HDF5 file has these datasets:
+
+offsets: array (num_grains + 1)
+   start row of each grain, with total number of cells at the end
+cells: array (num_cells)
+   input (original) cell index of each row
+fields/<name>: array (num_cells, n)
+   values of each cellwise field, with `n` components
+
+Only h5py and numpy are needed to read the file.
+
+The same layout is used to split the grains among processes when the mesh is
+partitioned by grain (see `grain_destinations`).
+"""
+import heapq
+
+import numpy as np
+import h5py
+
+
+def grain_positions(gids, num_grains, comm=None):
+    """Find the rows of local cells in the grain-sorted layout
+
+    Within a grain, cells are ordered by process rank and then by local
+    index.
+
+    Parameters
+    ----------
+    gids: array (n) of int
+       grain ID of each local cell
+    num_grains: int
+       number of grains
+    comm: MPI communicator, optional
+       communicator of the distributed mesh; if not given, all cells are local
+
+    Returns
+    -------
+    order: array (n)
+       local cells sorted by grain
+    starts: array (num_grains)
+       row of the first local cell of each grain
+    counts: array (num_grains)
+       number of local cells in each grain
+    offsets: array (num_grains + 1)
+       start row of each grain
+    """
+    counts = np.bincount(gids, minlength=num_grains).astype(np.int64)
+    totals = counts.copy()
+    before = np.zeros_like(counts)
+    if comm is not None and comm.size > 1:
+        from mpi4py import MPI
+        comm.Allreduce(MPI.IN_PLACE, totals, op=MPI.SUM)
+        comm.Exscan(counts, before, op=MPI.SUM)
+        if comm.rank == 0:
+            before[:] = 0
+
+    offsets = np.zeros(num_grains + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(totals)
+    order = np.argsort(gids, kind="stable")
+
+    return order, offsets[:-1] + before, counts, offsets
+
+
+def grain_destinations(gids, num_grains, comm=None, weights=None,
+                       num_parts=None):
+    """Assign local cells to processes, keeping grains together
+
+    Whole grains, or pieces of heavy grains, are given to the parts by the
+    longest processing time rule (see `loaders.mesh.grain_partition`). A
+    piece is a run of the grain's rows in the grain-sorted layout.
+
+    Parameters
+    ----------
+    gids: array (n) of int
+       grain ID of each local cell, or -1 for cells with no grain
+    num_grains: int
+       number of grains
+    comm: MPI communicator, optional
+       communicator of the distributed mesh; if not given, all cells are local
+    weights: array (n), optional
+       weight of each local cell; the default is one for each cell
+    num_parts: int, optional
+       number of parts; the default is the number of processes
+
+    Returns
+    -------
+    array (n) of int32
+       new part (process) of each local cell; cells with no grain stay on
+       this process
+    """
+    rank = 0 if comm is None else comm.rank
+    if num_parts is None:
+        num_parts = 1 if comm is None else comm.size
+    if weights is None:
+        weights = np.ones(len(gids))
+    tagged = gids >= 0
+    g = gids[tagged]
+
+    order, starts, counts, offsets = grain_positions(g, num_grains, comm)
+    totals = np.diff(offsets)
+    gweights = np.bincount(g, weights=weights[tagged], minlength=num_grains)
+    if comm is not None and comm.size > 1:
+        from mpi4py import MPI
+        comm.Allreduce(MPI.IN_PLACE, gweights, op=MPI.SUM)
+
+    # Split heavy grains into pieces, then assign the pieces.
+    target = max(gweights.sum() / num_parts, np.finfo(float).tiny)
+    npieces = np.maximum(1, np.ceil(gweights / target)).astype(np.int64)
+    piece_size = np.maximum(1, -(-totals // npieces))
+    unit_offsets = np.zeros(num_grains + 1, dtype=np.int64)
+    unit_offsets[1:] = np.cumsum(npieces)
+    unit_weights = np.repeat(gweights / npieces, npieces)
+
+    unit_part = np.zeros(len(unit_weights), dtype=np.int32)
+    loads = [(0., r) for r in range(num_parts)]
+    for u in np.argsort(-unit_weights, kind="stable"):
+        load, r = heapq.heappop(loads)
+        unit_part[u] = r
+        heapq.heappush(loads, (load + unit_weights[u], r))
+
+    # Position of each local cell within its grain gives its piece; `starts`
+    # are rows of the whole layout, so the grain's offset is taken off.
+    sorted_g = g[order]
+    position = np.empty(len(g), dtype=np.int64)
+    first = np.searchsorted(sorted_g, sorted_g)
+    position[order] = (
+        (starts - offsets[:-1])[sorted_g] + np.arange(len(g)) - first
+    )
+    piece = position // piece_size[g]
+
+    dest = np.full(len(gids), rank, dtype=np.int32)
+    dest[tagged] = unit_part[unit_offsets[g] + piece]
+
+    return dest
+
+
+def write(filename, gids, cells, fields, num_grains, comm=None):
+    """Write cellwise fields in grain-sorted layout
+
+    If h5py has MPI support, the processes write the file together;
+    otherwise they write in turn.
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    gids: array (n) of int
+       grain ID of each local cell
+    cells: array (n) of int
+       input (original) index of each local cell
+    fields: dict
+       arrays (n, ...) of values on local cells, by name
+    num_grains: int
+       number of grains
+    comm: MPI communicator, optional
+       communicator of the distributed mesh; if not given, all cells are local
+    """
+    order, starts, counts, offsets = grain_positions(gids, num_grains, comm)
+    local_first = np.zeros(num_grains + 1, dtype=np.int64)
+    local_first[1:] = np.cumsum(counts)
+    sorted_values = {
+        name: np.asarray(v).reshape(len(gids), -1)[order]
+        for name, v in fields.items()
+    }
+    sorted_values["cells"] = np.asarray(cells, dtype=np.int64)[order]
+    num_cells = offsets[-1]
+
+    def create(h5):
+        h5.create_dataset("offsets", data=offsets)
+        h5.create_dataset("cells", shape=(num_cells,), dtype=np.int64)
+        for name, v in sorted_values.items():
+            if name != "cells":
+                h5.create_dataset(
+                    f"fields/{name}", shape=(num_cells, v.shape[1]),
+                    dtype=v.dtype
+                )
+
+    def fill(h5):
+        for name, v in sorted_values.items():
+            dset = h5["cells" if name == "cells" else f"fields/{name}"]
+            for g in np.flatnonzero(counts):
+                dset[starts[g]:starts[g] + counts[g]] = (
+                    v[local_first[g]:local_first[g + 1]]
+                )
+
+    if comm is None or comm.size == 1:
+        with h5py.File(filename, "w") as h5:
+            create(h5)
+            fill(h5)
+    elif h5py.get_config().mpi:
+        with h5py.File(filename, "w", driver="mpio", comm=comm) as h5:
+            create(h5)
+            fill(h5)
+    else:
+        if comm.rank == 0:
+            with h5py.File(filename, "w") as h5:
+                create(h5)
+        for rank in range(comm.size):
+            comm.Barrier()
+            if rank == comm.rank:
+                with h5py.File(filename, "a") as h5:
+                    fill(h5)
+        comm.Barrier()
+
+
+class GrainSortedFile:
+    """Reader for cellwise fields in grain-sorted layout
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with h5py.File(filename, "r") as h5:
+            self.offsets = h5["offsets"][:]
+
+    @property
+    def num_grains(self):
+        """number of grains"""
+        return len(self.offsets) - 1
+
+    def fields(self):
+        """Return list of field names"""
+        with h5py.File(self.filename, "r") as h5:
+            return list(h5["fields"])
+
+    def cells(self, gid):
+        """Return input cell indices of a grain
+
+        Parameters
+        ----------
+        gid: int
+           grain ID
+
+        Returns
+        -------
+        array
+           input (original) indices of the cells of grain `gid`
+        """
+        with h5py.File(self.filename, "r") as h5:
+            return h5["cells"][self._rows(gid)]
+
+    def grain(self, gid, name):
+        """Return values of a field on the cells of a grain
+
+        Parameters
+        ----------
+        gid: int
+           grain ID
+        name: str
+           name of field
+
+        Returns
+        -------
+        array (m, n)
+           values on the `m` cells of grain `gid`, in the order of `cells`
+        """
+        with h5py.File(self.filename, "r") as h5:
+            return h5[f"fields/{name}"][self._rows(gid)]
+
+    def _rows(self, gid):
+        return slice(self.offsets[gid], self.offsets[gid + 1])
@@ -5,4 +5,6 @@ from . import polycrystal
 from . import deformation
 from . import function
 from . import job
+from . import options
+from . import hashing
 from . import tools
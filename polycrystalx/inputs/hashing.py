@@ -0,0 +1,207 @@
+"""Hashes of input specifications
+
+The hash of an input depends only on its values, so equal inputs created in
+different sessions have the same hash. Functions are hashed by their name,
+compiled code, default arguments, closure values and the globals they use;
+arrays by their type, shape and data; and instances of other classes by
+their type and attributes. Functions, classes and modules from other modules
+than the function using them are hashed by name only. Values that cannot be
+hashed by content raise a TypeError.
+"""
+import functools
+import hashlib
+import os
+from pathlib import PurePath
+import pickle
+import types
+
+import numpy as np
+
+
+_scalars = (type(None), bool, int, float, complex, str, bytes, np.generic)
+
+
+def spec_hash(spec, length=16):
+    """Return hash of an input specification
+
+    Parameters
+    ----------
+    spec: object
+       input specification, usually a namedtuple; may contain other inputs,
+       lists, tuples, dicts, arrays, functions and scalars
+    length: int, default=16
+       number of hexadecimal digits
+
+    Returns
+    -------
+    str
+       the hash
+    """
+    h = hashlib.sha256()
+    _update(h, spec)
+
+    return h.hexdigest()[:length]
+
+
+def file_signature(filename):
+    """Return values identifying the state of a file
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of file
+
+    Returns
+    -------
+    tuple
+       absolute path, size and modification time, or only the path if the
+       file does not exist
+    """
+    path = os.path.abspath(filename)
+    if not os.path.exists(path):
+        return (path,)
+    st = os.stat(path)
+
+    return (path, st.st_size, st.st_mtime_ns)
+
+
+def _update(h, obj, seen=frozenset()):
+    """Add object to hash
+
+    `seen` holds the ids of the containers, objects and functions being
+    hashed, to stop recursion.
+    """
+    if hasattr(obj, "_fields"):
+        seen = _enter(obj, seen)
+        h.update(f"<{type(obj).__name__}".encode())
+        for name in obj._fields:
+            h.update(name.encode())
+            _update(h, getattr(obj, name), seen)
+        h.update(b">")
+    elif isinstance(obj, dict):
+        seen = _enter(obj, seen)
+        h.update(b"{")
+        for k in sorted(obj, key=repr):
+            _update(h, k, seen)
+            _update(h, obj[k], seen)
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        seen = _enter(obj, seen)
+        h.update(b"[")
+        for item in obj:
+            _update(h, item, seen)
+        h.update(b"]")
+    elif isinstance(obj, (set, frozenset)):
+        seen = _enter(obj, seen)
+        h.update(b"(")
+        for item in sorted(obj, key=repr):
+            _update(h, item, seen)
+        h.update(b")")
+    elif isinstance(obj, np.ndarray):
+        h.update(f"array{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, _scalars):
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+    elif isinstance(obj, PurePath):
+        h.update(f"path:{obj}".encode())
+    elif isinstance(obj, types.ModuleType):
+        h.update(f"module:{obj.__name__}".encode())
+    elif isinstance(obj, type):
+        h.update(f"class:{obj.__module__}.{obj.__qualname__}".encode())
+    elif isinstance(obj, types.FunctionType):
+        _update_function(h, obj, seen)
+    elif isinstance(obj, types.MethodType):
+        seen = _enter(obj, seen)
+        _update(h, obj.__func__, seen)
+        _update(h, obj.__self__, seen)
+    elif isinstance(obj, functools.partial):
+        seen = _enter(obj, seen)
+        h.update(b"partial")
+        _update(h, (obj.func, obj.args, obj.keywords), seen)
+    elif isinstance(obj, (types.BuiltinFunctionType, np.ufunc)):
+        module = getattr(obj, "__module__", None) or "numpy"
+        h.update(f"builtin:{module}.{obj.__name__}".encode())
+    elif hasattr(obj, "__dict__"):
+        seen = _enter(obj, seen)
+        h.update(f"<{type(obj).__qualname__}".encode())
+        _update(h, vars(obj), seen)
+        h.update(b">")
+    else:
+        try:
+            data = pickle.dumps(obj, protocol=4)
+        except Exception as e:
+            raise TypeError(
+                f"cannot hash {type(obj).__qualname__} by value: {e}"
+            ) from e
+        h.update(f"pickle:{type(obj).__qualname__}".encode())
+        h.update(data)
+
+
+def _enter(obj, seen):
+    """Add a container or object to `seen`, checking that it is not in it"""
+    if id(obj) in seen:
+        raise TypeError(
+            f"cannot hash {type(obj).__qualname__} by value: it refers to "
+            "itself"
+        )
+    return seen | {id(obj)}
+
+
+def _update_function(h, func, seen):
+    """Add function, with the values it depends on, to hash"""
+    h.update(f"{func.__module__}.{func.__qualname__}".encode())
+    if id(func) in seen:
+        return
+    seen = seen | {id(func)}
+
+    _update_code(h, func.__code__)
+    _update(h, func.__defaults__, seen)
+    _update(h, func.__kwdefaults__, seen)
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # The cell is empty.
+            value = None
+        _update_reference(h, func, value, seen)
+
+    for name in sorted(_global_names(func.__code__)):
+        if name in func.__globals__:
+            h.update(f"global:{name}".encode())
+            _update_reference(h, func, func.__globals__[name], seen)
+
+
+def _update_reference(h, func, value, seen):
+    """Add value used by a function to hash
+
+    Functions and classes defined in other modules are hashed by name.
+    """
+    external = (
+        isinstance(value, (types.FunctionType, type))
+        and value.__module__ != func.__module__
+    )
+    if external:
+        h.update(f"{value.__module__}.{value.__qualname__}".encode())
+    else:
+        _update(h, value, seen)
+
+
+def _global_names(code):
+    """Names of globals possibly used by compiled code and nested code"""
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _global_names(c)
+
+    return names
+
+
+def _update_code(h, code):
+    """Add compiled code to hash"""
+    h.update(code.co_code)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            _update_code(h, c)
+        else:
+            _update(h, c)
+    h.update(repr(code.co_names).encode())
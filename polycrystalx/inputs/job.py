@@ -1,7 +1,24 @@
 """Input Job Module"""
 from collections import namedtuple
+from importlib import metadata
+import json
 import pathlib
 
+from .hashing import spec_hash, file_signature
+from .options import default_options
+from .polycrystal import polycrystal_spec
+
+
+def package_version():
+    """Version of the installed polycrystalx package
+
+    The version is "unknown" if the package is not installed.
+    """
+    try:
+        return metadata.version("polycrystalx")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
 
 _JobBase = namedtuple(
     "_JobBase", ["suite", "process", "mesh_input", "material_input",
@@ -27,14 +44,19 @@ class Job(_JobBase):
        input specification for the polycrystal configuration
     deformation_input: inputs.deformation_input specification
        input deformation specification
-    options: (not yet implemented)
-       options
+    options: inputs.options.Options, optional
+       run time options
     """
 
+    @property
+    def suite_directory(self):
+        """Name of output directory for the suite"""
+        return pathlib.Path("Outputs") / f"{self.suite}"
+
     @property
     def output_directory(self):
         """Name of output directory"""
-        outbase = pathlib.Path("Outputs") / f"{self.suite}" / f"{self.process}"
+        outbase = self.suite_directory / f"{self.process}"
         name = (
             f"{self.material_input.name}"
             f"-{self.mesh_input.name}"
@@ -46,7 +68,72 @@ class Job(_JobBase):
 
         return outbase / name
 
+    @property
+    def mesh_cache_directory(self):
+        """Name of directory of cached meshes, shared by all suites"""
+        return pathlib.Path("Outputs") / "mesh-cache"
+
+    @property
+    def tag_cache_directory(self):
+        """Name of directory of cached grain IDs, shared by all suites"""
+        return pathlib.Path("Outputs") / "tag-cache"
+
     @property
     def log_file(self):
         """Name of log file"""
         return self.output_directory / "job.log"
+
+    @property
+    def results_file(self):
+        """Name of suite results store"""
+        return self.suite_directory / "results.h5"
+
+    @property
+    def results_key(self):
+        """Key for this job in the suite results store"""
+        return str(self.output_directory.relative_to(self.suite_directory))
+
+    @property
+    def run_options(self):
+        """Options for this job, using the defaults if none were given"""
+        if self.options is None:
+            return default_options
+        return self.options
+
+    @property
+    def completion_file(self):
+        """Name of file recording the inputs of the completed job"""
+        return self.output_directory / "job-inputs.json"
+
+    @property
+    def input_record(self):
+        """Hashes of the inputs of this job and the package version
+
+        The "input_hash" depends on the process, all the inputs, including
+        the state of the mesh and voxel image files, if any, the options and
+        the package version.
+        """
+        mesh_spec = (self.mesh_input,)
+        if self.mesh_input.file is not None:
+            mesh_spec += file_signature(self.mesh_input.file)
+        record = {
+            "mesh": spec_hash(mesh_spec),
+            "material": spec_hash(self.material_input),
+            "polycrystal": spec_hash(polycrystal_spec(self.polycrystal_input)),
+            "deformation": spec_hash(self.deformation_input),
+            "options": spec_hash(self.run_options),
+            "version": package_version(),
+        }
+        record["input_hash"] = spec_hash((self.process, record))
+
+        return record
+
+    def is_complete(self):
+        """Return True if the job was completed with the same inputs"""
+        try:
+            with open(self.completion_file) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        return saved.get("input_hash") == self.input_record["input_hash"]
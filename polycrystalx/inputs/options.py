@@ -1,11 +1,397 @@
 """Run time options"""
 from collections import namedtuple
 
+import numpy as np
 
-Options = namedtuple(
-    "Options", ["name", "tolerance", "maxiter", "save_pvd", "save_hdf5", "outdir"]
+from ..derived import derived_fields
+from ..mixing import mixing_rules
+
+
+Probe = namedtuple("Probe", ["name", "points", "fields"], defaults=[None])
+Probe.__doc__ = """Point probe
+
+Values of the output fields are saved at the given points.
+
+Parameters
+----------
+name: str
+    name of this probe
+points: array(n, 3)
+    probe points
+fields: list of str, optional
+    names of fields to evaluate; by default, all fields are evaluated
+"""
+
+
+_Slice = namedtuple(
+    "_Slice", ["name", "origin", "normal", "extents", "divisions", "fields"],
+    defaults=[None]
+)
+
+
+class Slice(_Slice):
+    """Planar slice
+
+    Values of the output fields are saved on a regular grid of points on a
+    plane. The grid is in the plane coordinates (u, v), measured from the
+    `origin` along two orthonormal directions perpendicular to the `normal`.
+
+    Parameters
+    ----------
+    name: str
+        name of this slice
+    origin: array(3)
+        a point on the plane
+    normal: array(3)
+        normal to the plane
+    extents: array(2, 2)
+        lower and upper bounds of the grid in the u and v directions
+    divisions: 2-tuple of int
+        number of grid divisions in the u and v directions
+    fields: list of str, optional
+        names of fields to evaluate; by default, all fields are evaluated
+    """
+
+    @property
+    def axes(self):
+        """unit vectors in the u and v directions, as rows"""
+        n = np.asarray(self.normal, dtype=np.float64)
+        n = n / np.linalg.norm(n)
+        e = np.identity(3)[np.argmin(np.abs(n))]
+        u = np.cross(n, e)
+        u /= np.linalg.norm(u)
+
+        return np.array([u, np.cross(n, u)])
+
+    @property
+    def shape(self):
+        """shape of the grid of points"""
+        return (self.divisions[0] + 1, self.divisions[1] + 1)
+
+    @property
+    def points(self):
+        """grid points, as an array of shape (n, 3)"""
+        (u0, u1), (v0, v1) = self.extents
+        u, v = np.meshgrid(
+            np.linspace(u0, u1, self.shape[0]),
+            np.linspace(v0, v1, self.shape[1]), indexing="ij"
+        )
+        uv = np.stack([u.ravel(), v.ravel()], axis=1)
+
+        return np.asarray(self.origin, dtype=np.float64) + uv @ self.axes
+
+
+Adaptive = namedtuple(
+    "Adaptive", ["marker", "max_levels", "tolerance", "fraction"],
+    defaults=["grain_boundary", 3, 1e-3, 0.5]
+)
+Adaptive.__doc__ = """Adaptive refinement for linear elasticity
+
+The problem is solved, cells are marked and refined, and the problem is
+solved again on the refined mesh, until the grain-averaged stresses change by
+less than the tolerance or the maximum number of refinements is reached.
+
+Parameters
+----------
+marker: {"grain_boundary", "stress_error"}, default="grain_boundary"
+    "grain_boundary" marks the cells sharing a facet with a cell of another
+    grain; "stress_error" marks the cells with the largest difference between
+    the cellwise stress and the nodally recovered stress
+max_levels: int, default=3
+    maximum number of refinements
+tolerance: float, default=1e-3
+    tolerance on the relative change in grain-averaged stresses between
+    refinements
+fraction: float, default=0.5
+    for "stress_error", cells are marked where the indicator is at least this
+    fraction of its maximum
+"""
+
+
+Convergence = namedtuple(
+    "Convergence", ["divisions", "tolerance", "fields"],
+    defaults=[1e-3, ("strain", "stress")]
+)
+Convergence.__doc__ = """Mesh convergence study for linear elasticity
+
+The job is run on box meshes with increasing divisions, using the solution
+on each mesh as the initial guess on the next. The study stops as soon as
+the grain averages change by less than the tolerance between meshes.
+
+Parameters
+----------
+divisions: list
+    mesh divisions of each level, from coarsest to finest; each is given as
+    for the mesh input
+tolerance: float, default=1e-3
+    tolerance on the relative change in grain averages between levels
+fields: list of str, default=("strain", "stress")
+    fields whose grain averages are compared
+"""
+
+
+Submodel = namedtuple(
+    "Submodel", ["extents", "divisions", "celltype"], defaults=[None]
 )
-Options.__doc__ = """Options
+Submodel.__doc__ = """Submodel of a box in the specimen for linear elasticity
+
+The job is first solved on its own (coarse) mesh. Then a fine box mesh of the
+submodel region is made, the coarse displacement is interpolated onto it, and
+the problem is solved on the box with that displacement on its whole
+boundary. The outputs are written for the submodel.
+
+Parameters
+----------
+extents: array(d, 2)
+    the min and max of each coordinate of the box, which should be inside
+    the specimen
+divisions: int or tuple of int
+    divisions of the box mesh
+celltype: str, optional
+    cell type of the box mesh; the default is that of the job's mesh, or
+    "tetrahedron"
+"""
+
+
+Subcell = namedtuple(
+    "Subcell", ["degree", "mixing"], defaults=[2, "hill"]
+)
+Subcell.__doc__ = """Sub-cell sampling of grains for linear elasticity
+
+The grain IDs are sampled at the quadrature points of each cell, giving the
+volume fraction of each grain in the cell. Cells with more than one grain get
+a stiffness mixed from the grains' stiffnesses, and grain volumes and
+averages are weighted by the fractions. Each cell is tagged with the grain
+with the largest fraction.
+
+Parameters
+----------
+degree: int, default=2
+    degree of the quadrature rule giving the sample points
+mixing: {"voigt", "reuss", "hill"}, default="hill"
+    rule for mixing the stiffness: the average stiffness (Voigt), the
+    inverse of the average compliance (Reuss), or the mean of the two (Hill)
 """
 
-_defaults = []
+
+_Options = namedtuple(
+    "_Options",
+    ["name", "tolerance", "maxiter", "save_pvd", "save_hdf5", "outdir",
+     "output_format", "async_output", "output_queue_size", "chunk_size",
+     "results_store", "shared_mesh", "derived_fields", "hotspots",
+     "grain_sorted", "roi_grains", "roi_box", "probes", "mesh_cache",
+     "grain_partition", "adaptive", "subcell", "num_threads",
+     "tag_cache", "convergence", "submodel"],
+    defaults=6 * [None] + [
+        "xdmf", False, 2, None, False, False, (), 0, False, None, None, (),
+        False, False, None, None, None, False, None, None
+    ]
+)
+
+
+class Options(_Options):
+    """Run time options
+
+    Options are not required for a job. When they are given, the `name` is
+    added to the job's output directory, so jobs with different options do
+    not overwrite each other.
+
+    Parameters
+    ----------
+    name: str
+        name of this set of options
+    tolerance: float
+        (not yet implemented)
+    maxiter: int
+        (not yet implemented)
+    save_pvd: bool
+        (not yet implemented)
+    save_hdf5: bool
+        (not yet implemented)
+    outdir: str
+        (not yet implemented)
+    output_format: {"xdmf", "vtx"}, default="xdmf"
+        format for field output; "xdmf" writes `output.xdmf` (with HDF5
+        data), and "vtx" writes ADIOS2 (BP) files using the dolfinx VTX
+        writer
+    async_output: bool, default=False
+        if True, write field output in a background thread so that the
+        process can continue while the files are written; this requires MPI
+        with thread support (MPI_THREAD_MULTIPLE)
+    output_queue_size: int, default=2
+        maximum number of pending background writes
+    chunk_size: int, optional
+        number of cells evaluated at a time when computing grain averages
+        and assigning grain IDs; if not given, all cells are evaluated at
+        once for grain averages, and 65536 at a time for grain IDs
+    results_store: bool, default=False
+        if True, the grain averages are also added to the suite results store
+        (see `polycrystalx.results`), `results.h5` in the suite output
+        directory
+    shared_mesh: bool, default=False
+        if True, the mesh and grain IDs are written once to a file shared by
+        all jobs of the suite with the same mesh, polycrystal and number of
+        processes (in the suite's "meshes" directory), and each job's
+        `output.xdmf` refers to it; only used for "xdmf" output
+    derived_fields: list of str, default=()
+        cellwise quantities derived from the stress and strain for linear
+        elasticity, written with the output fields and averaged over grains;
+        any of "von_mises", "pressure", "stress_invariants" (I1, J2, J3),
+        "principal_stress" (which also writes "principal_directions") and
+        "strain_energy"
+    hotspots: int, default=0
+        number of cells with the highest von Mises stress to record for each
+        grain (linear elasticity only); these are saved as "hotspot_cells"
+        (input cell indices) and "hotspot_von_mises" with the grain averages
+    grain_sorted: bool, default=False
+        if True, the cellwise fields are also written to `grain-sorted.h5`
+        with the cells of each grain stored contiguously (see
+        `polycrystalx.grain_layout`)
+    roi_grains: list of int, optional
+        grain IDs of a region of interest; if given, the field output is
+        written only for the cells of these grains, on a submesh; grain
+        averages are still computed for all grains
+    roi_box: array(d, 2), optional
+        bounding box of a region of interest, with lower and upper bounds in
+        each direction; if given, the field output is written only for cells
+        with midpoints in the box; with `roi_grains`, cells must be in both
+    probes: list of Probe or Slice, default=()
+        points and planes where field values are saved, in `probes.npz`
+    mesh_cache: bool, default=False
+        if True, the distributed mesh and its tags are saved in the mesh
+        cache (`Outputs/mesh-cache`) and later jobs with the same mesh inputs
+        and number of processes read it from there instead of making and
+        partitioning the mesh again
+    grain_partition: bool, default=False
+        if True, the mesh is repartitioned after the grain IDs are assigned,
+        so that each grain is on as few processes as possible while the
+        numbers of cells on the processes stay balanced
+    adaptive: Adaptive, optional
+        if given, the linear elasticity problem is solved with adaptive mesh
+        refinement
+    subcell: Subcell, optional
+        if given, grains are sampled at several points in each cell, and cells
+        with more than one grain get a mixed stiffness (linear elasticity)
+    num_threads: int, optional
+        number of threads assigning grain IDs on each process; the default
+        is the number of cores available to the process
+    tag_cache: bool, default=False
+        if True, the grain IDs of the cells and the grain volumes are saved in
+        `Outputs/tag-cache` the first time, and read by later jobs with the
+        same mesh, microstructure (apart from orientations and phases) and
+        number of processes
+    convergence: Convergence, optional
+        if given, the linear elasticity problem is solved on a sequence of
+        box meshes until the grain averages converge
+    submodel: Submodel, optional
+        if given, the linear elasticity problem is solved on the job's mesh
+        and then on a fine mesh of the submodel box, driven by the coarse
+        displacement
+    """
+
+    output_formats = ("xdmf", "vtx")
+
+    def __init__(self, *args, **kwargs):
+        super(__class__, self).__init__()
+        self.check_inputs()
+
+    @property
+    def roi(self):
+        """True if a region of interest is given"""
+        return self.roi_grains is not None or self.roi_box is not None
+
+    def check_inputs(self):
+
+        if self.output_format not in self.output_formats:
+            emsg = (
+                f'output format "{self.output_format}" not available: '
+                '"output_format" must be one of "xdmf" | "vtx"'
+            )
+            raise RuntimeError(emsg)
+
+        for name in self.derived_fields:
+            if name not in derived_fields:
+                avail = " | ".join(f'"{f}"' for f in derived_fields)
+                emsg = (
+                    f'derived field "{name}" not available: '
+                    f'"derived_fields" must be from {avail}'
+                )
+                raise RuntimeError(emsg)
+
+        if self.hotspots < 0:
+            emsg = '"hotspots" must be nonnegative'
+            raise RuntimeError(emsg)
+
+        if self.roi_box is not None:
+            box = np.asarray(self.roi_box)
+            bad_shape = box.ndim != 2 or box.shape[1] != 2
+            if bad_shape or np.any(box[:, 0] > box[:, 1]):
+                emsg = (
+                    '"roi_box" must be an array of (lower, upper) bounds in '
+                    'each direction'
+                )
+                raise RuntimeError(emsg)
+
+        if self.adaptive is not None:
+            markers = ("grain_boundary", "stress_error")
+            if self.adaptive.marker not in markers:
+                emsg = (
+                    f'adaptive marker "{self.adaptive.marker}" not available: '
+                    '"marker" must be one of '
+                    '"grain_boundary" | "stress_error"'
+                )
+                raise RuntimeError(emsg)
+
+        drivers = [
+            name for name in ("adaptive", "convergence", "submodel")
+            if getattr(self, name) is not None
+        ]
+        if len(drivers) > 1:
+            emsg = f"options cannot be used together: {drivers}"
+            raise RuntimeError(emsg)
+        if self.shared_mesh and drivers:
+            emsg = (
+                f'"shared_mesh" cannot be used with "{drivers[0]}", which '
+                'changes the mesh'
+            )
+            raise RuntimeError(emsg)
+
+        if self.submodel is not None:
+            ext = np.asarray(self.submodel.extents, dtype=np.float64)
+            if ext.ndim != 2 or ext.shape[1] != 2 or np.any(
+                    ext[:, 0] >= ext[:, 1]
+            ):
+                emsg = (
+                    "submodel extents must be an array of shape (d, 2) "
+                    "with lower bounds less than upper bounds"
+                )
+                raise RuntimeError(emsg)
+
+        if self.convergence is not None:
+            unknown = set(self.convergence.fields) - {"strain", "stress"}
+            if unknown:
+                emsg = (
+                    f"convergence fields not available: {sorted(unknown)}: "
+                    'fields must be "strain" or "stress"'
+                )
+                raise RuntimeError(emsg)
+
+        if self.subcell is not None:
+            if self.subcell.mixing not in mixing_rules:
+                emsg = (
+                    f'subcell mixing rule "{self.subcell.mixing}" not '
+                    'available: "mixing" must be one of '
+                    '"voigt" | "reuss" | "hill"'
+                )
+                raise RuntimeError(emsg)
+
+        if self.num_threads is not None and self.num_threads < 1:
+            emsg = '"num_threads" must be at least 1'
+            raise RuntimeError(emsg)
+
+        if self.output_queue_size < 1:
+            emsg = '"output_queue_size" must be at least 1'
+            raise RuntimeError(emsg)
+
+
+default_options = Options()
@@ -1,10 +1,13 @@
 """Polycrystal input templates"""
 from collections import namedtuple
+from pathlib import Path
+
+from .hashing import file_signature
 
 
 Polycrystal = namedtuple(
-    "Polycrystal", ["name", "polycrystal", "use_meshtags"],
-    defaults=[False]
+    "Polycrystal", ["name", "polycrystal", "use_meshtags", "voronoi_seeds"],
+    defaults=[False, False]
 )
 Polycrystal.__doc__ = """Polycrystal input for Elasticity
 
@@ -21,6 +24,11 @@ polycrystal: (microstructure) Microstructure
     microstructure
 use_meshtags: bool
     if True, grain IDs are read with the mesh as cell_tags (gmsh option)
+voronoi_seeds: bool, default=False
+    if True, the microstructure is an unweighted, non-periodic Voronoi
+    tessellation of its `seeds`, with grain `i` the cell of seed `i`; grain
+    IDs are then found in a KD-tree of the seeds instead of with the
+    microstructure's `grain` method
 
 .. _notes:
 
@@ -29,3 +37,81 @@ Notes
 Here, we use a companion package, *microstructure*, to define materials and
 polycrystal configurations.
 """
+
+
+Voxels = namedtuple(
+    "Voxels",
+    ["grain_ids", "orientations", "origin", "spacing", "dataset", "phases",
+     "order"],
+    defaults=[None, 1.0, "grain_ids", None, "xyz"]
+)
+Voxels.__doc__ = """Voxel image microstructure
+
+A voxel image can be given as the `polycrystal` of the Polycrystal input.
+Each cell gets the grain ID of the voxel containing its midpoint; midpoints
+outside the image get the ID of the nearest voxel. When the image is in a
+file, each process reads only the block of voxels covering its cells.
+
+Parameters
+----------
+grain_ids: array or str
+    grain ID of each voxel, as an array or the name of an HDF5 or `.npy` file
+orientations: array(n, 3, 3)
+    orientation matrix of each grain
+origin: array(d), optional
+    lower corner of the image; the default is the origin
+spacing: float or array(d), default=1.0
+    size of the voxels
+dataset: str, default="grain_ids"
+    name of the dataset in an HDF5 file
+phases: array(n) of int, optional
+    phase of each grain; by default, all grains have phase 0
+order: {"xyz", "zyx"}, default="xyz"
+    order of the image axes; "zyx" is used by DREAM3D, for example
+"""
+
+
+def microstructure_spec(microstructure):
+    """Values of a microstructure that determine its grain IDs
+
+    Parameters
+    ----------
+    microstructure: Microstructure or inputs.polycrystal.Voxels
+       the microstructure input
+
+    Returns
+    -------
+    object
+       specification to hash, without orientations and phases
+    """
+    if isinstance(microstructure, Voxels):
+        spec = microstructure._replace(orientations=None, phases=None)
+        if isinstance(spec.grain_ids, (str, Path)):
+            return (spec, file_signature(spec.grain_ids))
+        return spec
+
+    attributes = {
+        k: v for k, v in vars(microstructure).items()
+        if "orient" not in k and "phase" not in k
+    }
+    return (type(microstructure).__qualname__, attributes)
+
+
+def polycrystal_spec(polycrystal_input):
+    """Values of a polycrystal input, with the state of its voxel file
+
+    Parameters
+    ----------
+    polycrystal_input: inputs.polycrystal.Polycrystal
+       the polycrystal input
+
+    Returns
+    -------
+    object
+       specification to hash; a voxel image file adds its signature
+    """
+    microstructure = polycrystal_input.polycrystal
+    if (isinstance(microstructure, Voxels)
+            and isinstance(microstructure.grain_ids, (str, Path))):
+        return (polycrystal_input, file_signature(microstructure.grain_ids))
+    return polycrystal_input
@@ -1,5 +1,7 @@
 """Mesh and function spaces"""
 import collections
+import os
+from pathlib import Path
 
 import numpy as np
 import dolfinx
@@ -7,6 +9,11 @@ import dolfinx
 from mpi4py import MPI
 
 from . boundary import initialize_boundary_dict
+from . grain_partition import grain_destinations, repartition
+from . partitioned import (
+    read_partitioned, write_partitioned, partitioned_file, is_converted
+)
+from ...inputs.hashing import spec_hash, file_signature
 
 
 class MeshLoader:
@@ -16,6 +23,14 @@ class MeshLoader:
     ----------
     userinput: inputs.mesh.Mesh
        input mesh specification
+    cache_dir: str or Path, optional
+       directory of the mesh cache; if given, the distributed mesh and its
+       tags are read from the cache when available, and otherwise saved
+       there after the mesh is made
+    msh: dolfinx Mesh, optional
+       mesh to use instead of making one from the input (see `from_mesh`)
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the mesh; ignored if `msh` is given
     """
     _CT = dolfinx.mesh.CellType
     celldict = {
@@ -29,17 +44,92 @@ class MeshLoader:
         "point": _CT.point,
     }
 
-    def __init__(self, userinput):
+    def __init__(self, userinput, cache_dir=None, msh=None,
+                 comm=MPI.COMM_WORLD):
         self.userinput = userinput
+        self.cache_dir = cache_dir
+        self.comm = comm if msh is None else msh.comm
 
         self._extents = userinput.extents
-        self._mesh = self._make_mesh()
+        self._derived = msh is not None
+        if msh is None:
+            self._mesh = self._load_mesh()
+        else:
+            self._mesh = msh
+            self.cell_tags = None
+            self.facet_tags = None
         self.tdim = self._mesh.topology.dim
         self.bdim = self.tdim - 1
         self._bsecs = userinput.boundary_sections
         #
         self._boundary_dict = self._make_boundary_dict()
 
+    @classmethod
+    def from_mesh(cls, userinput, msh, cell_tags=None):
+        """Make loader for a mesh derived from the input, e.g. by refinement
+
+        Parameters
+        ----------
+        userinput: inputs.mesh.Mesh
+           input mesh specification, for the extents and boundary sections
+        msh: dolfinx Mesh
+           the mesh
+        cell_tags: dolfinx MeshTags, optional
+           cell tags on `msh`
+
+        Returns
+        -------
+        MeshLoader
+           loader using `msh`
+        """
+        loader = cls(userinput, msh=msh)
+        loader.cell_tags = cell_tags
+
+        return loader
+
+    @property
+    def cache_key(self):
+        """Key of the mesh in the cache
+
+        The key depends on the inputs that define the mesh (not its name or
+        boundary sections), the state of the mesh file, if any, and the
+        number of processes.
+        """
+        ui = self.userinput
+        spec = (ui.source, ui.extents, ui.divisions, ui.celltype)
+        if ui.file is not None:
+            spec += file_signature(ui.file)
+
+        return f"{spec_hash(spec)}-np{self.comm.size}"
+
+    def _load_mesh(self):
+        if self.cache_dir is None:
+            return self._make_mesh()
+
+        comm = self.comm
+        name = f"{self.userinput.name}-{self.cache_key}.h5"
+        fname = Path(self.cache_dir) / name
+        cached = comm.bcast(fname.exists() if comm.rank == 0 else None)
+        if cached:
+            msh, self.cell_tags, self.facet_tags = read_partitioned(
+                fname, comm
+            )
+            return msh
+
+        # Write to a temporary file first, so other jobs never read a
+        # partially written cache.
+        msh = self._make_mesh()
+        tmp = fname.with_suffix(f".{comm.bcast(os.getpid())}.tmp")
+        if comm.rank == 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        comm.Barrier()
+        write_partitioned(tmp, msh, self.cell_tags, self.facet_tags)
+        if comm.rank == 0:
+            os.replace(tmp, fname)
+        comm.Barrier()
+
+        return msh
+
     def _make_mesh(self):
         self.cell_tags = None
         self.facet_tags = None
@@ -62,14 +152,12 @@ class MeshLoader:
         else:
             return None
 
-    def _make_box_mesh(self):
-        ext = self.extents
+    def _box_divisions(self):
         udiv = self.userinput.divisions
-        cell = self.userinput.celltype
-        dim = len(ext)
+        dim = len(self.extents)
         # `divsions` can an int, a tuple, a list or a numpy array.
         if isinstance(udiv, int):
-            divs = dim * (x,)
+            divs = dim * (udiv,)
         elif isinstance(udiv, collections.abc.Sequence) or\
              isinstance(udiv, np.ndarray):
             if len(udiv) == dim:
@@ -83,17 +171,43 @@ class MeshLoader:
         else:
             raise ValueError(f"divisions spec not recognized: {udiv}")
 
+        return tuple(int(n) for n in divs)
+
+    def _make_box_mesh(self):
+        ext = self.extents
+        cell = self.userinput.celltype
+
         msh = dolfinx.mesh.create_box(
-            comm=MPI.COMM_WORLD,
+            comm=self.comm,
             points=(ext[:, 0], ext[:, 1]),
-            n=divs,
+            n=self._box_divisions(),
             cell_type=self.celldict[cell],
         )
         return msh
 
+    @property
+    def structured_grid(self):
+        """Grid of a hexahedral box mesh, or None for other meshes
+
+        For hexahedral box meshes, the cell with original index
+        `ix + nx * (iy + ny * iz)` is the grid cell (ix, iy, iz).
+
+        Returns
+        -------
+        tuple or None
+           lower corner, cell size and divisions of the grid
+        """
+        ui = self.userinput
+        if self._derived or ui.source != "box" or ui.celltype != "hexahedron":
+            return None
+        ext = self.extents
+        divs = np.array(self._box_divisions())
+
+        return ext[:, 0], (ext[:, 1] - ext[:, 0]) / divs, tuple(divs)
+
     def _read_xdmf(self):
         fname = self.userinput.file
-        with dolfinx.io.XDMFFile(MPI.COMM_WORLD, fname, "r") as f:
+        with dolfinx.io.XDMFFile(self.comm, fname, "r") as f:
             m = f.read_mesh()
             try:
                 self.cell_tags = f.read_meshtags(m, "grain-ids")
@@ -104,8 +218,14 @@ class MeshLoader:
 
     def _read_gmsh(self):
         fname = self.userinput.file
+        if is_converted(fname):
+            msh, self.cell_tags, self.facet_tags = read_partitioned(
+                partitioned_file(fname), self.comm
+            )
+            return msh
+
         msh, self.cell_tags, self.facet_tags = dolfinx.io.gmshio.read_from_msh(
-            fname, MPI.COMM_WORLD, 0
+            fname, self.comm, 0
         )
         return msh
 
@@ -114,13 +234,42 @@ class MeshLoader:
         d = initialize_boundary_dict(self.mesh, self.extents)
 
         for bsec in self._bsecs:
-            facets = dolfinx.mesh.locate_entities_boundary(
-                self.mesh, self.bdim, bsec.on_section
-            )
-            d[bsec.name] = facets
+            d.add(bsec.name, bsec.on_section)
 
         return d
 
+    def repartition_by_grain(self, cell_tags, num_grains, weights=None):
+        """Repartition the mesh to keep grains on as few processes as possible
+
+        The mesh, its tags and the boundary dictionary are replaced.
+
+        Parameters
+        ----------
+        cell_tags: dolfinx MeshTags
+           grain IDs
+        num_grains: int
+           number of grains
+        weights: array, optional
+           weight of each local cell; the default is one for each cell
+
+        Returns
+        -------
+        dolfinx MeshTags
+           grain IDs on the new mesh
+        """
+        num_cells = self.mesh.topology.index_map(self.tdim).size_local
+        gids = np.full(num_cells, -1, dtype=np.int32)
+        owned = cell_tags.indices < num_cells
+        gids[cell_tags.indices[owned]] = cell_tags.values[owned]
+
+        dest = grain_destinations(gids, num_grains, self.mesh.comm, weights)
+        self._mesh, self.cell_tags, self.facet_tags = repartition(
+            self.mesh, cell_tags, dest, self.facet_tags
+        )
+        self._boundary_dict = self._make_boundary_dict()
+
+        return self.cell_tags
+
     @property
     def mesh(self):
         """Return the dolfinx Mesh"""
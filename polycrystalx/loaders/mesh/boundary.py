@@ -1,4 +1,6 @@
 """Tools for loading boundary sections"""
+import collections
+
 import numpy as np
 import dolfinx
 
@@ -55,6 +57,85 @@ class XYZBoundary:
         return (xi - self.value) * self.sign > -self.EPS
 
 
+class BoundaryDict(collections.abc.Mapping):
+    """Dictionary of boundary sections, evaluated on demand
+
+    The exterior facets and the coordinates of their vertices are found once,
+    when the dictionary is created. Each section is given by a function of
+    position, which is evaluated on the boundary vertices the first time the
+    section is looked up; a facet is in the section if all of its vertices
+    are. The resulting facets are kept for later lookups.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    """
+
+    def __init__(self, msh):
+        tdim = msh.topology.dim
+        bdim = tdim - 1
+        msh.topology.create_connectivity(bdim, tdim)
+        msh.topology.create_connectivity(bdim, 0)
+        self._facets = dolfinx.mesh.exterior_facet_indices(msh.topology)
+
+        # Flatten the facet vertices and find the coordinates of each unique
+        # boundary vertex.
+        f2v = msh.topology.connectivity(bdim, 0)
+        starts = f2v.offsets[self._facets]
+        counts = f2v.offsets[self._facets + 1] - starts
+        self._starts = np.zeros(len(counts), dtype=np.int64)
+        self._starts[1:] = np.cumsum(counts)[:-1]
+        index = (
+            np.repeat(starts - self._starts, counts)
+            + np.arange(np.sum(counts))
+        )
+        vertices, self._facet_vertices = np.unique(
+            f2v.array[index], return_inverse=True
+        )
+        gdofs = dolfinx.mesh.entities_to_geometry(
+            msh, 0, vertices.astype(np.int32)
+        )
+        self._x = msh.geometry.x[gdofs.reshape(-1)].T
+
+        self._sections = {"boundary": None}
+        self._cache = {"boundary": self._facets}
+
+    def add(self, name, on_section):
+        """Add a boundary section
+
+        Parameters
+        ----------
+        name: str
+           name of section
+        on_section: function
+           boolean function of position, array(d, n), giving True for points
+           on the section
+        """
+        self._sections[name] = on_section
+        self._cache.pop(name, None)
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            on_section = self._sections[name]
+            marked = np.asarray(on_section(self._x), dtype=bool)
+            if len(self._facets) == 0:
+                in_section = np.zeros(0, dtype=bool)
+            else:
+                in_section = np.logical_and.reduceat(
+                    marked[self._facet_vertices], self._starts
+                )
+            self._cache[name] = self._facets[in_section]
+
+        return self._cache[name]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+
 def initialize_boundary_dict(msh, extents):
     """Initialize boundary dictionary
 
@@ -70,7 +151,7 @@ def initialize_boundary_dict(msh, extents):
 
     Returns
     -------
-    dict
+    BoundaryDict
        dictionary with the boundary name as key and the array of facets as
        value
     """
@@ -78,49 +159,18 @@ def initialize_boundary_dict(msh, extents):
     X, Y, Z = 0, 1, 2
     MIN, MAX = 0, 1
 
-    bdim = msh.topology.dim - 1
-    anycell = lambda x:  np.ones(x.shape[1], dtype=bool)
-    allcells = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, anycell
-    )
-    d = {"boundary": allcells}
+    d = BoundaryDict(msh)
 
     if extents is None: return d
 
     # If extents are given, add one section for each flat surface.
 
-    on_xmin = Bndry(Bndry.X, extents[X, MIN], Bndry.MIN).on_boundary
-    on_ymin = Bndry(Bndry.Y, extents[Y, MIN], Bndry.MIN).on_boundary
-    on_zmin = Bndry(Bndry.Z, extents[Z, MIN], Bndry.MIN).on_boundary
+    d.add("xmin", Bndry(Bndry.X, extents[X, MIN], Bndry.MIN).on_boundary)
+    d.add("ymin", Bndry(Bndry.Y, extents[Y, MIN], Bndry.MIN).on_boundary)
+    d.add("zmin", Bndry(Bndry.Z, extents[Z, MIN], Bndry.MIN).on_boundary)
     #
-    on_xmax = Bndry(Bndry.X, extents[X, MAX], Bndry.MAX).on_boundary
-    on_ymax = Bndry(Bndry.Y, extents[Y, MAX], Bndry.MAX).on_boundary
-    on_zmax = Bndry(Bndry.Z, extents[Z, MAX], Bndry.MAX).on_boundary
-
-    facets_xmin = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_xmin
-    )
-    facets_ymin = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_ymin
-    )
-    facets_zmin = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_zmin
-    )
-    facets_xmax = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_xmax
-    )
-    facets_ymax = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_ymax
-    )
-    facets_zmax = dolfinx.mesh.locate_entities_boundary(
-        msh, bdim, on_zmax
-    )
-
-    d["xmin"] = facets_xmin
-    d["ymin"] = facets_ymin
-    d["zmin"] = facets_zmin
-    d["xmax"] = facets_xmax
-    d["ymax"] = facets_ymax
-    d["zmax"] = facets_zmax
+    d.add("xmax", Bndry(Bndry.X, extents[X, MAX], Bndry.MAX).on_boundary)
+    d.add("ymax", Bndry(Bndry.Y, extents[Y, MAX], Bndry.MAX).on_boundary)
+    d.add("zmax", Bndry(Bndry.Z, extents[Z, MAX], Bndry.MAX).on_boundary)
 
     return d
@@ -0,0 +1,254 @@
+"""Grain-aware mesh partitioning
+
+The default partitioner balances cells but ignores the grains, so most grains
+are split over several processes. Here, whole grains are assigned to
+processes by the longest processing time rule: grains are taken in order of
+decreasing weight, each going to the process with the least weight so far.
+Grains heavier than the average weight per process are first split into
+pieces of about that weight, so the processes stay balanced.
+"""
+import numpy as np
+import basix.ufl
+import dolfinx
+from dolfinx import log
+import ufl
+from mpi4py import MPI
+
+from ...grain_layout import grain_destinations
+from .partitioned import facet_entities, _block_bounds, _to_blocks
+
+
+def repartition(msh, cell_tags, destinations, facet_tags=None):
+    """Make a new mesh with the cells moved to the given processes
+
+    The original cell and node indices are kept.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       cell tags (grain IDs)
+    destinations: array (n) of int
+       new process of each local cell
+    facet_tags: dolfinx MeshTags, optional
+       facet tags
+
+    Returns
+    -------
+    new_mesh: dolfinx Mesh
+       the repartitioned mesh
+    new_cell_tags: dolfinx MeshTags
+       the cell tags on the new mesh
+    new_facet_tags: dolfinx MeshTags or None
+       the facet tags on the new mesh, if given
+    """
+    tdim = msh.topology.dim
+    num_cells = msh.topology.index_map(tdim).size_local
+    original = np.asarray(msh.topology.original_cell_index)[:num_cells]
+    input_nodes = np.asarray(msh.geometry.input_global_indices)
+    new_mesh, new_cell_tags = _remake(
+        msh, cell_tags, destinations, original, input_nodes, msh.comm
+    )
+
+    new_facet_tags = None
+    if facet_tags is not None:
+        fdim = tdim - 1
+        entities, fvalues = facet_entities(msh, facet_tags)
+        new_mesh.topology.create_connectivity(fdim, tdim)
+        entities, fvalues = dolfinx.io.distribute_entity_data(
+            new_mesh, fdim, entities, fvalues.astype(np.int32)
+        )
+        new_mesh.topology.create_connectivity(fdim, 0)
+        new_facet_tags = dolfinx.mesh.meshtags_from_entities(
+            new_mesh, fdim, dolfinx.graph.adjacencylist(entities)._cpp_object,
+            fvalues.astype(np.int32)
+        )
+
+    return new_mesh, new_cell_tags, new_facet_tags
+
+
+def copy_mesh(msh, cell_tags, comm):
+    """Copy a mesh onto another communicator, keeping the cells in place
+
+    Each process keeps its cells, so the copy has the same distribution, but
+    its index maps use `comm`. The original cell index of each cell of the
+    copy is the global index of the cell in `msh`, and the input index of
+    each node is its global index in the geometry of `msh`; they are valid
+    for any mesh, including submeshes.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       cell tags (grain IDs)
+    comm: MPI communicator
+       communicator of the copy, with the same processes as the mesh's,
+       such as a duplicate
+
+    Returns
+    -------
+    new_mesh: dolfinx Mesh
+       the copy
+    new_cell_tags: dolfinx MeshTags
+       the cell tags on the copy
+    """
+    tdim = msh.topology.dim
+    cell_map = msh.topology.index_map(tdim)
+    num_cells = cell_map.size_local
+    cells = np.arange(*cell_map.local_range, dtype=np.int64)
+    nodes = msh.geometry.index_map().local_to_global(
+        np.arange(len(msh.geometry.x), dtype=np.int32)
+    )
+    here = np.full(num_cells, comm.rank, dtype=np.int32)
+
+    return _remake(msh, cell_tags, here, cells, nodes, comm)
+
+
+def grain_fragmentation(comm, cell_tags, num_cells, num_grains):
+    """Statistics of grains split over processes
+
+    Grain reductions (volumes, averages) combine one partial sum from each
+    process holding part of a grain, so the number of partial sums beyond
+    the first for each grain measures the communication they need.
+
+    Parameters
+    ----------
+    comm: MPI communicator
+       communicator of the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_cells: int
+       number of cells owned by this process
+    num_grains: int
+       number of grains
+
+    Returns
+    -------
+    dict
+       "local_grains" and "shared_grains", the numbers of grains with cells
+       on this process and of those also on other processes; "split_grains",
+       the number of grains on more than one process; "mean_ranks" and
+       "max_ranks", the mean and maximum number of processes per grain;
+       and "partial_sums", the number of partial sums combined across
+       processes in a grain reduction
+    """
+    owned = cell_tags.indices < num_cells
+    present = np.bincount(
+        cell_tags.values[owned], minlength=num_grains
+    )[:num_grains] > 0
+    ranks = present.astype(np.int64)
+    comm.Allreduce(MPI.IN_PLACE, ranks, op=MPI.SUM)
+
+    nonempty = ranks[ranks > 0]
+    return {
+        "local_grains": int(np.sum(present)),
+        "shared_grains": int(np.sum(present & (ranks > 1))),
+        "split_grains": int(np.sum(ranks > 1)),
+        "mean_ranks": float(np.mean(nonempty)) if len(nonempty) else 0.,
+        "max_ranks": int(ranks.max(initial=0)),
+        "partial_sums": int(np.sum(nonempty - 1)),
+    }
+
+
+def report_fragmentation(msh, cell_tags, num_grains):
+    """Print grain fragmentation statistics
+
+    Process 0 prints the statistics for the whole mesh, and each process
+    logs its numbers of local and shared grains at the INFO level.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_grains: int
+       number of grains
+    """
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+    stats = grain_fragmentation(msh.comm, cell_tags, num_cells, num_grains)
+    log.log(
+        log.LogLevel.INFO,
+        f"{msh.comm.rank}: cells: {num_cells}, "
+        f"grains: {stats['local_grains']}, shared: {stats['shared_grains']}"
+    )
+    if msh.comm.rank == 0:
+        print(
+            f"grains split over processes: {stats['split_grains']}"
+            f" of {num_grains}, processes per grain: mean "
+            f"{stats['mean_ranks']:.2f}, max {stats['max_ranks']}; "
+            f"partial sums per grain reduction: {stats['partial_sums']}",
+            flush=True
+        )
+
+
+def _remake(msh, cell_tags, destinations, cells, nodes, comm):
+    """Make a new mesh on `comm` with the cells moved to the given processes
+
+    The new mesh gets `cells` as original cell indices and `nodes` as input
+    node indices; both must be global indices.
+    """
+    tdim = msh.topology.dim
+    num_cells = msh.topology.index_map(tdim).size_local
+
+    topology = nodes[msh.geometry.dofmap[:num_cells]].astype(np.int64)
+    x = msh.geometry.x[:, :msh.geometry.dim]
+    tag_values = np.full(num_cells, -1, dtype=np.int32)
+    owned = cell_tags.indices < num_cells
+    tag_values[cell_tags.indices[owned]] = cell_tags.values[owned]
+
+    total_cells = comm.allreduce(num_cells)
+    total_nodes = comm.allreduce(
+        int(nodes.max()) + 1 if len(nodes) else 0, op=MPI.MAX
+    )
+
+    # Move the cells and nodes into blocks in their index order, so that the
+    # new mesh has the same indices.
+    cells_b, dests_b, tags_b = _to_blocks(
+        comm, cells, total_cells,
+        [topology, destinations.astype(np.int32), tag_values]
+    )
+    x_b, = _to_blocks(comm, nodes, total_nodes, [x])
+
+    dests = dolfinx.graph.adjacencylist(dests_b.reshape(-1, 1))
+
+    def partitioner(comm, nparts, cell_types, topology):
+        return dests._cpp_object
+
+    element = basix.ufl.element(
+        "Lagrange", dolfinx.mesh.to_string(msh.topology.cell_type),
+        msh.geometry.cmap.degree, shape=(x.shape[1],)
+    )
+    new_mesh = dolfinx.mesh.create_mesh(
+        comm, cells_b, x_b, ufl.Mesh(element), partitioner=partitioner
+    )
+
+    new_num = new_mesh.topology.index_map(tdim).size_local
+    new_original = np.asarray(new_mesh.topology.original_cell_index)[:new_num]
+    values = _fetch(comm, tags_b, total_cells, new_original)
+    tagged = np.flatnonzero(values >= 0).astype(np.int32)
+    new_cell_tags = dolfinx.mesh.meshtags(
+        new_mesh, tdim, tagged, values[tagged]
+    )
+    new_cell_tags.name = cell_tags.name
+
+    return new_mesh, new_cell_tags
+
+
+def _fetch(comm, block_values, total, index):
+    """Get values by index from the processes holding their blocks"""
+    bounds = _block_bounds(total, comm.size)
+    owner = np.searchsorted(bounds, index, side="right") - 1
+    requests = [index[owner == r] for r in range(comm.size)]
+    received = comm.alltoall(requests)
+
+    b0 = bounds[comm.rank]
+    replies = comm.alltoall([block_values[idx - b0] for idx in received])
+
+    values = np.empty(len(index), dtype=block_values.dtype)
+    for r in range(comm.size):
+        values[owner == r] = replies[r]
+
+    return values
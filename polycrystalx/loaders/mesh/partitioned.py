@@ -0,0 +1,385 @@
+"""Partitioned mesh files
+
+A partitioned mesh file holds a distributed mesh together with the process
+that owns each cell, so that the mesh can be read back on the same number of
+processes without partitioning it again. The cells and nodes are stored in
+their input (original) order, so the original cell and node indices are
+the same after reading.
+
+The HDF5 file has these datasets:
+
+geometry: array (num_nodes, gdim)
+   node coordinates
+topology: array (num_cells, nodes_per_cell)
+   node indices of each cell, in the dolfinx ordering
+destinations: array (num_cells, m)
+   owner of each cell followed by the processes with ghosts of it, padded
+   with -1
+cell_tags: array (num_cells, 1), optional
+   cell tag values, with -1 for cells with no tag
+facet_tags/entities: array (num_facets, vertices_per_facet), optional
+   node indices of the vertices of each tagged facet
+facet_tags/values: array (num_facets), optional
+   facet tag values
+
+The cell type, coordinate element degree and number of processes are
+attributes of the file.
+
+To write the file, the cell and node rows are sent to the processes holding
+their blocks, and each process writes its own contiguous block. To read the
+file, each process reads an equal block of cells and nodes, and
+the cells are sent to the processes that owned them when the file was
+written. On a different number of processes, the cells are partitioned
+again, still without any process reading the whole mesh.
+
+Gmsh files are converted to this format with `convert_gmsh` (or the
+`pxx_convert` script), so the serial gmsh read is done only once.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+import basix.ufl
+import dolfinx
+import ufl
+from mpi4py import MPI
+
+from ...utils.xdmffile_ext import XDMFFile_Ext
+
+
+def write_partitioned(filename, msh, cell_tags=None, facet_tags=None):
+    """Write a distributed mesh with its partition
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags, optional
+       cell tags
+    facet_tags: dolfinx MeshTags, optional
+       facet tags
+    """
+    comm = msh.comm
+    tdim = msh.topology.dim
+    cmap = msh.topology.index_map(tdim)
+    num_cells = cmap.size_local
+
+    original_cells = np.asarray(
+        msh.topology.original_cell_index, dtype=np.int64
+    )
+    input_nodes = np.asarray(
+        msh.geometry.input_global_indices, dtype=np.int64
+    )
+    topology = input_nodes[msh.geometry.dofmap[:num_cells]]
+    destinations = _cell_destinations(msh)
+    x = msh.geometry.x[:, :msh.geometry.dim]
+
+    total_cells = comm.allreduce(num_cells)
+    total_nodes = comm.allreduce(
+        int(input_nodes.max()) + 1 if len(input_nodes) else 0, op=MPI.MAX
+    )
+    width = comm.allreduce(destinations.shape[1], op=MPI.MAX)
+    destinations = np.pad(
+        destinations, ((0, 0), (0, width - destinations.shape[1])),
+        constant_values=-1
+    )
+
+    tag_values = None
+    if cell_tags is not None:
+        tag_values = np.full((num_cells, 1), -1, dtype=np.int32)
+        owned = cell_tags.indices < num_cells
+        tag_values[cell_tags.indices[owned], 0] = cell_tags.values[owned]
+
+    facets = None
+    if facet_tags is not None:
+        facets = comm.gather(facet_entities(msh, facet_tags), root=0)
+
+    if comm.rank == 0:
+        with h5py.File(filename, "w") as h5:
+            h5.attrs["cell_type"] = dolfinx.mesh.to_string(
+                msh.topology.cell_type
+            )
+            h5.attrs["degree"] = msh.geometry.cmap.degree
+            h5.attrs["num_processes"] = comm.size
+            h5.create_dataset(
+                "geometry", shape=(total_nodes, x.shape[1]), dtype=x.dtype
+            )
+            h5.create_dataset(
+                "topology", shape=(total_cells, topology.shape[1]),
+                dtype=np.int64
+            )
+            h5.create_dataset(
+                "destinations", shape=(total_cells, width), dtype=np.int32
+            )
+            if tag_values is not None:
+                h5.create_dataset(
+                    "cell_tags", shape=(total_cells, 1), dtype=np.int32
+                )
+            if facets is not None:
+                entities = np.concatenate([e for e, v in facets])
+                values = np.concatenate([v for e, v in facets])
+                entities, index = np.unique(
+                    np.sort(entities, axis=1), axis=0, return_index=True
+                )
+                h5.create_dataset("facet_tags/entities", data=entities)
+                h5.create_dataset("facet_tags/values", data=values[index])
+
+    comm.Barrier()
+    rows = original_cells[:num_cells]
+    datasets = {
+        "topology": (rows, total_cells, topology),
+        "destinations": (rows, total_cells, destinations),
+        "geometry": (input_nodes, total_nodes, x),
+    }
+    if tag_values is not None:
+        datasets["cell_tags"] = (rows, total_cells, tag_values)
+    _write_blocks(filename, comm, datasets)
+
+
+def read_partitioned(filename, comm):
+    """Read a distributed mesh with its partition
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    comm: MPI communicator
+       communicator for the mesh; if it does not have the same number of
+       processes as when the file was written, the mesh is partitioned again
+
+    Returns
+    -------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags or None
+       cell tags, if saved
+    facet_tags: dolfinx MeshTags or None
+       facet tags, if saved
+    """
+    with h5py.File(filename, "r") as h5:
+        same_partition = h5.attrs["num_processes"] == comm.size
+        cell_name = h5.attrs["cell_type"]
+        degree = int(h5.attrs["degree"])
+        c0, c1 = _block(h5["topology"].shape[0], comm)
+        n0, n1 = _block(h5["geometry"].shape[0], comm)
+        cells = h5["topology"][c0:c1]
+        destinations = h5["destinations"][c0:c1]
+        x = h5["geometry"][n0:n1]
+        has_cell_tags = "cell_tags" in h5
+        has_facet_tags = "facet_tags" in h5
+        if has_facet_tags:
+            f0, f1 = _block(h5["facet_tags/values"].shape[0], comm)
+            facet_entities = h5["facet_tags/entities"][f0:f1]
+            facet_values = h5["facet_tags/values"][f0:f1]
+
+    partitioner = None
+    if same_partition:
+        keep = destinations >= 0
+        offsets = np.zeros(len(destinations) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum(np.sum(keep, axis=1))
+        dests = dolfinx.graph.adjacencylist(
+            destinations[keep].astype(np.int32), offsets
+        )
+
+        def partitioner(comm, nparts, cell_types, topology):
+            return dests._cpp_object
+
+    element = basix.ufl.element(
+        "Lagrange", cell_name, degree, shape=(x.shape[1],)
+    )
+    msh = dolfinx.mesh.create_mesh(
+        comm, cells, x, ufl.Mesh(element), partitioner=partitioner
+    )
+
+    tdim = msh.topology.dim
+    cell_tags = None
+    if has_cell_tags:
+        num_cells = msh.topology.index_map(tdim).size_local
+        original = np.asarray(msh.topology.original_cell_index)[:num_cells]
+        with h5py.File(filename, "r") as h5:
+            values = XDMFFile_Ext._read_rows(h5["cell_tags"], original)[:, 0]
+        tagged = np.flatnonzero(values >= 0).astype(np.int32)
+        cell_tags = dolfinx.mesh.meshtags(msh, tdim, tagged, values[tagged])
+
+    facet_tags = None
+    if has_facet_tags:
+        fdim = tdim - 1
+        msh.topology.create_connectivity(fdim, tdim)
+        entities, values = dolfinx.io.distribute_entity_data(
+            msh, fdim, facet_entities, facet_values.astype(np.int32)
+        )
+        msh.topology.create_connectivity(fdim, 0)
+        facet_tags = dolfinx.mesh.meshtags_from_entities(
+            msh, fdim, dolfinx.graph.adjacencylist(entities)._cpp_object,
+            values.astype(np.int32)
+        )
+
+    return msh, cell_tags, facet_tags
+
+
+def partitioned_file(gmsh_file):
+    """Return name of converted file for a gmsh file
+
+    Parameters
+    ----------
+    gmsh_file: str or Path
+       name of gmsh file
+
+    Returns
+    -------
+    Path
+       name of partitioned mesh file, next to the gmsh file
+    """
+    return Path(gmsh_file).with_suffix(".h5")
+
+
+def is_converted(gmsh_file):
+    """Return True if gmsh file has an up to date converted file"""
+    h5_file = partitioned_file(gmsh_file)
+    return (
+        h5_file.exists()
+        and os.path.getmtime(h5_file) >= os.path.getmtime(gmsh_file)
+    )
+
+
+def convert_gmsh(gmsh_file, comm, h5_file=None):
+    """Convert a gmsh file to a partitioned mesh file
+
+    The physical groups of the cells are saved as the cell tags (grain IDs)
+    and those of the facets as the facet tags. The mesh is partitioned for
+    the number of processes of `comm`.
+
+    Parameters
+    ----------
+    gmsh_file: str or Path
+       name of gmsh file
+    comm: MPI communicator
+       communicator for the mesh
+    h5_file: str or Path, optional
+       name of partitioned mesh file; defaults to `partitioned_file`
+    """
+    if h5_file is None:
+        h5_file = partitioned_file(gmsh_file)
+    msh, cell_tags, facet_tags = dolfinx.io.gmshio.read_from_msh(
+        str(gmsh_file), comm, 0
+    )
+    write_partitioned(h5_file, msh, cell_tags, facet_tags)
+
+
+def _cell_destinations(msh):
+    """Owner and ghosting processes of each local cell
+
+    A process has a ghost of a cell when it owns a cell sharing a facet with
+    it, so the ghosting processes of an owned cell are the owners of its
+    ghosted neighbors.
+    """
+    comm = msh.comm
+    tdim = msh.topology.dim
+    cmap = msh.topology.index_map(tdim)
+    num_cells = cmap.size_local
+    ghost_owners = cmap.owners
+
+    extra = [set() for _ in range(num_cells)]
+    if len(ghost_owners) > 0:
+        msh.topology.create_connectivity(tdim, tdim - 1)
+        msh.topology.create_connectivity(tdim - 1, tdim)
+        c2f = msh.topology.connectivity(tdim, tdim - 1)
+        f2c = msh.topology.connectivity(tdim - 1, tdim)
+        for g, owner in enumerate(ghost_owners):
+            for f in c2f.links(num_cells + g):
+                for c in f2c.links(f):
+                    if c < num_cells:
+                        extra[c].add(int(owner))
+
+    width = 1 + max((len(e) for e in extra), default=0)
+    destinations = np.full((num_cells, width), -1, dtype=np.int32)
+    destinations[:, 0] = comm.rank
+    for c, e in enumerate(extra):
+        destinations[c, 1:1 + len(e)] = sorted(e)
+
+    return destinations
+
+
+def facet_entities(msh, facet_tags):
+    """Input node indices of the vertices of owned tagged facets"""
+    fdim = msh.topology.dim - 1
+    num_facets = msh.topology.index_map(fdim).size_local
+    owned = facet_tags.indices < num_facets
+    facets = facet_tags.indices[owned]
+    msh.topology.create_connectivity(fdim, 0)
+    f2v = msh.topology.connectivity(fdim, 0)
+    vertices = np.array([f2v.links(f) for f in facets], dtype=np.int32)
+    vertices = vertices.reshape(len(facets), -1)
+    nodes = dolfinx.mesh.entities_to_geometry(msh, 0, vertices.ravel())
+    input_nodes = np.asarray(msh.geometry.input_global_indices)
+
+    entities = input_nodes[nodes.reshape(-1)].reshape(vertices.shape)
+    return entities.astype(np.int64), facet_tags.values[owned]
+
+
+def _block(n, comm):
+    """Range of rows read by this process"""
+    return n * comm.rank // comm.size, n * (comm.rank + 1) // comm.size
+
+
+def _block_bounds(total, size):
+    return np.array([total * r // size for r in range(size + 1)])
+
+
+def _to_blocks(comm, index, total, arrays):
+    """Send rows to the processes holding their blocks of indices
+
+    Returns the arrays in block order, with rows of the block of this process
+    given by their index.
+    """
+    bounds = _block_bounds(total, comm.size)
+    owner = np.searchsorted(bounds, index, side="right") - 1
+    send = []
+    for r in range(comm.size):
+        sel = owner == r
+        send.append((index[sel], [a[sel] for a in arrays]))
+    received = comm.alltoall(send)
+
+    b0, b1 = bounds[comm.rank], bounds[comm.rank + 1]
+    out = [
+        np.empty((b1 - b0,) + a.shape[1:], dtype=a.dtype) for a in arrays
+    ]
+    for idx, values in received:
+        for o, v in zip(out, values):
+            o[idx - b0] = v
+
+    return out
+
+
+def _write_blocks(filename, comm, datasets):
+    """Write datasets by blocks of rows, one contiguous block per process
+
+    `datasets` maps dataset names to `(index, total, values)`, the row of
+    each local value and the number of rows. The rows are first sent to the
+    processes holding their blocks, so each process writes one slice of each
+    dataset. If h5py has MPI support, the processes write the file together;
+    otherwise they write in turn.
+    """
+    blocks = []
+    for name, (index, total, values) in datasets.items():
+        block, = _to_blocks(comm, index, total, [values])
+        blocks.append((name, _block(total, comm), block))
+
+    def fill(h5):
+        for name, (b0, b1), block in blocks:
+            h5[name][b0:b1] = block
+
+    if h5py.get_config().mpi:
+        with h5py.File(filename, "a", driver="mpio", comm=comm) as h5:
+            fill(h5)
+    else:
+        for rank in range(comm.size):
+            comm.Barrier()
+            if rank == comm.rank:
+                with h5py.File(filename, "a") as h5:
+                    fill(h5)
+        comm.Barrier()
@@ -1,26 +1,58 @@
 """Polycrystal loaders"""
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+import basix
 import dolfinx
+import ufl
+from mpi4py import MPI
+from scipy.spatial import cKDTree
+
+from ..inputs.polycrystal import Voxels
+from ..utils.mpi import threads_per_process
+from .voxels import VoxelMicrostructure
+
+
+# Number of cells whose grain IDs are found at a time, if not given.
+DEFAULT_CHUNK_SIZE = 65536
 
 
 class Polycrystal:
 
-    def __init__(self, userinput, parent=None):
+    def __init__(
+            self, userinput, parent=None, chunk_size=None, num_threads=None,
+            comm=MPI.COMM_WORLD
+    ):
         """load polycrystal input
 
         Parameters
         ----------
         userinput: inputs.polycrystal.Polycrystal instance
            user input for polycrystal configuration
+        chunk_size: int, optional
+           number of cells whose grain IDs are found at a time
+        num_threads: int, optional
+           number of threads finding grain IDs; the default is the number of
+           cores available to this process
+        comm: MPI communicator, default=MPI.COMM_WORLD
+           communicator of the processes, for the default number of threads
         """
         self.userinput = userinput
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.num_threads = num_threads or threads_per_process(comm)
         self.use_meshtags = self.userinput.use_meshtags
+        self._polycrystal = userinput.polycrystal
+        if isinstance(self._polycrystal, Voxels):
+            self._polycrystal = VoxelMicrostructure(self._polycrystal)
         self._num_grains = self.polycrystal.num_grains
+        self._seed_tree = None
+        if userinput.voronoi_seeds:
+            self._seed_tree = cKDTree(np.asarray(self.polycrystal.seeds))
 
     # We could put a setter here and do checks on the input in the setter.
     @property
     def polycrystal(self):
-        return self.userinput.polycrystal
+        return self._polycrystal
 
     @property
     def orientation_list(self):
@@ -31,12 +63,24 @@ class Polycrystal:
         """number of grains"""
         return self._num_grains
 
-    def grain_cell_tags(self, msh):
+    def grain_cell_tags(self, msh, grid=None, samples=None):
         """Assign grain IDs to cells
+
+        The cells are taken in chunks, on a pool of threads, so that only
+        the midpoints of one chunk per thread are in memory at a time. When
+        the microstructure is a voxel image aligned with the structured grid
+        of the mesh, each cell is one voxel, and its grain ID is read using
+        the cell's original index, without computing midpoints.
+
         Parameters
         ----------
         msh: Mesh instance
            the mesh
+        grid: tuple, optional
+           structured grid of the mesh (see MeshLoader.structured_grid)
+        samples: tuple, optional
+           sampled grain IDs and fractions (see `sample_grains`); if given,
+           each cell gets the grain with the largest fraction
 
         Returns
         -------
@@ -45,33 +89,149 @@ class Polycrystal:
         """
         indmap = msh.topology.index_map(msh.topology.dim)
         num_cells = indmap.size_local
-        midpoints = dolfinx.mesh.compute_midpoints(
-            msh, msh.topology.dim, np.arange(num_cells, dtype=np.int32)
-        )
-        gids = self.polycrystal.grain(midpoints).astype(np.int32)
+        if samples is not None:
+            gids = self.dominant_grain(*samples)
+        elif self.voxel_aligned(grid):
+            original = np.asarray(msh.topology.original_cell_index)
+            gids = self.polycrystal.voxel_grain(original[:num_cells])
+        else:
+            gids = self._map_cells(num_cells, lambda cells: self.grain(
+                dolfinx.mesh.compute_midpoints(msh, msh.topology.dim, cells)
+            ))
         cell_tags = dolfinx.mesh.meshtags(
             msh, msh.topology.dim, np.arange(num_cells, dtype=np.int32), gids)
 
         return cell_tags
 
-    def grain_cell_dict(self, cell_tags):
-        # Partition cells by grain id
-        # * Note: do not use [] as the value in dict.fromkeys because all will
-        #   be the same list. Set each value to [] individually.
-        gids = cell_tags.values
-        num_cells = len(gids)
+    def voxel_aligned(self, grid):
+        """True if the microstructure is a voxel image matching the grid
+
+        Parameters
+        ----------
+        grid: tuple or None
+           structured grid of the mesh (see MeshLoader.structured_grid)
+        """
+        return (
+            grid is not None
+            and isinstance(self.polycrystal, VoxelMicrostructure)
+            and self.polycrystal.aligned(grid)
+        )
+
+    def sample_grains(self, msh, degree):
+        """Grain IDs at the quadrature points of the local cells
+
+        Parameters
+        ----------
+        msh: Mesh instance
+           the mesh
+        degree: int
+           degree of the quadrature rule
+
+        Returns
+        -------
+        samples: array (n, m) of int32
+           grain IDs at the `m` quadrature points of each local cell
+        fractions: array (m)
+           volume fraction of each quadrature point
+        """
+        tdim = msh.topology.dim
+        num_cells = msh.topology.index_map(tdim).size_local
+        cell_type = basix.cell.string_to_type(
+            dolfinx.mesh.to_string(msh.topology.cell_type)
+        )
+        points, weights = basix.make_quadrature(cell_type, degree)
+        x = dolfinx.fem.Expression(ufl.SpatialCoordinate(msh), points)
+        gdim = msh.geometry.dim
+
+        def sample(cells):
+            xq = np.zeros((len(cells) * len(weights), 3))
+            xq[:, :gdim] = x.eval(msh, cells).reshape(-1, gdim)
+            return self.grain(xq).reshape(len(cells), len(weights))
+
+        samples = self._map_cells(num_cells, sample, len(weights))
+
+        return samples, weights / np.sum(weights)
 
-        gcell_d = dict.fromkeys(range(self.num_grains))
-        for k in gcell_d:
-            gcell_d[k] = []
-        for i in range(num_cells):
-            gcell_d[gids[i]].append(i)
+    def grain(self, points):
+        """Grain IDs at points
 
-        # For fenicsx 0.8.
-        for k in gcell_d:
-            gcell_d[k] = np.array(gcell_d[k], dtype=np.int32)
+        With the `voronoi_seeds` input, grains are looked up in a KD-tree of
+        the seeds, so that grain `i` is the cell of seed `i`; otherwise, the
+        microstructure's `grain` method is used.
+
+        Parameters
+        ----------
+        points: array (n, 3)
+           points
+
+        Returns
+        -------
+        array (n) of int32
+           grain IDs
+        """
+        if self._seed_tree is None:
+            return np.asarray(self.polycrystal.grain(points), dtype=np.int32)
+
+        d = self._seed_tree.m
+        _, nearest = self._seed_tree.query(np.asarray(points)[:, :d])
+
+        return nearest.astype(np.int32)
+
+    def _map_cells(self, num_cells, func, width=None):
+        """Apply a function to chunks of local cells on a pool of threads
+
+        The function takes an array of cells and returns an array of values
+        with one row for each cell; the values are joined in cell order.
+        """
+        shape = (num_cells,) if width is None else (num_cells, width)
+        values = np.empty(shape, dtype=np.int32)
+        starts = range(0, num_cells, self.chunk_size)
+
+        def chunk(start):
+            stop = min(start + self.chunk_size, num_cells)
+            values[start:stop] = func(
+                np.arange(start, stop, dtype=np.int32)
+            )
+
+        with ThreadPoolExecutor(self.num_threads) as pool:
+            # Consume the results to raise any exceptions.
+            list(pool.map(chunk, starts))
+
+        return values
+
+    @staticmethod
+    def dominant_grain(samples, fractions):
+        """Grain with the largest volume fraction in each cell
+
+        Parameters
+        ----------
+        samples: array (n, m) of int
+           grain IDs at the sample points of each cell
+        fractions: array (m)
+           volume fraction of each sample point
+
+        Returns
+        -------
+        array (n) of int32
+           grain ID with the largest total fraction
+        """
+        scores = np.stack([
+            (samples == samples[:, [j]]) @ fractions
+            for j in range(samples.shape[1])
+        ], axis=1)
+        best = np.argmax(scores, axis=1)
+
+        return samples[np.arange(len(samples)), best].astype(np.int32)
+
+    def grain_cell_dict(self, cell_tags):
+        # Partition cells by grain id, sorting once and splitting the sorted
+        # cells at the grain boundaries.
+        gids = cell_tags.values
+        order = np.argsort(gids, kind="stable").astype(np.int32)
+        counts = np.bincount(gids, minlength=self.num_grains)
+        splits = np.split(order, np.cumsum(counts)[:-1])
 
-        return gcell_d
+        return {k: splits[k] for k in range(self.num_grains)}
 
     def orientation_field(self, T, grain_cells):
         """Orientation Field
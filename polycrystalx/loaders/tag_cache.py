@@ -0,0 +1,209 @@
+"""Cache of grain IDs by mesh and microstructure
+
+Jobs in a suite often use the same mesh and microstructure with different
+materials or loads. The grain ID of each cell (and the sampled grain IDs for
+sub-cell sampling) are saved the first time and read by later jobs. The values
+are stored in input cell order, so they are read back by original cell index on
+any partition of the mesh.
+
+The HDF5 file has these datasets:
+
+grain_ids: array (num_cells, 1)
+   grain ID of each cell
+samples: array (num_cells, m), optional
+   grain IDs at the sample points of each cell
+fractions: array (m), optional
+   volume fraction of each sample point
+
+The key leaves out the orientations and phases of the grains, so changing
+them reuses the tags; only the coefficient fields are computed again.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import h5py
+import dolfinx
+
+from ..inputs.hashing import spec_hash
+from ..inputs.polycrystal import microstructure_spec
+from ..utils.xdmffile_ext import XDMFFile_Ext
+from .mesh.partitioned import _write_blocks
+
+
+def load_grain_tags(pdata, msh, grid=None, degree=None, filename=None):
+    """Grain IDs of the cells, read from the cache if available
+
+    Parameters
+    ----------
+    pdata: loaders.polycrystal.Polycrystal
+       the polycrystal loader
+    msh: dolfinx Mesh
+       the mesh
+    grid: tuple, optional
+       structured grid of the mesh (see MeshLoader.structured_grid)
+    degree: int, optional
+       quadrature degree for sub-cell sampling
+    filename: str or Path, optional
+       name of the cache file; if given, the grain IDs are read from it when
+       it exists, and otherwise saved to it
+
+    Returns
+    -------
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    samples: tuple or None
+       sampled grain IDs and fractions, if `degree` is given
+    """
+    comm = msh.comm
+    if filename is not None:
+        fname = Path(filename)
+        cached = comm.bcast(fname.exists() if comm.rank == 0 else None)
+        if cached:
+            return read_tags(fname, msh)
+
+    samples = None if degree is None else pdata.sample_grains(msh, degree)
+    cell_tags = pdata.grain_cell_tags(msh, grid, samples=samples)
+
+    if filename is not None:
+        # Write to a temporary file first, so other jobs never read a
+        # partially written cache.
+        tmp = fname.with_suffix(f".{comm.bcast(os.getpid())}.tmp")
+        if comm.rank == 0:
+            os.makedirs(fname.parent, exist_ok=True)
+        comm.Barrier()
+        write_tags(tmp, msh, cell_tags, samples)
+        if comm.rank == 0:
+            os.replace(tmp, fname)
+        comm.Barrier()
+
+    return cell_tags, samples
+
+
+def tag_cache_file(job, mesh_data, degree=None):
+    """Name of the cache file of a job, relative to its output directory
+
+    Parameters
+    ----------
+    job: inputs.job.Job
+       the job
+    mesh_data: MeshLoader
+       the mesh loader
+    degree: int, optional
+       quadrature degree for sub-cell sampling
+
+    Returns
+    -------
+    Path or None
+       the file name, or None if the job does not use the tag cache
+    """
+    if not job.run_options.tag_cache:
+        return None
+    key = tag_cache_key(
+        mesh_data.cache_key, job.polycrystal_input.polycrystal, degree
+    )
+    cache_dir = os.path.relpath(
+        job.tag_cache_directory, job.output_directory
+    )
+
+    return Path(cache_dir) / f"{key}.h5"
+
+
+def tag_cache_key(mesh_key, microstructure, degree=None):
+    """Key of the grain IDs in the cache
+
+    Parameters
+    ----------
+    mesh_key: str
+       key of the mesh (see MeshLoader.cache_key)
+    microstructure: Microstructure or inputs.polycrystal.Voxels
+       the microstructure input
+    degree: int, optional
+       quadrature degree of sub-cell sampling, if used
+
+    Returns
+    -------
+    str
+       the key
+    """
+    return spec_hash((mesh_key, microstructure_spec(microstructure), degree))
+
+
+def write_tags(filename, msh, cell_tags, samples=None):
+    """Save grain IDs in input cell order
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    samples: tuple, optional
+       sampled grain IDs and fractions (see Polycrystal.sample_grains)
+    """
+    comm = msh.comm
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+    total_cells = comm.allreduce(num_cells)
+    rows = np.asarray(
+        msh.topology.original_cell_index, dtype=np.int64
+    )[:num_cells]
+    gids = np.full((num_cells, 1), -1, dtype=np.int32)
+    owned = cell_tags.indices < num_cells
+    gids[cell_tags.indices[owned], 0] = cell_tags.values[owned]
+
+    if comm.rank == 0:
+        with h5py.File(filename, "w") as h5:
+            h5.create_dataset(
+                "grain_ids", shape=(total_cells, 1), dtype=np.int32
+            )
+            if samples is not None:
+                h5.create_dataset(
+                    "samples", shape=(total_cells, samples[0].shape[1]),
+                    dtype=np.int32
+                )
+                h5.create_dataset("fractions", data=samples[1])
+
+    comm.Barrier()
+    datasets = {"grain_ids": (rows, total_cells, gids)}
+    if samples is not None:
+        datasets["samples"] = (rows, total_cells, samples[0])
+    _write_blocks(filename, comm, datasets)
+
+
+def read_tags(filename, msh):
+    """Read saved grain IDs for the cells of a mesh
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    msh: dolfinx Mesh
+       the mesh
+
+    Returns
+    -------
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    samples: tuple or None
+       sampled grain IDs and fractions, if saved
+    """
+    tdim = msh.topology.dim
+    num_cells = msh.topology.index_map(tdim).size_local
+    rows = np.asarray(
+        msh.topology.original_cell_index, dtype=np.int64
+    )[:num_cells]
+    with h5py.File(filename, "r") as h5:
+        gids = XDMFFile_Ext._read_rows(h5["grain_ids"], rows)[:, 0]
+        samples = None
+        if "samples" in h5:
+            samples = (
+                XDMFFile_Ext._read_rows(h5["samples"], rows),
+                h5["fractions"][()]
+            )
+
+    tagged = np.flatnonzero(gids >= 0).astype(np.int32)
+    cell_tags = dolfinx.mesh.meshtags(msh, tdim, tagged, gids[tagged])
+
+    return cell_tags, samples
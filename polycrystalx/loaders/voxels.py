@@ -0,0 +1,188 @@
+"""Voxel image microstructures
+
+Cell midpoints are mapped to voxels by integer arithmetic on the image
+origin and spacing. Image files are opened lazily and only the block of
+voxels covering the points is read, so large images are never loaded in
+full on every process.
+"""
+import contextlib
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+
+def voxel_indices(points, origin, spacing, shape):
+    """Indices of the voxels containing the points
+
+    Parameters
+    ----------
+    points: array(n, d) or array(n, 3)
+       points; only the first d coordinates are used
+    origin: array(d)
+       lower corner of the image
+    spacing: float or array(d)
+       size of the voxels
+    shape: tuple of int
+       shape of the image, in (x, y, z) order
+
+    Returns
+    -------
+    array(n, d) of int
+       voxel indices, clipped to the image
+    """
+    d = len(shape)
+    ijk = np.floor(
+        (np.asarray(points)[:, :d] - origin) / spacing
+    ).astype(np.int64)
+
+    return np.clip(ijk, 0, np.array(shape) - 1)
+
+
+def read_block(image, lower, upper):
+    """Read a block of an image
+
+    Parameters
+    ----------
+    image: array-like
+       array, memory map or HDF5 dataset
+    lower, upper: array(d) of int
+       first and last indices of the block (inclusive)
+
+    Returns
+    -------
+    array
+       the block of voxels
+    """
+    return np.asarray(
+        image[tuple(slice(lo, hi + 1) for lo, hi in zip(lower, upper))]
+    )
+
+
+class VoxelMicrostructure:
+    """Microstructure from a voxel image
+
+    Parameters
+    ----------
+    userinput: inputs.polycrystal.Voxels
+       the voxel image input
+    """
+
+    def __init__(self, userinput):
+        self.userinput = userinput
+        self._orientations = np.asarray(userinput.orientations)
+        self._phases = userinput.phases
+        if self._phases is None:
+            self._phases = np.zeros(self.num_grains, dtype=np.int32)
+
+    @property
+    def num_grains(self):
+        """number of grains"""
+        return len(self._orientations)
+
+    @property
+    def orientation_list(self):
+        """orientation matrix of each grain"""
+        return self._orientations
+
+    def phase(self, gids):
+        """phase of each grain ID"""
+        return np.asarray(self._phases)[gids]
+
+    def aligned(self, grid):
+        """True if the voxels are the cells of a structured grid
+
+        Parameters
+        ----------
+        grid: tuple
+           lower corner, cell size and divisions of the grid, in (x, y, z)
+           order
+
+        Returns
+        -------
+        bool
+           True if the image has the grid's origin, spacing and shape
+        """
+        lower, size, divisions = grid
+        with self._image() as image:
+            shape = self._shape(image)
+        d = len(shape)
+        return (
+            len(divisions) == d
+            and tuple(shape) == tuple(divisions)
+            and np.allclose(self._origin(d), lower)
+            and np.allclose(np.broadcast_to(self.userinput.spacing, d), size)
+        )
+
+    def grain(self, points):
+        """Grain ID at each point
+
+        Parameters
+        ----------
+        points: array(n, 3)
+           points
+
+        Returns
+        -------
+        array(n) of int
+           grain IDs
+        """
+        with self._image() as image:
+            shape = self._shape(image)
+            ijk = voxel_indices(
+                points, self._origin(len(shape)), self.userinput.spacing,
+                shape
+            )
+            return self._lookup(image, ijk)
+
+    def voxel_grain(self, index):
+        """Grain ID of voxels given by their flat index
+
+        Parameters
+        ----------
+        index: array(n) of int
+           flat voxel index, with x varying fastest
+
+        Returns
+        -------
+        array(n) of int
+           grain IDs
+        """
+        with self._image() as image:
+            shape = self._shape(image)
+            ijk = np.stack(
+                np.unravel_index(index, shape[::-1])[::-1], axis=1
+            )
+            return self._lookup(image, ijk)
+
+    @contextlib.contextmanager
+    def _image(self):
+        ui = self.userinput
+        src = ui.grain_ids
+        if isinstance(src, (str, Path)):
+            if Path(src).suffix == ".npy":
+                yield np.load(src, mmap_mode="r")
+            else:
+                with h5py.File(src, "r") as f:
+                    yield f[ui.dataset]
+        else:
+            yield np.asarray(src)
+
+    def _shape(self, image):
+        """image shape in (x, y, z) order"""
+        flip = self.userinput.order == "zyx"
+        return image.shape[::-1] if flip else image.shape
+
+    def _origin(self, d):
+        origin = self.userinput.origin
+        return np.zeros(d) if origin is None else np.asarray(origin)
+
+    def _lookup(self, image, ijk):
+        if len(ijk) == 0:
+            return np.zeros(0, dtype=np.int32)
+        if self.userinput.order == "zyx":
+            ijk = ijk[:, ::-1]
+        lower, upper = ijk.min(axis=0), ijk.max(axis=0)
+        block = read_block(image, lower, upper)
+
+        return block[tuple((ijk - lower).T)].astype(np.int32)
@@ -0,0 +1,113 @@
+"""Mixing rules for stiffness in cells with several grains
+
+Stiffness matrices are 6x6 in the Mandel notation used by the forms, with
+components in the order (00, 11, 22, 12, 20, 01) and shear components scaled
+by the square root of two. The functions operate on stacks of matrices, so
+that all the cells are mixed at once.
+"""
+import numpy as np
+
+
+mixing_rules = ("voigt", "reuss", "hill")
+
+
+def _mandel_basis():
+    basis = np.zeros((6, 3, 3))
+    for a, (i, j) in enumerate(
+            [(0, 0), (1, 1), (2, 2), (1, 2), (2, 0), (0, 1)]
+    ):
+        if i == j:
+            basis[a, i, i] = 1.
+        else:
+            basis[a, i, j] = basis[a, j, i] = 1. / np.sqrt(2.)
+    return basis
+
+
+_BASIS = _mandel_basis()
+
+
+def mandel_rotation(R):
+    """Rotation of symmetric tensors in Mandel notation
+
+    Parameters
+    ----------
+    R: array (n, 3, 3)
+       rotation matrices, from crystal to sample
+
+    Returns
+    -------
+    array (n, 6, 6)
+       matrices Q with `to6vector(R A R^T) = Q to6vector(A)`
+    """
+    B = _BASIS
+    return np.einsum("aij,nik,bkl,njl->nab", B, R, B, R)
+
+
+def to_sample(stiffness, R):
+    """Stiffness in the sample frame
+
+    Parameters
+    ----------
+    stiffness: array (n, 6, 6)
+       stiffness in the crystal frame
+    R: array (n, 3, 3)
+       orientations
+
+    Returns
+    -------
+    array (n, 6, 6)
+       stiffness in the sample frame
+    """
+    Q = mandel_rotation(R)
+    return Q @ stiffness @ np.swapaxes(Q, 1, 2)
+
+
+def to_crystal(stiffness, R):
+    """Stiffness in the crystal frame
+
+    Parameters
+    ----------
+    stiffness: array (n, 6, 6)
+       stiffness in the sample frame
+    R: array (n, 3, 3)
+       orientations
+
+    Returns
+    -------
+    array (n, 6, 6)
+       stiffness in the crystal frame
+    """
+    Q = mandel_rotation(R)
+    return np.swapaxes(Q, 1, 2) @ stiffness @ Q
+
+
+def mix(stiffness, fractions, rule="hill"):
+    """Mix stiffnesses by volume fraction
+
+    Parameters
+    ----------
+    stiffness: array (n, m, 6, 6)
+       `m` stiffnesses (in a common frame) for each of `n` cells
+    fractions: array (n, m)
+       volume fractions, summing to one for each cell
+    rule: {"voigt", "reuss", "hill"}, default="hill"
+       "voigt" averages the stiffnesses, "reuss" averages the compliances,
+       and "hill" is the mean of the two
+
+    Returns
+    -------
+    array (n, 6, 6)
+       mixed stiffness
+    """
+    if rule not in mixing_rules:
+        raise ValueError(f"mixing rule not available: {rule}")
+
+    f = np.asarray(fractions)[:, :, None, None]
+    voigt = np.sum(f * stiffness, axis=1)
+    if rule == "voigt":
+        return voigt
+    reuss = np.linalg.inv(np.sum(f * np.linalg.inv(stiffness), axis=1))
+    if rule == "reuss":
+        return reuss
+
+    return 0.5 * (voigt + reuss)
@@ -0,0 +1,160 @@
+"""Postprocess saved solutions
+
+This recomputes derived fields and grain averages from the solution saved in
+the output directory of a job, so new quantities can be computed without
+solving the problem again. The solution is read from `output.xdmf`, and the
+material, polycrystal and deformation inputs are loaded from the job, as
+for the process itself. The saved solution must be on the job mesh, so jobs
+with other output formats, a region of interest, or a refined or submodel
+mesh cannot be postprocessed.
+"""
+import numpy as np
+from dolfinx import fem
+
+from .processes import process_dict
+from .utils import (
+    setup_output, grain_averages, open_output, XDMFFile_Ext
+)
+
+
+def run(job, fields=None, chunk_size=None, write_fields=False,
+        basename="post"):
+    """Postprocess a saved solution
+
+    Parameters
+    ----------
+    job: inputs.job.Job
+       the job that produced the solution
+    fields: list of str, optional
+       names of the fields to compute; if not given, all derived fields of
+       the process are computed
+    chunk_size: int, optional
+       number of cells evaluated at a time; if not given, the `chunk_size`
+       option of the job is used
+    write_fields: bool, default=False
+       if True, the cellwise values of the fields are also written to
+       `<basename>-output.xdmf`
+    basename: str, default="post"
+       base name of output files; the grain averages are saved in
+       `<basename>-grain-averages.npz`
+    """
+    check_saved_solution(job.run_options)
+    setup_output(job.output_directory)
+
+    process = process_dict[job.process](job)
+    ldr = process.loader
+    process.set_coefficients()
+    uh = read_solution(ldr.mesh, process.solution_name)
+
+    all_fields = process.derived_fields(uh, ldr)
+    if fields is None:
+        fields = list(all_fields)
+    missing = [f for f in fields if f not in all_fields]
+    if missing:
+        avail = " | ".join(all_fields)
+        raise ValueError(
+            f"fields not available: {missing}; fields must be in: {avail}"
+        )
+    exprs = {f: all_fields[f] for f in fields}
+
+    if chunk_size is None:
+        chunk_size = ldr.options.chunk_size
+
+    volumes, averages = grain_averages(
+        ldr.mesh, ldr.cell_tags, ldr.polycrystal_data.num_grains, exprs,
+        chunk_size=chunk_size
+    )
+    if ldr.mesh.comm.rank == 0:
+        np.savez(
+            f"{basename}-grain-averages.npz", volume=volumes, **averages
+        )
+
+    if write_fields:
+        functions = [
+            cellwise_function(ldr.mesh, name, expr)
+            for name, expr in exprs.items()
+        ]
+        with open_output(
+                "xdmf", ldr.mesh, ldr.cell_tags, functions,
+                basename=f"{basename}-output"
+        ) as output:
+            output.write()
+
+
+def check_saved_solution(options):
+    """Check that the saved solution can be read on the job mesh
+
+    Parameters
+    ----------
+    options: inputs.options.Options
+       options of the job
+
+    Raises
+    ------
+    ValueError
+       if the solution was not saved in `output.xdmf` on the job mesh
+    """
+    if options.output_format != "xdmf":
+        raise ValueError(
+            "postprocessing requires the \"xdmf\" output format, not "
+            f"\"{options.output_format}\""
+        )
+    if options.roi:
+        raise ValueError(
+            "postprocessing is not available with a region of interest: "
+            "the solution was saved on the region's cells only"
+        )
+    for name in ("adaptive", "convergence", "submodel"):
+        if getattr(options, name) is not None:
+            raise ValueError(
+                f"postprocessing is not available with the {name} option: "
+                "the solution was saved on a different mesh"
+            )
+
+
+def read_solution(msh, name):
+    """Read saved solution from the output file
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    name: str
+       name of the solution function
+
+    Returns
+    -------
+    dolfinx Function
+       the solution
+    """
+    with XDMFFile_Ext(msh.comm, "output.xdmf", "r") as xfile:
+        uh = xfile.read_function(msh, name)
+    uh.name = name
+
+    return uh
+
+
+def cellwise_function(msh, name, expr):
+    """Interpolate expression into a DG0 function
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    name: str
+       name of the function
+    expr: UFL expression
+       the expression to interpolate
+
+    Returns
+    -------
+    dolfinx Function
+       the DG0 function
+    """
+    shape = expr.ufl_shape
+    etype = ("DG", 0, shape) if shape else ("DG", 0)
+    V = fem.functionspace(msh, etype)
+    f = fem.Function(V, name=name)
+    f.interpolate(fem.Expression(expr, V.element.interpolation_points()))
+
+    return f
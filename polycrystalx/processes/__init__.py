@@ -1,10 +1,13 @@
 """This is the module for defining and executing model processes"""
+import json
 import os
 
+import numpy as np
+
 from .linear_elasticity import LinearElasticity
 from .heat_transfer import HeatTransfer
-
-from ..utils import setup_output
+from ..results import ResultsStore
+from ..utils import setup_output, flush_output, MPI
 
 
 processes = (LinearElasticity, HeatTransfer)
@@ -13,14 +16,98 @@ for p in processes:
     process_dict[p.name] = p
 
 
-def run(job):
+def run(job, previous=None, comm=MPI.COMM_WORLD):
     """Run a job
 
     PARAMETERS
     ----------
     job: inputs.job.Job
        the job to run
+    previous: loader, optional
+       loader of the previous job of the same process; the pieces loaded from
+       the same inputs are reused
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes running the job
+
+    RETURNS
+    -------
+    process
+       the process that was run; the working directory is restored
+
+    When the job is done, its input hashes are written to
+    `job.completion_file`, so that completed jobs can be skipped.
+    """
+    results_file = job.results_file.resolve()
+    record_file = job.completion_file.name
+    cwd = os.getcwd()
+    setup_output(job.output_directory, comm)
+    try:
+        # The record of an earlier run is removed until this one is done.
+        if comm.rank == 0 and os.path.exists(record_file):
+            os.remove(record_file)
+
+        process = process_dict[job.process](
+            job, previous=previous, comm=comm
+        )
+        process.run()
+
+        if job.run_options.results_store:
+            # Rank 0 appends; the others must not wait for it if it fails.
+            error = None
+            if comm.rank == 0:
+                try:
+                    with np.load("grain-averages.npz") as averages:
+                        ResultsStore(results_file).append(
+                            job.results_key, averages
+                        )
+                except Exception as e:
+                    error = e
+            if comm.bcast(error is not None):
+                raise RuntimeError(
+                    f"could not append results to {results_file}"
+                ) from error
+
+        # The job is complete only when its output is on disk.
+        flush_output(comm)
+        if comm.rank == 0:
+            with open(record_file + ".tmp", "w") as f:
+                json.dump(job.input_record, f, indent=2)
+            os.replace(record_file + ".tmp", record_file)
+        comm.Barrier()
+    finally:
+        os.chdir(cwd)
+
+    return process
+
+
+class Worker:
+    """Run a sequence of jobs in one MPI world, reusing what they share
+
+    The worker keeps the loader of the last job of each process. A job
+    reuses the mesh, the grain IDs with the function spaces, the stiffness
+    field and the compiled forms of that loader when they come from the same
+    inputs, and loads the rest as usual (see `reuse`). The deformation is
+    always loaded again.
+
+    PARAMETERS
+    ----------
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes running the jobs
     """
-    setup_output(job.output_directory)
-    process = process_dict[job.process](job)
-    process.run()
+
+    def __init__(self, comm=MPI.COMM_WORLD):
+        self.comm = comm
+        self.loaders = {}
+
+    def run(self, job):
+        """Run a job
+
+        PARAMETERS
+        ----------
+        job: inputs.job.Job
+           the job to run
+        """
+        process = run(
+            job, previous=self.loaders.get(job.process), comm=self.comm
+        )
+        self.loaders[job.process] = process.loader
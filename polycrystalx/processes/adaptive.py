@@ -0,0 +1,244 @@
+"""Adaptive mesh refinement for linear elasticity
+
+Each level solves the problem, finds the grain-averaged stresses, marks
+cells, and refines them. Cells are marked either along the grain boundaries,
+where the stress changes abruptly, or where a recovered-stress error
+indicator is large. On the refined mesh, grain IDs are assigned again from
+the polycrystal, or inherited from the parent cells when they come from the
+mesh tags.
+"""
+import numpy as np
+import ufl
+from dolfinx import fem, la
+from dolfinx.common import Timer
+from dolfinx.mesh import (
+    compute_incident_entities, meshtags, refine, RefinementOption
+)
+from mpi4py import MPI
+
+from ..loaders import mesh
+from ..utils import grain_averages
+from ..utils.output import grain_id_function
+
+
+def grain_boundary_cells(msh, cell_tags):
+    """Find local cells on grain boundaries
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+
+    Returns
+    -------
+    array
+       local cells sharing a facet with a cell of a different grain
+    """
+    tdim = msh.topology.dim
+    msh.topology.create_connectivity(tdim - 1, tdim)
+    f2c = msh.topology.connectivity(tdim - 1, tdim)
+    gids = grain_id_function(msh, cell_tags).x.array
+
+    # Interior facets have two cells.
+    num_links = np.diff(f2c.offsets)
+    first = f2c.offsets[:-1][num_links == 2]
+    c0, c1 = f2c.array[first], f2c.array[first + 1]
+    differ = gids[c0] != gids[c1]
+    num_cells = msh.topology.index_map(tdim).size_local
+    cells = np.unique(np.concatenate([c0[differ], c1[differ]]))
+
+    return cells[cells < num_cells].astype(np.int32)
+
+
+def stress_error_indicator(msh, stress):
+    """Recovered-stress error indicator
+
+    The recovered stress is the nodal average of the cellwise stress (a
+    lumped-mass projection onto continuous linear functions). The indicator
+    for each cell is the L2 norm over the cell of its difference from the
+    cellwise stress.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    stress: dolfinx Function
+       cellwise (DG0) stress
+
+    Returns
+    -------
+    array
+       indicator for each local cell
+    """
+    Q = fem.functionspace(msh, ("Lagrange", 1))
+    q = ufl.TestFunction(Q)
+    dx = ufl.dx(domain=msh)
+    weight = fem.assemble_vector(fem.form(q * dx))
+    weight.scatter_reverse(la.InsertMode.add)
+
+    P = fem.functionspace(msh, ("Lagrange", 1, (3, 3)))
+    p = ufl.TestFunction(P)
+    recovered = fem.Function(P)
+    moment = fem.assemble_vector(fem.form(ufl.inner(stress, p) * dx))
+    moment.scatter_reverse(la.InsertMode.add)
+    recovered.x.array[:] = (
+        moment.array.reshape(-1, 9) / weight.array.reshape(-1, 1)
+    ).ravel()
+    recovered.x.scatter_forward()
+
+    W = fem.functionspace(msh, ("DG", 0))
+    w = ufl.TestFunction(W)
+    diff = recovered - stress
+    eta2 = fem.assemble_vector(fem.form(ufl.inner(diff, diff) * w * dx))
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+
+    return np.sqrt(eta2.array[:num_cells])
+
+
+def mark_maximum(indicator, fraction, comm):
+    """Mark cells where the indicator is large
+
+    Parameters
+    ----------
+    indicator: array
+       indicator for each local cell
+    fraction: float
+       cells are marked where the indicator is at least this fraction of
+       its global maximum
+    comm: MPI communicator
+       communicator of the mesh
+
+    Returns
+    -------
+    array
+       marked local cells
+    """
+    local_max = indicator.max(initial=0.)
+    threshold = fraction * comm.allreduce(local_max, op=MPI.MAX)
+
+    return np.flatnonzero(indicator >= threshold).astype(np.int32)
+
+
+def refine_cells(msh, cells, cell_tags=None):
+    """Refine marked cells
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cells: array
+       local cells to refine
+    cell_tags: dolfinx MeshTags, optional
+       grain IDs to transfer to the refined mesh
+
+    Returns
+    -------
+    new_mesh: dolfinx Mesh
+       the refined mesh
+    new_tags: dolfinx MeshTags or None
+       grain IDs from the parent cells, if `cell_tags` is given
+    """
+    tdim = msh.topology.dim
+    msh.topology.create_entities(1)
+    edges = compute_incident_entities(msh.topology, cells, tdim, 1)
+    new_mesh, parent_cell, _ = refine(
+        msh, edges, partitioner=None, option=RefinementOption.parent_cell
+    )
+
+    new_tags = None
+    if cell_tags is not None:
+        gids = grain_id_function(msh, cell_tags).x.array
+        num_new = new_mesh.topology.index_map(tdim).size_local
+        values = gids[parent_cell[:num_new]].astype(np.int32)
+        tagged = np.flatnonzero(values >= 0).astype(np.int32)
+        new_tags = meshtags(new_mesh, tdim, tagged, values[tagged])
+
+    return new_mesh, new_tags
+
+
+def run(process):
+    """Solve with adaptive refinement
+
+    Parameters
+    ----------
+    process: LinearElasticity
+       the process; its loader is replaced at each level
+
+    Returns
+    -------
+    dolfinx Function
+       the displacement on the final mesh
+    """
+    ldr = process.loader
+    opts = ldr.options.adaptive
+    comm = ldr.mesh.comm
+    job = ldr.job
+    history = []
+    previous = None
+
+    for level in range(opts.max_levels + 1):
+        with Timer() as t:
+            uh = process.solve()
+            elapsed = t.elapsed()
+
+        stress = fem.Function(ldr.T)
+        stress.interpolate(fem.Expression(
+            process.derived_fields(uh, ldr)["stress"],
+            ldr.T.element.interpolation_points()
+        ))
+        _, averages = grain_averages(
+            ldr.mesh, ldr.cell_tags, ldr.polycrystal_data.num_grains,
+            {"stress": stress}, samples=ldr.subcell_samples
+        )
+        avg = averages["stress"]
+
+        change = np.inf
+        if previous is not None:
+            change = np.linalg.norm(avg - previous) / max(
+                np.linalg.norm(avg), np.finfo(float).tiny
+            )
+        num_cells = ldr.mesh.topology.index_map(ldr.mesh.topology.dim)
+        imap = ldr.V.dofmap.index_map
+        num_dofs = imap.size_global * ldr.V.dofmap.index_map_bs
+        history.append(
+            (level, num_cells.size_global, num_dofs, change, elapsed)
+        )
+        if comm.rank == 0:
+            print(
+                f"refinement level {level}: cells: {num_cells.size_global}, "
+                f"dofs: {num_dofs}, change in grain stresses: {change:.3e}",
+                flush=True
+            )
+
+        if change < opts.tolerance or level == opts.max_levels:
+            break
+        previous = avg
+
+        if opts.marker == "grain_boundary":
+            cells = grain_boundary_cells(ldr.mesh, ldr.cell_tags)
+        else:
+            cells = mark_maximum(
+                stress_error_indicator(ldr.mesh, stress), opts.fraction, comm
+            )
+
+        inherit = ldr.polycrystal_data.use_meshtags
+        new_mesh, new_tags = refine_cells(
+            ldr.mesh, cells, ldr.cell_tags if inherit else None
+        )
+        mesh_data = mesh.MeshLoader.from_mesh(
+            job.mesh_input, new_mesh, new_tags
+        )
+        ldr = process.loader = type(ldr)(job, mesh_data=mesh_data)
+
+    if comm.rank == 0:
+        np.savez(
+            "adaptive.npz",
+            **dict(zip(
+                ("level", "cells", "dofs", "change", "solve_time"),
+                np.array(history).T
+            ))
+        )
+
+    return uh
@@ -0,0 +1,154 @@
+"""Mesh convergence study for linear elasticity
+
+The job is solved on box meshes of increasing divisions. The solution on
+each mesh is interpolated to the next as the initial guess of the iterative
+solver, and the grain averages of the chosen fields are compared between
+levels. The study stops as soon as they change by less than the tolerance;
+the coarser mesh of the last pair is then the cheapest adequate mesh.
+"""
+import numpy as np
+from dolfinx.common import Timer
+
+from ..utils import grain_averages
+from ..utils.interpolation import NonmatchingInterpolator
+
+
+def relative_change(new, old):
+    """Relative change of an array
+
+    Parameters
+    ----------
+    new, old: array
+       new and old values
+
+    Returns
+    -------
+    float
+       norm of the difference relative to the norm of the new values
+    """
+    return np.linalg.norm(new - old) / max(
+        np.linalg.norm(new), np.finfo(float).tiny
+    )
+
+
+def _divisions(divisions, dim):
+    return tuple(int(n) for n in np.broadcast_to(divisions, (dim,)))
+
+
+def run(process):
+    """Solve on meshes of increasing divisions until the averages converge
+
+    Parameters
+    ----------
+    process: LinearElasticity
+       the process; its loader is replaced at each level
+
+    Returns
+    -------
+    dolfinx Function
+       the displacement on the last mesh
+    """
+    ldr = process.loader
+    opts = ldr.options.convergence
+    job = ldr.job
+    if job.mesh_input.source != "box":
+        raise ValueError('mesh convergence study requires a "box" mesh')
+
+    dim = len(job.mesh_input.extents)
+    comm = ldr.mesh.comm
+    history, changes = [], {name: [] for name in opts.fields}
+    previous, uh, adequate = None, None, -1
+
+    for level, divisions in enumerate(opts.divisions):
+        current = _divisions(ldr.job.mesh_input.divisions, dim)
+        if _divisions(divisions, dim) != current:
+            mesh_input = job.mesh_input._replace(divisions=divisions)
+            ldr = process.loader = type(ldr)(
+                job._replace(mesh_input=mesh_input), comm=comm
+            )
+
+        guess = None
+        if uh is not None:
+            guess = NonmatchingInterpolator(ldr.V, uh.function_space)(uh)
+        with Timer() as t:
+            uh = process.solve(guess)
+            elapsed = t.elapsed()
+
+        fields = process.derived_fields(uh, ldr)
+        _, averages = grain_averages(
+            ldr.mesh, ldr.cell_tags, ldr.polycrystal_data.num_grains,
+            {name: fields[name] for name in opts.fields},
+            chunk_size=ldr.options.chunk_size, samples=ldr.subcell_samples
+        )
+        for name in opts.fields:
+            changes[name].append(
+                np.inf if previous is None
+                else relative_change(averages[name], previous[name])
+            )
+        change = max(c[-1] for c in changes.values())
+
+        num_cells = ldr.mesh.topology.index_map(ldr.mesh.topology.dim)
+        imap = ldr.V.dofmap.index_map
+        num_dofs = imap.size_global * ldr.V.dofmap.index_map_bs
+        history.append((level, num_cells.size_global, num_dofs, elapsed))
+        if comm.rank == 0:
+            print(
+                f"convergence level {level}: divisions: {divisions}, "
+                f"cells: {num_cells.size_global}, dofs: {num_dofs}, "
+                f"change in grain averages: {change:.3e}", flush=True
+            )
+
+        if change < opts.tolerance:
+            adequate = level - 1
+            break
+        previous = averages
+
+    if comm.rank == 0:
+        write_report(opts, history, changes, adequate)
+
+    return uh
+
+
+def write_report(opts, history, changes, adequate,
+                 filename="convergence.npz", report="convergence.txt"):
+    """Save the convergence history and a summary
+
+    Parameters
+    ----------
+    opts: inputs.options.Convergence
+       the study options
+    history: list of tuple
+       level, number of cells, number of dofs and solve time of each level
+    changes: dict
+       relative change in grain averages of each field at each level
+    adequate: int
+       the cheapest adequate level, or -1 if the study did not converge
+    filename: str, default="convergence.npz"
+       name of the history file
+    report: str, default="convergence.txt"
+       name of the summary file
+    """
+    level, cells, dofs, solve_time = np.array(history).T
+    np.savez(
+        filename, level=level, cells=cells, dofs=dofs, solve_time=solve_time,
+        adequate_level=adequate,
+        **{f"change_{name}": np.array(c) for name, c in changes.items()}
+    )
+
+    lines = [f"tolerance: {opts.tolerance}"]
+    for i in range(len(history)):
+        change = ", ".join(
+            f"{name}: {c[i]:.3e}" for name, c in changes.items()
+        )
+        lines.append(
+            f"level {i}: divisions {opts.divisions[i]}, cells {int(cells[i])}"
+            f", dofs {int(dofs[i])}, time {solve_time[i]:.3g}, {change}"
+        )
+    if adequate >= 0:
+        lines.append(
+            f"converged: adequate divisions {opts.divisions[adequate]}"
+        )
+    else:
+        lines.append("not converged")
+    with open(report, "w") as f:
+        f.write("\n".join(lines) + "\n")
@@ -1,4 +1,6 @@
 """Heat Transfer"""
+import os
+
 import numpy as np
 from dolfinx import fem, log, io
 from dolfinx.common import Timer
@@ -10,10 +12,15 @@ from ..loaders import mesh
 from ..loaders import material
 from ..loaders import polycrystal
 from ..loaders import deformation
+from ..loaders.mesh.grain_partition import report_fragmentation
+from ..loaders.tag_cache import load_grain_tags, tag_cache_file
 
 from ..forms.heat_transfer import HeatTransferProblem
-from ..forms.common import grain_volume, grain_integral
-from ..utils import grain_volumes, grain_integrals
+from ..utils import grain_averages, open_output, write_grain_sorted
+from ..utils.output import shared_mesh_file
+from ..utils.probes import probe_values
+from ..utils.roi import region_of_interest
+from .reuse import input_keys, reused_pieces
 
 
 class HeatTransfer:
@@ -23,11 +30,16 @@ class HeatTransfer:
     ----------
     job: inputs.job.Job
        user inputs for this job
+    previous: _Loader, optional
+       loader of the previous job; pieces with the same inputs are reused
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes running the job
     """
     name = "heat-transfer"
+    solution_name = "temperature"
 
-    def __init__(self, job):
-        self.loader = _Loader(job)
+    def __init__(self, job, previous=None, comm=MPI.COMM_WORLD):
+        self.loader = _Loader(job, previous=previous, comm=comm)
         self.mpirank = self.loader.mesh.comm.rank
 
     def run(self):
@@ -35,12 +47,7 @@ class HeatTransfer:
 
         # Fill in the forms.
 
-        coeffs = ldr.problem.coefficients
-        coeffs.orientation.x.array[:] = ldr.orientation_fld.x.array
-        coeffs.stiffness.x.array[:] = ldr.stiffness_fld.x.array
-        coeffs.body_heat.x.array[:] = ldr.body_heat.x.array
-        for fbc in ldr.flux_bcs:
-            coeffs.fluxes.append(fbc)
+        self.set_coefficients()
         a, L = ldr.problem.forms
 
         # Make temperature BCs.
@@ -56,10 +63,18 @@ class HeatTransfer:
         # Set up the linear problem and solve.
 
         mybcs = ldr.temperature_bcs
-        linprob = LinearProblem(
-            a, L, bcs=mybcs,
-            petsc_options=default_petsc_options
-        )
+        linprob = ldr.linear_problem
+        if linprob is None or ldr.problem.coefficients.fluxes:
+            linprob = LinearProblem(
+                a, L, bcs=mybcs,
+                petsc_options=default_petsc_options
+            )
+            if not ldr.problem.coefficients.fluxes:
+                ldr.linear_problem = linprob
+        else:
+            # Reuse the compiled forms and PETSc objects.
+            linprob.bcs = mybcs
+            linprob.u.x.array[:] = 0.
 
         with Timer() as t:
             print("starting linear solver", flush=True)
@@ -75,113 +90,175 @@ class HeatTransfer:
         print("postprocessing ...")
         self.postprocess(uh, ldr)
 
+    def set_coefficients(self):
+        """Fill in the form coefficients from the loaded inputs"""
+        ldr = self.loader
+        coeffs = ldr.problem.coefficients
+        coeffs.orientation.x.array[:] = ldr.orientation_fld.x.array
+        coeffs.stiffness.x.array[:] = ldr.stiffness_fld.x.array
+        coeffs.body_heat.x.array[:] = ldr.body_heat.x.array
+        coeffs.fluxes.clear()
+        for fbc in ldr.flux_bcs:
+            coeffs.fluxes.append(fbc)
+
+    def derived_fields(self, uh, ldr):
+        """Return expressions for the fields derived from the temperature
+
+        Parameters
+        ----------
+        uh: dolfinx Function
+           the temperature
+        ldr: _Loader
+           the loader for this process
+
+        Returns
+        -------
+        dict
+           UFL expressions for "temperature" and "flux"
+        """
+        return {"temperature": uh, "flux": ldr.problem.flux(uh)}
+
     def postprocess(self, uh, ldr):
         """Write primary variables and compute grain averaged values"""
+        uh.name = "temperature"
+        ldr.cell_tags.name = "grain-ids"
+
         # Compute flux field first.
-        flux_form = ldr.problem.flux(uh)
+        fields = self.derived_fields(uh, ldr)
         flux_expr = fem.Expression(
-            flux_form, ldr.V3.element.interpolation_points()
+            fields["flux"], ldr.V3.element.interpolation_points()
         )
         flux_fun = fem.Function(ldr.V3, name="flux")
         flux_fun.interpolate(flux_expr)
 
-        with io.XDMFFile(ldr.mesh.comm, "output.xdmf", "w") as file:
-            file.write_mesh(ldr.mesh)
-            file.write_meshtags(ldr.cell_tags, ldr.mesh.geometry)
-            file.write_function(uh)
-            file.write_function(flux_fun)
-
-        # Now compute grain volumes.
-        gv_form, indic = grain_volume(ldr.mesh)
-        g_volumes = grain_volumes(
-            ldr.mesh.comm, gv_form, indic, ldr.grain_cells
-        )
-        num_grains = len(g_volumes)
-
-        # Next, compute grain integrals and grain-averaged values.
-        indmap = ldr.mesh.topology.index_map(ldr.mesh.topology.dim)
-        allcells = np.arange(indmap.size_local).astype(np.int32)
-
-        # Integrate temperatures.
-        gi_form, indicator, func = grain_integral(ldr.mesh, ldr.V)
-
-        temp_ints = grain_integrals(
-            ldr.mesh.comm, gi_form, indicator, func, ldr.grain_cells, uh
-        )
-
-        # Integrate fluxes.
-        V = fem.functionspace(ldr.mesh, ("DG", 0))
-        gi_form, indicator, func = grain_integral(ldr.mesh, V)
-
-        flux_ints = np.zeros((num_grains, 3))
-        flux_i = fem.Function(V)
-
-        for i in range(3):
-            flux_i_expr = fem.Expression(
-                flux_fun[i], V.element.interpolation_points()
+        out_mesh, out_tags, out_funcs = ldr.mesh, ldr.cell_tags, [uh, flux_fun]
+        shared_mesh = None
+        if ldr.options.roi:
+            out_mesh, out_tags, out_funcs = region_of_interest(
+                ldr.mesh, ldr.cell_tags, out_funcs,
+                grains=ldr.options.roi_grains, box=ldr.options.roi_box
             )
-            flux_i.interpolate(flux_i_expr, allcells)
-
-            flux_ints[:, i] = grain_integrals(
-                ldr.mesh.comm, gi_form, indicator, func, ldr.grain_cells,
-                flux_i
+        elif ldr.options.shared_mesh:
+            shared_mesh = shared_mesh_file(ldr.job, ldr.mesh.comm)
+        with open_output(
+                ldr.options.output_format, out_mesh, out_tags, out_funcs,
+                async_output=ldr.options.async_output,
+                queue_size=ldr.options.output_queue_size,
+                shared_mesh=shared_mesh
+        ) as output:
+            output.write()
+
+        if ldr.options.probes:
+            probed = probe_values(
+                ldr.options.probes, {f.name: f for f in [uh, flux_fun]}
             )
+            if self.mpirank == 0:
+                np.savez("probes.npz", **probed)
+
+        num_grains = ldr.polycrystal_data.num_grains
+        if ldr.options.grain_sorted:
+            write_grain_sorted(ldr.mesh, ldr.cell_tags, num_grains, [flux_fun])
+
+        # Now compute grain volumes and grain-averaged values.
+        g_volumes, averages = grain_averages(
+            ldr.mesh, ldr.cell_tags, num_grains,
+            {"temperature": uh, "flux": flux_fun},
+            chunk_size=ldr.options.chunk_size
+        )
 
         if self.mpirank == 0:
-            nz = g_volumes > 0.
-            nnz = np.count_nonzero(g_volumes > 0)
-            gvnnz = g_volumes[nz].reshape(nnz)
-
-            temp_avg = np.zeros_like(temp_ints)
-            temp_avg[nz] = temp_ints[nz] / gvnnz
-
-            flux_avg = np.zeros((num_grains, 3))
-            flux_avg[nz] = flux_ints[nz] / gvnnz.reshape(nnz, 1)
-            np.savez("grain-averages.npz", volume=g_volumes,
-                     temperature=temp_avg, flux=flux_avg)
+            np.savez("grain-averages.npz", volume=g_volumes, **averages)
 
 
 class _Loader:
 
-    def __init__(self, job):
+    def __init__(self, job, previous=None, comm=MPI.COMM_WORLD):
 
         self.job = job
+        self.options = job.run_options
+        self.comm = comm
+
+        # Pieces of the previous job's loader with the same inputs are
+        # reused.
+        self.keys = input_keys(job)
+        reuse = reused_pieces(previous, self.keys)
 
         # Material Data
         self.material_data = material.HeatTransfer(job.material_input)
 
-        # Mesh Data and Function Spaces
-        self.mesh_data = mesh.MeshLoader(job.mesh_input)
+        # Mesh Data
+        if "mesh" in reuse:
+            self.mesh_data = previous.mesh_data
+        else:
+            cache_dir = None
+            if self.options.mesh_cache:
+                cache_dir = os.path.relpath(
+                    job.mesh_cache_directory, job.output_directory
+                )
+            self.mesh_data = mesh.MeshLoader(
+                job.mesh_input, cache_dir, comm=comm
+            )
 
-        self.problem = HeatTransferProblem(self.mesh)
-        self.V = self.problem.V
-        self.V3 = self.problem.V3
-        self.T = self.problem.T
+        if "polycrystal" in reuse:
+            # Microstructure Data and Function Spaces
+            for name in (
+                    "polycrystal_data", "cell_tags", "problem",
+                    "linear_problem", "grain_cells", "orientation_fld"
+            ):
+                setattr(self, name, getattr(previous, name))
+            self.V = self.problem.V
+            self.V3 = self.problem.V3
+            self.T = self.problem.T
+        else:
+            self._load_microstructure()
+
+        if "material" in reuse:
+            self._stiffness_fld = previous._stiffness_fld
+        else:
+            self._stiffness_fld = self._make_stiffness_fld()
+
+        # Deformation Data
+        self.deformation_data = deformation.HeatTransfer(
+            job.deformation_input
+        )
+        self.body_heat = self.deformation_data.body_heat(self.V)
 
+    def _load_microstructure(self):
         # Microstructure Data
         self.polycrystal_data = polycrystal.Polycrystal(
-            job.polycrystal_input
+            self.job.polycrystal_input, chunk_size=self.options.chunk_size,
+            num_threads=self.options.num_threads, comm=self.comm
         )
         if self.polycrystal_data.use_meshtags:
             self.cell_tags = self.mesh_data.cell_tags
             print("using cell tags from gmsh input file")
         else:
-            self.cell_tags = self.polycrystal_data.grain_cell_tags(
-                self.mesh
+            self.cell_tags, _ = load_grain_tags(
+                self.polycrystal_data, self.mesh,
+                self.mesh_data.structured_grid,
+                filename=tag_cache_file(self.job, self.mesh_data)
+            )
+        if self.options.grain_partition:
+            self.cell_tags = self.mesh_data.repartition_by_grain(
+                self.cell_tags, self.polycrystal_data.num_grains
+            )
+            report_fragmentation(
+                self.mesh, self.cell_tags, self.polycrystal_data.num_grains
             )
+
+        # Function Spaces
+        self.problem = HeatTransferProblem(self.mesh)
+        self.linear_problem = None
+        self.V = self.problem.V
+        self.V3 = self.problem.V3
+        self.T = self.problem.T
+
         self.grain_cells = self.polycrystal_data.grain_cell_dict(
             self.cell_tags
         )
         self.orientation_fld = self.polycrystal_data.orientation_field(
             self.T, self.grain_cells
         )
-        self._stiffness_fld = self._make_stiffness_fld()
-
-        # Deformation Data
-        self.deformation_data = deformation.HeatTransfer(
-            job.deformation_input
-        )
-        self.body_heat = self.deformation_data.body_heat(self.V)
 
     @property
     def mesh(self):
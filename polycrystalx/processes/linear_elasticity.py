@@ -1,4 +1,5 @@
 """Elastic Process"""
+import os
 import time
 
 import xml.etree.ElementTree as ET
@@ -16,11 +17,23 @@ from ..loaders import mesh
 from ..loaders import material
 from ..loaders import polycrystal
 from ..loaders import deformation
-from ..forms.common import sigs_3x3, sigs_thermal, grain_volume, grain_integral
+from ..loaders.mesh.grain_partition import report_fragmentation
+from ..loaders.tag_cache import load_grain_tags, tag_cache_file
+from ..forms.common import sigs_3x3, sigs_thermal
 from ..forms.linear_elasticity import (
     LinearElasticity as LinearElasticityProblem
 )
-from ..utils import grain_volumes, grain_integrals
+from .. import derived, mixing
+from . import adaptive, convergence, submodel
+from .reuse import input_keys, reused_pieces
+from ..utils import (
+    grain_averages, grain_hotspots, cell_function, open_output, flush_output,
+    write_grain_sorted
+)
+from ..utils.output import shared_mesh_file
+from ..utils.xdmffile_ext import index_names
+from ..utils.probes import probe_values
+from ..utils.roi import region_of_interest
 
 
 default_petsc_options={
@@ -39,42 +52,79 @@ class LinearElasticity:
     ----------
     job: input.Job
        user inputs for this job
-
+    previous: _Loader, optional
+       loader of the previous job; pieces with the same inputs are reused
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes running the job
     """
     name = "linear-elasticity"
+    solution_name = "displacement"
 
-    def __init__(self, job):
-        self.loader = _Loader(job)
+    def __init__(self, job, previous=None, comm=MPI.COMM_WORLD):
+        self.loader = _Loader(job, previous=previous, comm=comm)
         self.mpirank = self.loader.mesh.comm.rank
         print("My rank is ", self.mpirank)
 
     def run(self):
         """Run the problem"""
         print("running problem", flush=True)
-        print("creating loader", flush=True)
+        options = self.loader.options
+        if options.adaptive is not None:
+            uh = adaptive.run(self)
+        elif options.convergence is not None:
+            uh = convergence.run(self)
+        elif options.submodel is not None:
+            uh = submodel.run(self)
+        else:
+            uh = self.solve()
+
+        print("postprocessing")
+        self.postprocess(uh, self.loader)
+
+        return uh
+
+    def solve(self, initial_guess=None):
+        """Solve the problem with the current loader
+
+        Parameters
+        ----------
+        initial_guess: dolfinx Function, optional
+           starting displacement for the iterative solver, on the current
+           displacement space
+
+        Returns
+        -------
+        dolfinx Function
+           the displacement
+        """
         ldr = self.loader
 
         print("evaluating coefficients", flush=True)
-
-        coeffs = ldr.problem.coefficients
-        coeffs.orientation.x.array[:] = ldr.orientation_fld.x.array
-        cstiff = ldr.stiffness_fld
-        coeffs.stiffness.x.array[:] = cstiff.x.array
-        coeffs.body_force.x.array[:] = ldr.force_density.x.array
-        if (_texp := ldr.thermal_expansion) is not None:
-            coeffs.thermal_expansion.x.array[:] = _texp.x.array
-        for tbc in ldr.traction_bcs:
-            coeffs.tractions.append(tbc)
+        self.set_coefficients()
         a, L = ldr.problem.forms
 
         print("making displacement bcs", flush=True)
         mybcs = ldr.displacement_bcs
-        print("setting up linear problem", flush=True)
-        problem = LinearProblem(
-            a, L, bcs=mybcs,
-            petsc_options=default_petsc_options
-        )
-        # petsc_options={"ksp_type": "preonly", "pc_type": "lu"}
+        # The compiled forms and PETSc objects of a problem without tractions
+        # depend only on the function spaces, so they are kept on the loader
+        # and reused with the new coefficient values.
+        problem = ldr.linear_problem
+        if problem is None or ldr.problem.coefficients.tractions:
+            print("setting up linear problem", flush=True)
+            problem = LinearProblem(
+                a, L, bcs=mybcs,
+                petsc_options=default_petsc_options
+            )
+            # petsc_options={"ksp_type": "preonly", "pc_type": "lu"}
+            if not ldr.problem.coefficients.tractions:
+                ldr.linear_problem = problem
+        else:
+            print("reusing linear problem", flush=True)
+            problem.bcs = mybcs
+            problem.u.x.array[:] = 0.
+        problem.solver.setInitialGuessNonzero(initial_guess is not None)
+        if initial_guess is not None:
+            problem.u.x.array[:] = initial_guess.x.array
 
         with Timer() as t:
             print("starting linear solver", flush=True)
@@ -88,119 +138,191 @@ class LinearElasticity:
             msg = f"solver diverged: iterations = {solver.its}"
             raise RuntimeError(msg)
 
-        print("postprocessing")
-        self.postprocess(uh, ldr)
-
         return uh
 
-    def postprocess(self, uh, ldr):
-        """Compute strains and stresses and write output"""
-        # Write the XDMF File.
+    def set_coefficients(self):
+        """Fill in the form coefficients from the loaded inputs"""
+        ldr = self.loader
+        coeffs = ldr.problem.coefficients
+        coeffs.orientation.x.array[:] = ldr.orientation_fld.x.array
+        cstiff = ldr.stiffness_fld
+        coeffs.stiffness.x.array[:] = cstiff.x.array
+        coeffs.body_force.x.array[:] = ldr.force_density.x.array
+        # The coefficients may hold the values of an earlier job.
+        if (_texp := ldr.thermal_expansion) is not None:
+            coeffs.thermal_expansion.x.array[:] = _texp.x.array
+        else:
+            coeffs.thermal_expansion.x.array[:] = 0.
+        # The plastic distortion is not applied yet.
+        coeffs.plastic_distortion.x.array[:] = 0.
+        coeffs.tractions.clear()
+        for tbc in ldr.traction_bcs:
+            coeffs.tractions.append(tbc)
 
-        uh.name = "displacement"
-        ldr.cell_tags.name = "grain-ids"
+    def derived_fields(self, uh, ldr):
+        """Return expressions for the fields derived from the displacement
 
+        Parameters
+        ----------
+        uh: dolfinx Function
+           the displacement
+        ldr: _Loader
+           the loader for this process
+
+        Returns
+        -------
+        dict
+           UFL expressions for "strain" and "stress"
+        """
         strain_form = ufl.sym(ufl.grad(uh))
-        strain_expr = fem.Expression(
-            strain_form, ldr.T.element.interpolation_points()
-        )
-        strain = fem.Function(ldr.T, name="strain")
-        strain.interpolate(strain_expr)
 
         texp = ldr.problem.coefficients.thermal_expansion
-
         stress_form = sigs_3x3(uh, ldr.stiffness_fld, ldr.orientation_fld)
         if texp is not None:
             stress_form -= sigs_thermal(
                 texp, ldr.stiffness_fld, ldr.orientation_fld
             )
-        stress_expr = fem.Expression(
-            stress_form, ldr.T.element.interpolation_points()
-        )
-        stress = fem.Function(ldr.T, name="stress")
-        stress.interpolate(stress_expr)
 
-        with io.XDMFFile(ldr.mesh.comm, "output.xdmf", "w") as file:
-            file.write_mesh(ldr.mesh)
-            file.write_meshtags(ldr.cell_tags, ldr.mesh.geometry)
-            file.write_function(uh)
-            file.write_function(strain)
-            file.write_function(stress)
-            if texp is not None:
-                texp.name = "thermal_expansion"
-                file.write_function(texp)
+        return {"strain": strain_form, "stress": stress_form}
 
-        # Compute grain volumes.
+    def derived_quantities(self, strain, stress, ldr):
+        """Compute cellwise quantities derived from the stress and strain
 
-        print("finding grain volumes")
-        with Timer() as t:
-            gv_form, indic = grain_volume(ldr.mesh)
-            g_volumes = grain_volumes(
-                ldr.mesh.comm, gv_form, indic, ldr.grain_cells
-            )
-            elapsed = t.elapsed()
-        if self.mpirank == 0:
-            print(f"total volume: {np.sum(g_volumes)}", flush=True)
-            print(f"time for volume calculation: {elapsed}")
+        The quantities listed in the `derived_fields` option are computed for
+        all local cells at once from the cellwise strain and stress arrays.
 
-        # Compute grain integrals.
+        Parameters
+        ----------
+        strain: dolfinx Function
+           the cellwise strain
+        stress: dolfinx Function
+           the cellwise stress
+        ldr: _Loader
+           the loader for this process
+
+        Returns
+        -------
+        dict
+           arrays of values on local cells, by name
+        """
+        names = list(ldr.options.derived_fields)
+        if ldr.options.hotspots > 0 and "von_mises" not in names:
+            names.append("von_mises")
 
-        eps_int = np.zeros((num_grains := len(g_volumes), 6))
-        sig_int = np.zeros((num_grains := len(g_volumes), 6))
+        n = ldr.mesh.topology.index_map(ldr.mesh.topology.dim).size_local
+        sig = stress.x.array[:9 * n].reshape(n, 3, 3)
+        eps = strain.x.array[:9 * n].reshape(n, 3, 3)
+        elastic_eps = None
+        if (texp := ldr.problem.coefficients.thermal_expansion) is not None:
+            rot = ldr.orientation_fld.x.array[:9 * n].reshape(n, 3, 3)
+            epsc = texp.x.array[:9 * n].reshape(n, 3, 3)
+            elastic_eps = eps - rot @ epsc @ rot.transpose(0, 2, 1)
 
-        V = fem.functionspace(ldr.mesh, ("DG", 0))
-        gi_form, indicator, func = grain_integral(ldr.mesh, V)
+        return derived.compute(names, sig, eps, elastic_eps)
 
-        indmap = ldr.mesh.topology.index_map(ldr.mesh.topology.dim)
-        allcells = np.arange(indmap.size_local).astype(np.int32)
-        eps_fun = fem.Function(V)
-        sig_fun = fem.Function(V)
+    def postprocess(self, uh, ldr):
+        """Compute strains and stresses and write output"""
+        # Write the XDMF File.
+
+        uh.name = "displacement"
+        ldr.cell_tags.name = "grain-ids"
+
+        fields = self.derived_fields(uh, ldr)
+        points = ldr.T.element.interpolation_points()
+
+        strain = fem.Function(ldr.T, name="strain")
+        strain.interpolate(fem.Expression(fields["strain"], points))
+        stress = fem.Function(ldr.T, name="stress")
+        stress.interpolate(fem.Expression(fields["stress"], points))
+
+        texp = ldr.problem.coefficients.thermal_expansion
+        functions = [uh, strain, stress]
+        if texp is not None:
+            texp.name = "thermal_expansion"
+            functions.append(texp)
 
         with Timer() as t:
-            indmap = {
-                0: (0, 0), 1: (1, 1), 2: (2, 2),
-                3: (1, 2), 4: (0, 2), 5: (0, 1)
-            }
-            for i in range(6):
-                j0, j1 = indmap[i]
-
-                eps_expr = fem.Expression(
-                    strain[j0, j1], V.element.interpolation_points()
-                )
-                eps_fun.interpolate(eps_expr, allcells)
-                eps_int[:, i] = grain_integrals(
-                    ldr.mesh.comm, gi_form, indicator, func, ldr.grain_cells,
-                    eps_fun
-                )
+            quantities = self.derived_quantities(strain, stress, ldr)
+            if self.mpirank == 0 and quantities:
+                print(f"time for derived quantities: {t.elapsed()}")
+        derived_funcs = {
+            name: cell_function(ldr.mesh, name, values)
+            for name, values in quantities.items()
+            if name in ldr.options.derived_fields
+            or name == "principal_directions"
+        }
+        functions.extend(derived_funcs.values())
+
+        output_format = ldr.options.output_format
+        out_mesh, out_tags, out_funcs = ldr.mesh, ldr.cell_tags, functions
+        shared_mesh = None
+        if ldr.options.roi:
+            out_mesh, out_tags, out_funcs = region_of_interest(
+                ldr.mesh, ldr.cell_tags, functions,
+                grains=ldr.options.roi_grains, box=ldr.options.roi_box
+            )
+        elif ldr.options.shared_mesh:
+            shared_mesh = shared_mesh_file(ldr.job, ldr.mesh.comm)
+        with open_output(
+                output_format, out_mesh, out_tags, out_funcs,
+                async_output=ldr.options.async_output,
+                queue_size=ldr.options.output_queue_size,
+                shared_mesh=shared_mesh
+        ) as output:
+            output.write()
+
+        if ldr.options.probes:
+            probed = probe_values(
+                ldr.options.probes, {f.name: f for f in functions}
+            )
+            if self.mpirank == 0:
+                np.savez("probes.npz", **probed)
 
-                sig_expr = fem.Expression(
-                    stress[j0, j1], V.element.interpolation_points()
-                )
-                sig_fun.interpolate(sig_expr, allcells)
-                sig_int[:, i] = grain_integrals(
-                    ldr.mesh.comm, gi_form, indicator, func, ldr.grain_cells,
-                    sig_fun
-                )
+        num_grains = ldr.polycrystal_data.num_grains
+        if ldr.options.grain_sorted:
+            write_grain_sorted(ldr.mesh, ldr.cell_tags, num_grains, functions)
+
+        # Compute grain volumes and grain averages.
 
+        print("finding grain averages")
+        averaged = {"strain": strain, "stress": stress}
+        averaged.update(
+            (name, f) for name, f in derived_funcs.items()
+            if name != "principal_directions"
+        )
+        with Timer() as t:
+            g_volumes, averages = grain_averages(
+                ldr.mesh, ldr.cell_tags, num_grains, averaged,
+                chunk_size=ldr.options.chunk_size,
+                samples=ldr.subcell_samples
+            )
             elapsed = t.elapsed()
 
-        if self.mpirank == 0:
-            print(f"time for grain integrals calculation: {elapsed}")
+        if (k := ldr.options.hotspots) > 0:
+            cells, values = grain_hotspots(
+                ldr.mesh, ldr.cell_tags, num_grains,
+                quantities["von_mises"], k
+            )
+            if self.mpirank == 0:
+                averages["hotspot_cells"] = cells
+                averages["hotspot_von_mises"] = values
 
         if self.mpirank == 0:
-            eps_avg = np.zeros_like(eps_int)
-            sig_avg = np.zeros_like(eps_int)
-            nz = g_volumes > 0.
-            nnz = np.count_nonzero(g_volumes > 0)
-            eps_avg[nz] = eps_int[nz]/g_volumes[nz].reshape(nnz, 1)
-            sig_avg[nz] = sig_int[nz]/g_volumes[nz].reshape(nnz, 1)
+            print(f"total volume: {np.sum(g_volumes)}", flush=True)
+            print(f"time for grain averages calculation: {elapsed}")
             np.savez(
-                "grain-averages.npz", volume=g_volumes, strain=eps_avg, stress=sig_avg
+                "grain-averages.npz", volume=g_volumes, **averages
             )
 
-            self.write_xdmf()
+        if output_format == "xdmf":
+            # The field output must be complete before it is rewritten.
+            flush_output(ldr.mesh.comm)
+            if self.mpirank == 0:
+                self.write_xdmf(extra=[f.name for f in functions[3:]])
 
-    def write_xdmf(self, output="output.xdmf", paraview="paraview.xdmf"):
+    def write_xdmf(
+            self, output="output.xdmf", paraview="paraview.xdmf", extra=()
+    ):
         """This puts all the data into the same grid
 
         This writes two XDMF files--the usual output file written using the
@@ -213,6 +335,8 @@ class LinearElasticity:
             name of output XDMF file
         paraview: str or Path, default = "paraview.xdmf"
             name of XMDF file for paraview
+        extra: list of str, default=()
+            names of fields written after the stress, in order
         """
 
         ATTR = "Attribute"
@@ -223,6 +347,10 @@ class LinearElasticity:
         tree = ET.parse(output)
         root = tree.getroot()
         domain = root[0]
+        # The input indices are only for reading the output back.
+        for grid in domain.findall("Grid"):
+            if grid.get(NAME) in index_names.values():
+                domain.remove(grid)
         meshgrid = domain[0]
 
         mtags = domain[1].find(ATTR)
@@ -241,18 +369,15 @@ class LinearElasticity:
         stress.attrib[NAME] = "stress"
         meshgrid.append(stress)
 
-        try:
-            texp = domain[5][0].find(ATTR)
-            texp.attrib[NAME] = "thermal_expansion"
-            meshgrid.append(texp)
-            domain.remove(domain[5])
-        except:
-            pass
+        # Further fields (thermal expansion, derived quantities) follow.
+
+        for i, name in enumerate(extra, start=5):
+            attr = domain[i][0].find(ATTR)
+            attr.attrib[NAME] = name
+            meshgrid.append(attr)
 
-        domain.remove(domain[4])
-        domain.remove(domain[3])
-        domain.remove(domain[2])
-        domain.remove(domain[1])
+        for i in range(4 + len(extra), 0, -1):
+            domain.remove(domain[i])
 
         # Write the modified tree.
 
@@ -261,52 +386,114 @@ class LinearElasticity:
 
 class _Loader:
 
-    def __init__(self, input_mod):
+    def __init__(
+            self, input_mod, mesh_data=None, previous=None,
+            comm=MPI.COMM_WORLD
+    ):
 
         self.input_module = input_mod
+        self.job = input_mod
+        self.options = input_mod.run_options
+        self.comm = comm if mesh_data is None else mesh_data.mesh.comm
+
+        # Pieces of the previous job's loader with the same inputs are
+        # reused; refined meshes are never reused.
+        refined = mesh_data is not None
+        self.keys = None if refined else input_keys(input_mod)
+        reuse = reused_pieces(previous, self.keys)
 
         # Material Data
         self.material_data = material.LinearElasticity(input_mod.material_input)
 
-        # Mesh Data and Function Spaces
-        self.mesh_data = mesh.MeshLoader(input_mod.mesh_input)
+        # Mesh Data
+        if "mesh" in reuse:
+            mesh_data = previous.mesh_data
+        elif mesh_data is None:
+            cache_dir = None
+            if self.options.mesh_cache:
+                cache_dir = os.path.relpath(
+                    input_mod.mesh_cache_directory, input_mod.output_directory
+                )
+            mesh_data = mesh.MeshLoader(
+                input_mod.mesh_input, cache_dir, comm=self.comm
+            )
+        self.mesh_data = mesh_data
+
+        if "polycrystal" in reuse:
+            # Microstructure Data and Function Spaces
+            for name in (
+                    "polycrystal_data", "subcell_samples", "cell_tags",
+                    "problem", "linear_problem", "grain_cells",
+                    "orientation_fld"
+            ):
+                setattr(self, name, getattr(previous, name))
+            self.V = self.problem.V
+            self.T = self.problem.T
+            self.T6 = self.problem.T6
+        else:
+            self._load_microstructure(refined)
 
-        self.problem = LinearElasticityProblem(self.mesh)
-        self.V = self.problem.V
-        self.T = self.problem.T
-        self.T6 = self.problem.T6
+        if "material" in reuse:
+            self._stiffness_fld = previous._stiffness_fld
+        else:
+            self._stiffness_fld = self._make_stiffness_fld()
+            if self.subcell_samples is not None:
+                self._mix_stiffness()
 
+        # Deformation Data
+        self.deformation_data = deformation.LinearElasticity(
+            input_mod.deformation_input
+        )
+        self.force_density = self.deformation_data.force_density(self.V)
+
+        self.thermal_expansion = self.deformation_data.thermal_expansion(
+            self.T
+        )
+        self.plastic_distortion = self.deformation_data.plastic_distortion(
+            self.T
+        )
+
+        # A submodel has the displacement on its whole boundary instead of
+        # the boundary conditions of the deformation input.
+        self.boundary_displacement = None
+
+    def _load_microstructure(self, refined):
         # Microstructure Data
         self.polycrystal_data = polycrystal.Polycrystal(
-            input_mod.polycrystal_input
+            self.job.polycrystal_input, chunk_size=self.options.chunk_size,
+            num_threads=self.options.num_threads, comm=self.comm
         )
+        self.subcell_samples = None
         if self.polycrystal_data.use_meshtags:
             self.cell_tags = self.mesh_data.cell_tags
             print("using cell tags from gmsh input file")
         else:
-            self.cell_tags = self.polycrystal_data.grain_cell_tags(
-                self.mesh
+            self._load_grain_tags(refined)
+        # A refined mesh keeps the partition of its parent.
+        if self.options.grain_partition and not refined:
+            self.cell_tags = self.mesh_data.repartition_by_grain(
+                self.cell_tags, self.polycrystal_data.num_grains
+            )
+            if self.subcell_samples is not None:
+                # The samples of the moved cells are needed.
+                self._load_grain_tags(refined)
+            report_fragmentation(
+                self.mesh, self.cell_tags, self.polycrystal_data.num_grains
             )
+
+        # Function Spaces
+        self.problem = LinearElasticityProblem(self.mesh)
+        self.linear_problem = None
+        self.V = self.problem.V
+        self.T = self.problem.T
+        self.T6 = self.problem.T6
+
         self.grain_cells = self.polycrystal_data.grain_cell_dict(
             self.cell_tags
         )
         self.orientation_fld = self.polycrystal_data.orientation_field(
             self.T, self.grain_cells
         )
-        self._stiffness_fld = self._make_stiffness_fld()
-
-        # Deformation Data
-        self.deformation_data = deformation.LinearElasticity(
-            input_mod.deformation_input
-        )
-        self.force_density = self.deformation_data.force_density(self.V)
-
-        self.thermal_expansion = self.deformation_data.thermal_expansion(
-            self.T
-        )
-        self.plastic_distortion = self.deformation_data.plastic_distortion(
-            self.T
-        )
 
     @property
     def mesh(self):
@@ -331,16 +518,67 @@ class _Loader:
     def _stiffness(self, stf, x):
         return np.tile(stf.reshape(36,1), x.shape[1])
 
+    def _load_grain_tags(self, refined):
+        subcell = self.options.subcell
+        degree = None if subcell is None else subcell.degree
+        # Refined meshes are not cached.
+        cache_file = None
+        if not refined:
+            cache_file = tag_cache_file(self.job, self.mesh_data, degree)
+        self.cell_tags, self.subcell_samples = load_grain_tags(
+            self.polycrystal_data, self.mesh, self.mesh_data.structured_grid,
+            degree, cache_file
+        )
+
+    def _mix_stiffness(self):
+        """Mix the stiffness of cells with more than one grain
+
+        The stiffnesses of the grains at the sample points are mixed in the
+        sample frame, and the result is stored in the frame of the cell's
+        orientation, that of its dominant grain.
+        """
+        samples, fractions = self.subcell_samples
+        mixed = np.flatnonzero(np.any(samples != samples[:, [0]], axis=1))
+        ms = self.polycrystal_data.polycrystal
+        phases = ms.phase(np.arange(ms.num_grains)).astype(int)
+        grain_stiffness = mixing.to_sample(
+            np.array([self.material_data.materials[p].stiffness
+                      for p in phases]),
+            np.asarray(self.polycrystal_data.orientation_list)
+        )
+        stiffness = mixing.mix(
+            grain_stiffness[samples[mixed]],
+            np.broadcast_to(fractions, (len(mixed), len(fractions))),
+            self.options.subcell.mixing
+        )
+
+        orientations = self.orientation_fld.x.array.reshape(-1, 3, 3)
+        R = orientations[self.T.dofmap.list[mixed, 0]]
+        values = self._stiffness_fld.x.array.reshape(-1, 36)
+        values[self.T6.dofmap.list[mixed, 0]] = mixing.to_crystal(
+            stiffness, R
+        ).reshape(-1, 36)
+        self._stiffness_fld.x.scatter_forward()
+        print(f"cells with mixed stiffness: {len(mixed)}")
+
     @property
     def boundary_dict(self):
         return self.mesh_data.boundary_dict
 
     @property
     def displacement_bcs(self):
+        if self.boundary_displacement is not None:
+            bdim = self.mesh.topology.dim - 1
+            dofs = fem.locate_dofs_topological(
+                self.V, bdim, self.boundary_dict["boundary"]
+            )
+            return [fem.dirichletbc(self.boundary_displacement, dofs)]
         return self.deformation_data.displacement_bcs(
             self.V, self.boundary_dict
         )
 
     @property
     def traction_bcs(self):
+        if self.boundary_displacement is not None:
+            return []
         return self.deformation_data.traction_bcs(self.V, self.boundary_dict)
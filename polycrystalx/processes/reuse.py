@@ -0,0 +1,56 @@
+"""Reuse of loaded inputs between jobs
+
+A worker running many jobs keeps the loader of its last job. The next job
+reuses the pieces whose inputs are unchanged: the mesh, the grain IDs with
+the function spaces and orientation field, and the stiffness field. The keys
+are chained, so a piece is reused only if the pieces it depends on are.
+"""
+from ..inputs.hashing import spec_hash
+
+
+def input_keys(job):
+    """Keys of the inputs determining each loaded piece
+
+    Parameters
+    ----------
+    job: inputs.job.Job
+       the job
+
+    Returns
+    -------
+    dict
+       keys for "mesh", "polycrystal" and "material"
+    """
+    opts = job.run_options
+    # A mesh partitioned by grain depends on the polycrystal too.
+    mesh_spec = (job.mesh_input, opts.mesh_cache, opts.grain_partition)
+    if opts.grain_partition:
+        mesh_spec += (job.polycrystal_input,)
+    mesh = spec_hash(mesh_spec)
+    poly = spec_hash((
+        mesh, job.polycrystal_input, opts.subcell, opts.tag_cache
+    ))
+    matl = spec_hash((poly, job.material_input))
+
+    return {"mesh": mesh, "polycrystal": poly, "material": matl}
+
+
+def reused_pieces(previous, keys):
+    """Names of the pieces of a previous loader that can be reused
+
+    Parameters
+    ----------
+    previous: loader or None
+       loader of the previous job, with its `keys`
+    keys: dict or None
+       keys of this job (see `input_keys`), or None for no reuse
+
+    Returns
+    -------
+    set
+       names of the matching pieces
+    """
+    if previous is None or previous.keys is None or keys is None:
+        return set()
+
+    return {name for name, key in keys.items() if previous.keys[name] == key}
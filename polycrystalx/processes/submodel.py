@@ -0,0 +1,102 @@
+"""Submodeling for linear elasticity
+
+The job is solved on its own mesh of the whole specimen, which can be
+coarse. Then a fine box mesh of the submodel region is made, and the coarse
+displacement is interpolated onto it, both as the displacement on the whole
+boundary of the box and as the initial guess of the solver. The local solve
+then costs a small fraction of a fine solve of the whole specimen.
+"""
+import numpy as np
+from dolfinx.common import Timer
+
+from ..utils.interpolation import NonmatchingInterpolator
+
+
+def submodel_job(job):
+    """Job for the submodel box
+
+    The mesh input is replaced by a box mesh with the same name, so the
+    output directory is unchanged.
+
+    Parameters
+    ----------
+    job: inputs.job.Job
+       the job, with the Submodel option
+
+    Returns
+    -------
+    inputs.job.Job
+       the job on the submodel mesh
+    """
+    opts = job.run_options.submodel
+    mesh_input = job.mesh_input
+    celltype = opts.celltype or mesh_input.celltype or "tetrahedron"
+    sub_mesh = mesh_input._replace(
+        source="box", extents=opts.extents, divisions=opts.divisions,
+        celltype=celltype, file=None, boundary_sections=[]
+    )
+
+    return job._replace(mesh_input=sub_mesh)
+
+
+def run(process):
+    """Solve the specimen, then the submodel
+
+    Parameters
+    ----------
+    process: LinearElasticity
+       the process; its loader is replaced by one for the submodel
+
+    Returns
+    -------
+    dolfinx Function
+       the displacement on the submodel mesh
+    """
+    ldr = process.loader
+    job = ldr.job
+    comm = ldr.mesh.comm
+    if ldr.polycrystal_data.use_meshtags:
+        raise ValueError(
+            "submodel requires grain IDs from the polycrystal, not mesh tags"
+        )
+
+    with Timer() as t:
+        u_global = process.solve()
+        global_time = t.elapsed()
+    global_stats = _sizes(ldr) + (global_time,)
+
+    sub_ldr = process.loader = type(ldr)(submodel_job(job), comm=comm)
+    with Timer() as t:
+        interpolate = NonmatchingInterpolator(
+            sub_ldr.V, u_global.function_space
+        )
+        sub_ldr.boundary_displacement = interpolate(u_global)
+        interpolation_time = t.elapsed()
+    with Timer() as t:
+        uh = process.solve(initial_guess=sub_ldr.boundary_displacement)
+        local_time = t.elapsed()
+    local_stats = _sizes(sub_ldr) + (local_time,)
+
+    if comm.rank == 0:
+        print(
+            f"global solve: cells {global_stats[0]}, dofs {global_stats[1]}, "
+            f"time {global_time:.3g}; submodel solve: cells {local_stats[0]}"
+            f", dofs {local_stats[1]}, time {local_time:.3g}", flush=True
+        )
+        np.savez(
+            "submodel.npz",
+            extents=np.asarray(job.run_options.submodel.extents),
+            global_sizes=np.array(global_stats),
+            submodel_sizes=np.array(local_stats),
+            interpolation_time=interpolation_time,
+        )
+
+    return uh
+
+
+def _sizes(ldr):
+    """global numbers of cells and dofs"""
+    cmap = ldr.mesh.topology.index_map(ldr.mesh.topology.dim)
+    imap = ldr.V.dofmap.index_map
+
+    return (cmap.size_global, imap.size_global * ldr.V.dofmap.index_map_bs)
@@ -0,0 +1,187 @@
+"""Suite-wide store of grain-averaged results
+
+The results of all jobs in a suite are kept in a single HDF5 file, with one
+row per job. Each quantity (volume, strain, stress, temperature, flux, ...)
+is a dataset of shape (number of jobs, number of grains) for scalars or
+(number of jobs, number of grains, number of components) otherwise. The
+datasets are chunked in both the job and grain directions, so reading one
+grain across all jobs, or one job across all grains, only reads the chunks
+that contain it. The job keys are kept in the "keys" dataset.
+
+Values that are not available, such as a quantity not computed for a job,
+or grains beyond the number of grains of a job, are NaN.
+"""
+import time
+
+import numpy as np
+import h5py
+
+
+class ResultsStore:
+    """Suite-wide store of grain-averaged results
+
+    Parameters
+    ----------
+    filename: str or Path
+       name of HDF5 file
+    chunks: 2-tuple of int, default=(64, 64)
+       chunk size in the job and grain directions for new datasets
+    """
+
+    KEYS = "keys"
+
+    def __init__(self, filename, chunks=(64, 64)):
+        self.filename = filename
+        self.chunks = chunks
+
+    def append(self, key, results, timeout=60.):
+        """Add results of a job, replacing any previous results for its key
+
+        Parameters
+        ----------
+        key: str
+           job key
+        results: dict
+           dictionary of arrays of grain values, by quantity name; the first
+           dimension of each array is the number of grains
+        timeout: float, default=60.
+           time in seconds to wait for the file if it is in use
+        """
+        with self._open("a", timeout) as h5:
+            keys = self._keys(h5)
+            if key in keys:
+                row = keys.index(key)
+            else:
+                row = len(keys)
+                kds = h5[self.KEYS]
+                kds.resize((row + 1,))
+                kds[row] = key
+                for name in h5:
+                    if name != self.KEYS:
+                        self._resize(h5[name], row + 1, 0)
+
+            for name in results:
+                values = np.asarray(results[name], dtype=np.float64)
+                dset = self._dataset(h5, name, values.shape)
+                self._resize(dset, row + 1, len(values))
+                dset[row] = np.nan
+                dset[row, :len(values)] = values
+
+    def keys(self):
+        """Return list of job keys"""
+        with h5py.File(self.filename, "r") as h5:
+            return self._keys(h5)
+
+    def quantities(self):
+        """Return list of names of stored quantities"""
+        with h5py.File(self.filename, "r") as h5:
+            return [name for name in h5 if name != self.KEYS]
+
+    def job(self, key):
+        """Return results of one job
+
+        Parameters
+        ----------
+        key: str
+           job key
+
+        Returns
+        -------
+        dict
+           dictionary of arrays of grain values, by quantity name
+        """
+        with h5py.File(self.filename, "r") as h5:
+            row = self._row(h5, key)
+            return {
+                name: h5[name][row] for name in h5 if name != self.KEYS
+            }
+
+    def grain(self, gid, quantity):
+        """Return values of one grain for all jobs
+
+        Parameters
+        ----------
+        gid: int
+           grain ID
+        quantity: str
+           name of quantity
+
+        Returns
+        -------
+        array
+           values of `quantity` for grain `gid`, with one row per job
+        """
+        return self.read(quantity, grains=gid)
+
+    def read(self, quantity, jobs=slice(None), grains=slice(None)):
+        """Read a slice of a quantity
+
+        Parameters
+        ----------
+        quantity: str
+           name of quantity
+        jobs: int, slice or list of str, default=all
+           job rows, or list of job keys
+        grains: int or slice, default=all
+           grain IDs
+
+        Returns
+        -------
+        array
+           values of `quantity` for the selected jobs and grains
+        """
+        with h5py.File(self.filename, "r") as h5:
+            if isinstance(jobs, (list, tuple)):
+                rows = [self._row(h5, k) for k in jobs]
+                dset = h5[quantity]
+                return np.array([dset[r, grains] for r in rows])
+            return h5[quantity][jobs, grains]
+
+    def _open(self, mode, timeout):
+        """Open the file, waiting while another process has it open"""
+        start = time.time()
+        while True:
+            try:
+                return h5py.File(self.filename, mode)
+            except (OSError, BlockingIOError):
+                if time.time() - start > timeout:
+                    raise
+                time.sleep(0.5)
+
+    def _keys(self, h5):
+        if self.KEYS not in h5:
+            h5.create_dataset(
+                self.KEYS, shape=(0,), maxshape=(None,),
+                dtype=h5py.string_dtype()
+            )
+        return [k.decode() for k in h5[self.KEYS][:]]
+
+    def _row(self, h5, key):
+        keys = [k.decode() for k in h5[self.KEYS][:]]
+        try:
+            return keys.index(key)
+        except ValueError:
+            raise KeyError(f"job key not found: {key}")
+
+    def _dataset(self, h5, name, shape):
+        """Return dataset for quantity, creating it if needed"""
+        if name in h5:
+            return h5[name]
+
+        num_jobs = len(h5[self.KEYS])
+        comp = tuple(shape[1:])
+        return h5.create_dataset(
+            name, shape=(num_jobs, 0) + comp,
+            maxshape=(None, None) + comp,
+            chunks=tuple(self.chunks) + comp,
+            dtype=np.float64, fillvalue=np.nan
+        )
+
+    @staticmethod
+    def _resize(dset, num_jobs, num_grains):
+        """Enlarge dataset to hold the given numbers of jobs and grains"""
+        shape = list(dset.shape)
+        if num_jobs > shape[0] or num_grains > shape[1]:
+            shape[0] = max(num_jobs, shape[0])
+            shape[1] = max(num_grains, shape[1])
+            dset.resize(tuple(shape))
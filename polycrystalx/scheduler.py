@@ -0,0 +1,200 @@
+"""Concurrent scheduling of MPI jobs on the cores of one node
+
+Each job asks for a number of processes, chosen from the size of its mesh.
+Jobs are started in order while they fit in the free cores; when the next
+job does not fit, the first later job that does is started instead, so small
+jobs fill the cores left by large ones. Each running job is given its own
+cores, so that jobs bound to cores do not share them. The output of each job
+goes to its own log file.
+"""
+import asyncio
+import collections
+import os
+import time
+
+import numpy as np
+
+
+# Cells of each box mesh cell type in one box division.
+_cells_per_box = {
+    "tetrahedron": 6, "hexahedron": 1, "prism": 2, "pyramid": 6,
+    "triangle": 2, "quadrilateral": 1, "interval": 1,
+}
+
+
+ScheduledJob = collections.namedtuple(
+    "ScheduledJob", ["name", "command", "ranks", "log_file"]
+)
+ScheduledJob.__doc__ = """Job to be scheduled
+
+Parameters
+----------
+name: str
+   name of the job, for the report
+command: list of str
+   command to run; it should use `ranks` processes; "{cores}" in an argument
+   is replaced by the comma-separated IDs of the cores given to the job
+ranks: int
+   number of processes (cores) the job uses
+log_file: str or Path
+   file for the standard output and error of the job
+"""
+
+
+def estimate_cells(mesh_input):
+    """Number of cells of a mesh input, if known without making the mesh
+
+    Parameters
+    ----------
+    mesh_input: inputs.mesh.Mesh
+       the mesh input
+
+    Returns
+    -------
+    int or None
+       number of cells of a box mesh, or None for meshes read from files
+    """
+    if mesh_input.source != "box":
+        return None
+
+    dim = len(mesh_input.extents)
+    divs = np.atleast_1d(mesh_input.divisions)
+    if len(divs) == 1:
+        divs = np.repeat(divs, dim)
+
+    return int(np.prod(divs)) * _cells_per_box.get(mesh_input.celltype, 1)
+
+
+def choose_ranks(num_cells, cells_per_rank, max_ranks, default=1):
+    """Number of processes for a mesh
+
+    Parameters
+    ----------
+    num_cells: int or None
+       number of cells, or None if not known
+    cells_per_rank: int
+       target number of cells per process
+    max_ranks: int
+       largest number of processes
+    default: int, default=1
+       number of processes when `num_cells` is None
+
+    Returns
+    -------
+    int
+       number of processes, from 1 to `max_ranks`
+    """
+    if num_cells is None:
+        ranks = default
+    else:
+        ranks = -(-num_cells // cells_per_rank)
+
+    return int(min(max(ranks, 1), max_ranks))
+
+
+def job_command(job, core_ids):
+    """Command of a job on some cores
+
+    Parameters
+    ----------
+    job: ScheduledJob
+       the job
+    core_ids: list of int
+       IDs of the cores given to the job
+
+    Returns
+    -------
+    list of str
+       the command, with "{cores}" replaced by the core IDs
+    """
+    cores = ",".join(str(c) for c in core_ids)
+    return [arg.replace("{cores}", cores) for arg in job.command]
+
+
+def run_jobs(jobs, cores):
+    """Run jobs concurrently on a number of cores
+
+    Parameters
+    ----------
+    jobs: list of ScheduledJob
+       the jobs, in order; jobs asking for more than `cores` processes use
+       all the cores
+    cores: int
+       number of cores available, with IDs from 0 to `cores` - 1
+
+    Returns
+    -------
+    dict
+       "returncodes", the return code of each job; "elapsed", the total time
+       in seconds; "jobs_per_hour"; and "utilization", the fraction of the
+       core time used by the jobs
+    """
+    return asyncio.run(_run_jobs(jobs, cores))
+
+
+def report(summary):
+    """Print the throughput of a run
+
+    Parameters
+    ----------
+    summary: dict
+       the output of `run_jobs`
+    """
+    codes = summary["returncodes"]
+    failed = sum(c != 0 for c in codes)
+    print(
+        f"jobs: {len(codes)}, failed: {failed}, "
+        f"time: {summary['elapsed']:.1f} s, "
+        f"throughput: {summary['jobs_per_hour']:.1f} jobs/hour, "
+        f"core utilization: {summary['utilization']:.1%}",
+        flush=True
+    )
+
+
+async def _run_jobs(jobs, cores):
+    jobs = [job._replace(ranks=min(job.ranks, cores)) for job in jobs]
+    pending = list(range(len(jobs)))
+    returncodes = [None] * len(jobs)
+    running = {}
+    free = list(range(cores))
+    core_time = 0.
+    start = time.perf_counter()
+
+    while pending or running:
+        # Start every pending job that fits, in order.
+        for i in list(pending):
+            if jobs[i].ranks <= len(free):
+                pending.remove(i)
+                core_ids, free = free[:jobs[i].ranks], free[jobs[i].ranks:]
+                task = asyncio.create_task(_run_job(jobs[i], core_ids))
+                running[task] = (i, core_ids, time.perf_counter())
+
+        done, _ = await asyncio.wait(
+            running, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            i, core_ids, started = running.pop(task)
+            free = sorted(free + core_ids)
+            core_time += jobs[i].ranks * (time.perf_counter() - started)
+            returncodes[i] = task.result()
+            print(f"finished job {jobs[i].name}: {task.result()}", flush=True)
+
+    elapsed = time.perf_counter() - start
+    tiny = np.finfo(float).tiny
+    return {
+        "returncodes": returncodes,
+        "elapsed": elapsed,
+        "jobs_per_hour": 3600. * len(jobs) / max(elapsed, tiny),
+        "utilization": core_time / max(cores * elapsed, tiny),
+    }
+
+
+async def _run_job(job, core_ids):
+    print(f"starting job {job.name} on cores {core_ids}", flush=True)
+    os.makedirs(os.path.dirname(os.path.abspath(job.log_file)), exist_ok=True)
+    with open(job.log_file, "w") as log:
+        proc = await asyncio.create_subprocess_exec(
+            *job_command(job, core_ids), stdout=log,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        return await proc.wait()
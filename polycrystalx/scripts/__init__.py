@@ -30,3 +30,29 @@ def get_input_module(imod):
     user_inputs = import_module(imod)
 
     return user_inputs
+
+
+def pending_keys(user_module, keys):
+    """Keys of the jobs not completed with their current inputs
+
+    Parameters
+    ----------
+    user_module: module
+       input module, with `get_job`
+    keys: iterable
+       job keys
+
+    RETURNS
+    -------
+    list
+       keys of jobs with no completion record or one for different inputs
+    """
+    pending = []
+    for key in keys:
+        if user_module.get_job(key).is_complete():
+            print(f"skipping completed job: {key}")
+        else:
+            pending.append(key)
+    print(f"jobs to run: {len(pending)}", flush=True)
+
+    return pending
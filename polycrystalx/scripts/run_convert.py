@@ -0,0 +1,43 @@
+"""Convert a gmsh mesh to a partitioned mesh file"""
+import sys
+import argparse
+
+from mpi4py import MPI
+
+from polycrystalx.loaders.mesh.partitioned import (
+    convert_gmsh, partitioned_file
+)
+
+
+def main():
+    """convert a gmsh file"""
+    p = argparser(*sys.argv)
+    args = p.parse_args()
+
+    output = args.output
+    if output is None:
+        output = partitioned_file(args.gmsh_file)
+    convert_gmsh(args.gmsh_file, MPI.COMM_WORLD, output)
+    if MPI.COMM_WORLD.rank == 0:
+        print(f"wrote partitioned mesh: {output}")
+
+
+def argparser(*args):
+
+    p = argparse.ArgumentParser(
+        description=(
+            "convert a gmsh file to a partitioned mesh file; run with the "
+            "number of processes used for the jobs"
+        )
+    )
+    p.add_argument(
+        'gmsh_file', type=str,
+        help="name of gmsh (.msh) file"
+    )
+    p.add_argument(
+        '-o', '--output', type=str,
+        default=None,
+        help="name of output file (default is the gmsh file with .h5 suffix)"
+    )
+
+    return p
@@ -0,0 +1,158 @@
+"""Run a suite of jobs on groups of processes within one MPI run"""
+import sys
+import argparse
+import traceback
+
+from mpi4py import MPI
+
+from . import get_input_module, pending_keys
+from polycrystalx import processes
+
+
+TAG_REQUEST = 600
+TAG_KEY = 601
+
+
+def main():
+    """Run a suite of jobs on groups of processes
+
+    Process 0 hands out the job keys. The other processes are split into
+    groups, and each group runs one job at a time on its own communicator,
+    asking for another key when it finishes. A failed job is reported to
+    process 0, and its group goes on with the next key.
+    """
+    p = argparser(*sys.argv)
+    args = p.parse_args()
+
+    user_module = get_input_module(args.input_module)
+    if not hasattr(user_module, "get_job"):
+        raise AttributeError('module has no "get_job" attribute')
+
+    world = MPI.COMM_WORLD
+    if world.size < 2:
+        raise RuntimeError("pxx_farm needs at least two processes")
+
+    color = MPI.UNDEFINED if world.rank == 0 else (world.rank - 1) // args.g
+    group = world.Split(color, world.rank)
+    if world.rank == 0:
+        if not hasattr(user_module, args.keys):
+            emsg = f"job keys attribute '{args.keys}' was not found"
+            raise AttributeError(emsg)
+        keys = getattr(user_module, args.keys)
+        if args.resume:
+            keys = pending_keys(user_module, keys)
+        num_groups = -(-(world.size - 1) // args.g)
+        failed = dispatch(world, keys, num_groups)
+        if failed:
+            print(f"farm: {len(failed)} jobs failed: {failed}", flush=True)
+    else:
+        work(world, group, user_module)
+        group.Free()
+
+
+def dispatch(world, keys, num_groups):
+    """Hand out job keys to the groups
+
+    Parameters
+    ----------
+    world: MPI communicator
+       communicator of all the processes
+    keys: iterable
+       job keys
+    num_groups: int
+       number of groups
+
+    Returns
+    -------
+    list
+       keys of the jobs that failed
+    """
+    status = MPI.Status()
+    failed = []
+
+    def request():
+        # Each request carries the outcome of the group's last job.
+        done = world.recv(
+            source=MPI.ANY_SOURCE, tag=TAG_REQUEST, status=status
+        )
+        if done is not None:
+            key, ok = done
+            print(f"farm: job {key} {'done' if ok else 'FAILED'}", flush=True)
+            if not ok:
+                failed.append(key)
+        return status.source
+
+    for key in keys:
+        source = request()
+        print(f"farm: job {key} to process {source}", flush=True)
+        world.send(key, source, tag=TAG_KEY)
+
+    # No more jobs.
+    for i in range(num_groups):
+        world.send(None, request(), tag=TAG_KEY)
+
+    return failed
+
+
+def work(world, group, user_module):
+    """Run jobs on a group until there are no more
+
+    Parameters
+    ----------
+    world: MPI communicator
+       communicator of all the processes
+    group: MPI communicator
+       communicator of this group
+    user_module: module
+       input module, with `get_job`
+    """
+    worker = processes.Worker(comm=group)
+    done = None
+    while True:
+        key = None
+        if group.rank == 0:
+            world.send(done, 0, tag=TAG_REQUEST)
+            key = world.recv(source=0, tag=TAG_KEY)
+        key = group.bcast(key)
+        if key is None:
+            break
+
+        failed = False
+        try:
+            worker.run(user_module.get_job(key))
+        except Exception:
+            traceback.print_exc()
+            failed = True
+        # A job fails if it failed on any process of the group.
+        failed = group.allreduce(failed, op=MPI.MAX)
+        if failed:
+            # The loaders of a failed job may be incomplete.
+            worker.loaders.clear()
+        done = (key, not failed)
+
+
+def argparser(*args):
+
+    p = argparse.ArgumentParser(
+        description="run a suite of jobs on groups of processes"
+    )
+    p.add_argument(
+        'input_module', type=str,
+        help="module with inputs (name or path)"
+    )
+    p.add_argument(
+        '-g', type=int,
+        default=1,
+        help="number of processes in each group"
+    )
+    p.add_argument(
+        '-k', '--keys', type=str,
+        default="job_keys",
+        help="name of attribute with job keys"
+    )
+    p.add_argument(
+        '--resume', action='store_true',
+        help="skip jobs already completed with the same inputs"
+    )
+
+    return p
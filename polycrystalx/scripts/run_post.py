@@ -0,0 +1,61 @@
+"""Postprocess a saved solution"""
+import sys
+import argparse
+import pickle
+
+from . import get_input_module
+from polycrystalx import postprocess
+
+
+def main():
+    """Postprocess a job"""
+    p = argparser(*sys.argv)
+    args = p.parse_args()
+
+    user_module = get_input_module(args.input_module)
+    if args.key_file is None:
+        if not hasattr(user_module, "job"):
+            raise AttributeError('module has no "job" attribute')
+        job = user_module.job
+    else:
+        if not hasattr(user_module, "get_job"):
+            raise AttributeError('module has no "get_job" attribute')
+        with open(args.key_file, "rb") as f:
+            key = pickle.load(f)
+        job = user_module.get_job(key)
+
+    postprocess.run(
+        job, fields=args.fields, chunk_size=args.chunk_size,
+        write_fields=args.write_fields
+    )
+
+
+def argparser(*args):
+
+    p = argparse.ArgumentParser(
+        description="postprocess the saved solution of a job"
+    )
+    p.add_argument(
+        'input_module', type=str,
+        help="module with inputs (name or path)"
+    )
+    p.add_argument(
+        'key_file', type=str, nargs="?", default=None,
+        help="name of file with serialized JobKey instance (batch modules)"
+    )
+    p.add_argument(
+        '-f', '--fields', type=str, nargs="+",
+        default=None,
+        help="names of fields to compute (default is all)"
+    )
+    p.add_argument(
+        '-c', '--chunk-size', type=int,
+        default=None,
+        help="number of cells evaluated at a time"
+    )
+    p.add_argument(
+        '-w', '--write-fields', action="store_true",
+        help="write cellwise field values to post-output.xdmf"
+    )
+
+    return p
@@ -1,4 +1,5 @@
 """Run suite of Jobs"""
+import os
 import sys
 import argparse
 import tempfile
@@ -8,7 +9,8 @@ import pickle
 
 import numpy as np
 
-from . import get_input_module
+from . import get_input_module, pending_keys
+from polycrystalx import scheduler
 
 
 def main():
@@ -22,7 +24,18 @@ def main():
         emsg = f"job keys attribute '{args.keys}' was not found"
         raise AttributeError(emsg)
 
-    for job in getattr(user_module, args.keys):
+    keys = getattr(user_module, args.keys)
+    if args.resume:
+        keys = pending_keys(user_module, keys)
+
+    if args.warm:
+        run_warm(args, keys)
+        return
+    if args.concurrent:
+        run_concurrent(args, user_module, keys)
+        return
+
+    for job in keys:
         # Pickle to a temp file.
         fp = tempfile.NamedTemporaryFile(delete=False)
 
@@ -40,6 +53,51 @@ def main():
         pathlib.Path(fp.name).unlink()
 
 
+def run_warm(args, keys):
+    """Run all the jobs in one MPI world, reusing what they share"""
+    fp = tempfile.NamedTemporaryFile(delete=False)
+    with open(fp.name, "wb") as f:
+        pickle.dump(list(keys), f)
+
+    cmd = [
+        "mpirun", "-np", str(args.n),
+        "pxx_worker", args.input_module, fp.name
+    ]
+    subprocess.run(cmd)
+    pathlib.Path(fp.name).unlink()
+
+
+def run_concurrent(args, user_module, keys):
+    """Run several jobs at once, packing them onto the cores"""
+    cores = args.cores or os.cpu_count()
+    jobs, key_files = [], []
+    for key in keys:
+        job = user_module.get_job(key)
+        fp = tempfile.NamedTemporaryFile(delete=False)
+        with open(fp.name, "wb") as f:
+            pickle.dump(key, f)
+        key_files.append(fp.name)
+
+        ranks = scheduler.choose_ranks(
+            scheduler.estimate_cells(job.mesh_input), args.cells_per_rank,
+            args.n, default=args.n
+        )
+        # Each job is bound to the cores the scheduler gives it.
+        cmd = [
+            "mpirun", "--cpu-set", "{cores}", "--bind-to", "core",
+            "-np", str(ranks), "pxx_mpijob", args.input_module, fp.name
+        ]
+        jobs.append(
+            scheduler.ScheduledJob(job.results_key, cmd, ranks, job.log_file)
+        )
+
+    try:
+        scheduler.report(scheduler.run_jobs(jobs, cores))
+    finally:
+        for name in key_files:
+            pathlib.Path(name).unlink()
+
+
 def argparser(*args):
 
     p = argparse.ArgumentParser(
@@ -59,5 +117,29 @@ def argparser(*args):
         default="job_keys",
         help="name of attribute with job keys"
     )
+    p.add_argument(
+        '--resume', action='store_true',
+        help="skip jobs already completed with the same inputs"
+    )
+    p.add_argument(
+        '--warm', action='store_true',
+        help="run the jobs in one MPI world, reusing meshes and forms"
+    )
+    p.add_argument(
+        '--concurrent', action='store_true',
+        help="run several jobs at once, each with its log in job.log"
+    )
+    p.add_argument(
+        '--cores', type=int,
+        default=None,
+        help="number of cores for concurrent jobs (default: all)"
+    )
+    p.add_argument(
+        '--cells-per-rank', type=int,
+        default=50000,
+        help="cells per process for concurrent jobs on box meshes; "
+        "-n is the largest number of processes, and the number for "
+        "meshes read from files"
+    )
 
     return p
@@ -0,0 +1,68 @@
+"""Run a sequence of jobs in one MPI world"""
+import sys
+import argparse
+import pickle
+import traceback
+
+from mpi4py import MPI
+
+from . import get_input_module
+from polycrystalx import processes
+
+
+def main():
+    """Run jobs in MPI, reusing what they share
+
+    A failed job is reported, and the worker goes on with the next one.
+    """
+    p = argparser(*sys.argv)
+    args = p.parse_args()
+
+    user_module = get_input_module(args.input_module)
+    if not hasattr(user_module, "get_job"):
+        raise AttributeError('module has no "get_job" attribute')
+
+    comm = MPI.COMM_WORLD
+    keys = None
+    if comm.rank == 0:
+        with open(args.key_file, "rb") as f:
+            keys = pickle.load(f)
+    keys = comm.bcast(keys)
+
+    worker = processes.Worker()
+    failures = []
+    for key in keys:
+        if comm.rank == 0:
+            print("\n===== New Job Starting", flush=True)
+        failed = False
+        try:
+            worker.run(user_module.get_job(key))
+        except Exception:
+            traceback.print_exc()
+            failed = True
+        # A job fails if it failed on any process.
+        if comm.allreduce(failed, op=MPI.MAX):
+            # The loaders of a failed job may be incomplete.
+            worker.loaders.clear()
+            failures.append(key)
+
+    if failures and comm.rank == 0:
+        print(f"{len(failures)} jobs failed: {failures}", flush=True)
+
+
+def argparser(*args):
+
+    p = argparse.ArgumentParser(
+        description="run a sequence of jobs in one MPI world"
+    )
+    p.add_argument(
+        'input_module', type=str,
+        help="name of batch input module"
+    )
+
+    p.add_argument(
+        'key_file', type=str,
+        help="name of file with serialized list of JobKey instances"
+    )
+
+    return p
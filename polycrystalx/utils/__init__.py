@@ -3,96 +3,292 @@ import os
 import time
 
 import numpy as np
+import ufl
 
-from dolfinx import log
-from dolfinx.fem import assemble_scalar
+from dolfinx import fem, log
 
+from .. import derived, grain_layout
 from .xdmffile_ext import XDMFFile_Ext
 from .mpi import MPI, mpi_sync, myrank
+from .output import open_output, flush_output, is_cellwise
 
 
-def setup_output(outdir):
+def setup_output(outdir, comm=MPI.COMM_WORLD):
     """Make output directory if needed
 
     outdir: str or Path
         name of output directory
+    comm: MPI communicator, default=MPI.COMM_WORLD
+        communicator of the processes running the job
     """
+    rank = comm.rank
     print("output directory: ", outdir)
-    mpi_sync(from_0=False)
+    mpi_sync(from_0=False, comm=comm)
     if not os.path.exists(outdir):
-        if myrank == 0:
+        if rank == 0:
             log.log(log.LogLevel.INFO, f"creating output directory: {outdir}")
             os.makedirs(outdir)
             time.sleep(0.1)
-        mpi_sync()
-    log.log(log.LogLevel.INFO, f"{myrank}: changing directory to {outdir}")
+        mpi_sync(comm=comm)
+    log.log(log.LogLevel.INFO, f"{rank}: changing directory to {outdir}")
 
     try:
         os.chdir(outdir)
     except:
-        raise RuntimeError(f"{myrank}: failed to find output directory")
+        raise RuntimeError(f"{rank}: failed to find output directory")
 
 
-def grain_volumes(comm, gv_form, indicator, grain_cells):
-    """Compute grain volumes
+def cell_volumes(msh):
+    """Compute volumes of local cells
 
-    comm: MPI communicator
-       main communicator for this problem
-    gv_form: dolfinx Form
-       form for computing grain volume
-    indicator: dolfinx Function
-        inidcator function for the gv_form
-    grain_cells: dict
-        dictionary giving array of cells for each grain
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
 
     Returns
     -------
-    arary
-       array of grain volumes
+    array
+       volume of each cell owned by this process
     """
-    vols = np.zeros(ng := len(grain_cells))
-    indicator.x.array[:] = 0.
-    for g in range(ng):
-        if g > 0:
-            indicator.x.array[gcells] = 0
-        gcells = grain_cells[g]
-        indicator.x.array[gcells] = 1
-
-        value = 0. if len(gcells) == 0 else assemble_scalar(gv_form)
-        vols[g] = comm.allreduce(value, op=MPI.SUM)
-
-    return vols
-
-
-def grain_integrals(comm, gi_form, indicator, func, grain_cells, f):
-    """Compute grain integrals of scalar function
-
-    comm: MPI communicator
-       main communicator for this problem
-    gi_form: dolfinx Form
-       form for computing grain volume
-    indicator: dolfinx Function
-        inidcator function for the gv_form
-    func: dolfinx Function
-        function to integrate over the grains
-    grain_cells: dict
-        dictionary giving list of cells for each grain
+    V = fem.functionspace(msh, ("DG", 0))
+    v = ufl.TestFunction(V)
+    vols = fem.assemble_vector(fem.form(v * ufl.dx))
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+
+    return vols.array[:num_cells].copy()
+
+
+def cell_grain_ids(cell_tags, num_cells):
+    """Return array of grain IDs for local cells
+
+    Parameters
+    ----------
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_cells: int
+       number of cells owned by this process
+
+    Returns
+    -------
+    array
+       grain ID of each local cell, or -1 for cells with no tag
+    """
+    gids = np.full(num_cells, -1, dtype=np.int32)
+    owned = cell_tags.indices < num_cells
+    gids[cell_tags.indices[owned]] = cell_tags.values[owned]
+
+    return gids
+
+
+def grain_averages(
+        msh, cell_tags, num_grains, exprs, chunk_size=None, samples=None
+):
+    """Compute grain volumes and grain averages of cellwise expressions
+
+    The expressions are evaluated at the cell midpoints in chunks of cells, so
+    only one chunk of values is in memory at a time. The cell values weighted
+    by cell volume are summed over each grain. Expressions with 3x3 tensor
+    values are reduced to their six unique components in the order
+    (00, 11, 22, 12, 02, 01).
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_grains: int
+       number of grains
+    exprs: dict
+       dictionary of UFL expressions (or functions) to average, by name
+    chunk_size: int, optional
+       number of cells to evaluate at a time; if not given, all local cells
+       are evaluated at once
+    samples: tuple, optional
+       grain IDs at sample points of the local cells, array (n, m), and the
+       volume fraction of each sample point, array (m); if given, each cell
+       contributes to the grains at its sample points by volume fraction
+
+    Returns
+    -------
+    volumes: array (num_grains)
+       grain volumes
+    averages: dict
+       dictionary of arrays of shape (num_grains, n) of grain averages, where
+       `n` is the number of components of the expression, or of shape
+       (num_grains) for scalar expressions
+    """
+    comm = msh.comm
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+    gids = cell_grain_ids(cell_tags, num_cells)
+    tagged = gids >= 0
+    vols = cell_volumes(msh)
+
+    X = fem.functionspace(msh, ("DG", 0)).element.interpolation_points()
+    compiled, sums, scalars = {}, {}, []
+    for name, expr in exprs.items():
+        if expr.ufl_shape == ():
+            scalars.append(name)
+        if expr.ufl_shape == (3, 3):
+            expr = ufl.as_vector([
+                expr[0, 0], expr[1, 1], expr[2, 2],
+                expr[1, 2], expr[0, 2], expr[0, 1]
+            ])
+        compiled[name] = fem.Expression(expr, X)
+        ncomp = int(np.prod(expr.ufl_shape))
+        sums[name] = np.zeros((num_grains, ncomp))
+
+    if samples is None:
+        sample_gids, fractions = gids.reshape(-1, 1), np.ones(1)
+    else:
+        sample_gids, fractions = samples
+
+    volumes = np.zeros(num_grains)
+    for j, f in enumerate(fractions):
+        volumes += np.bincount(
+            sample_gids[tagged, j], weights=f * vols[tagged],
+            minlength=num_grains
+        )
+
+    if chunk_size is None:
+        chunk_size = max(num_cells, 1)
+    for start in range(0, num_cells, chunk_size):
+        cells = np.arange(
+            start, min(start + chunk_size, num_cells), dtype=np.int32
+        )
+        cells = cells[tagged[cells]]
+        w = vols[cells]
+        for name, expr in compiled.items():
+            values = expr.eval(msh, cells).reshape(len(cells), -1)
+            for g, f in zip(sample_gids[cells].T, fractions):
+                for j in range(values.shape[1]):
+                    sums[name][:, j] += np.bincount(
+                        g, weights=f * w * values[:, j], minlength=num_grains
+                    )
+
+    comm.Allreduce(MPI.IN_PLACE, volumes, op=MPI.SUM)
+    averages = {}
+    nz = volumes > 0.
+    for name, s in sums.items():
+        comm.Allreduce(MPI.IN_PLACE, s, op=MPI.SUM)
+        avg = np.zeros_like(s)
+        avg[nz] = s[nz] / volumes[nz].reshape(-1, 1)
+        averages[name] = avg[:, 0] if name in scalars else avg
+
+    return volumes, averages
+
+
+def cell_function(msh, name, values):
+    """Make a cellwise (DG0) function from values on local cells
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    name: str
+       name of function
+    values: array (n) or (n, ...)
+       values on the cells owned by this process; the trailing dimensions
+       give the value shape of the function
+
+    Returns
+    -------
+    dolfinx Function
+       the function, with values updated on ghost cells
+    """
+    shape = values.shape[1:]
+    element = ("DG", 0, shape) if shape else ("DG", 0)
+    f = fem.Function(fem.functionspace(msh, element), name=name)
+    f.x.array[:values.size] = values.ravel()
+    f.x.scatter_forward()
+
+    return f
+
+
+def grain_hotspots(msh, cell_tags, num_grains, values, k):
+    """Find the cells with the largest values in each grain
+
+    Each process selects its top `k` cells per grain, and the selections are
+    merged on process 0.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_grains: int
+       number of grains
+    values: array (n)
+       values on the cells owned by this process
+    k: int
+       number of cells per grain
 
     Returns
     -------
-    arary
-       array of grain integrals
+    cells: array (num_grains, k) of int
+       input (original) indices of the hotspot cells of each grain, in order
+       of decreasing value, padded with -1; None except on process 0
+    hot_values: array (num_grains, k)
+       values on the hotspot cells, padded with NaN; None except on process 0
     """
-    integrals = np.zeros(ng := len(grain_cells))
-    func.x.array[:] = f.x.array
-    indicator.x.array[:] = 0.
-    for g in range(ng):
-        if g > 0:
-            indicator.x.array[gcells] = 0
-        gcells = grain_cells[g]
-        indicator.x.array[gcells] = 1
-
-        value = 0. if len(gcells) == 0 else assemble_scalar(gi_form)
-        integrals[g] = comm.allreduce(value, op=MPI.SUM)
-
-    return integrals
+    num_cells = len(values)
+    gids = cell_grain_ids(cell_tags, num_cells)
+    tagged = np.flatnonzero(gids >= 0)
+    sel = tagged[derived.hotspots(values[tagged], gids[tagged], k)]
+    original = np.asarray(msh.topology.original_cell_index)[sel]
+
+    gathered = msh.comm.gather((gids[sel], values[sel], original), root=0)
+    if msh.comm.rank != 0:
+        return None, None
+
+    g, v, c = (np.concatenate(a) for a in zip(*gathered))
+    sel = derived.hotspots(v, g, k)
+    g, v, c = g[sel], v[sel], c[sel]
+    rank = np.arange(len(g)) - np.searchsorted(g, g)
+
+    cells = np.full((num_grains, k), -1, dtype=np.int64)
+    hot_values = np.full((num_grains, k), np.nan)
+    cells[g, rank] = c
+    hot_values[g, rank] = v
+
+    return cells, hot_values
+
+
+def write_grain_sorted(msh, cell_tags, num_grains, functions,
+                       filename="grain-sorted.h5"):
+    """Write cellwise functions in grain-sorted layout
+
+    See `polycrystalx.grain_layout`. Functions that are not cellwise (DG0)
+    are skipped, as are cells with no grain ID.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    num_grains: int
+       number of grains
+    functions: list of dolfinx Function
+       functions to write
+    filename: str or Path, default="grain-sorted.h5"
+       name of HDF5 file
+    """
+    num_cells = msh.topology.index_map(msh.topology.dim).size_local
+    gids = cell_grain_ids(cell_tags, num_cells)
+    tagged = gids >= 0
+    original = np.asarray(msh.topology.original_cell_index)[:num_cells]
+
+    fields = {}
+    for f in functions:
+        if is_cellwise(f):
+            bs = f.function_space.dofmap.index_map_bs
+            values = f.x.array[:num_cells * bs].reshape(num_cells, bs)
+            fields[f.name] = values[tagged]
+
+    grain_layout.write(
+        filename, gids[tagged], original[tagged], fields, num_grains,
+        comm=msh.comm
+    )
@@ -0,0 +1,61 @@
+"""Interpolation between meshes
+
+Interpolating a function onto a space on another mesh requires locating the
+interpolation points of the target space in the source mesh, which is the
+expensive part. The interpolator finds them once, so that any number of
+functions on the source space are then interpolated cheaply.
+"""
+import numpy as np
+from dolfinx import fem
+
+
+class NonmatchingInterpolator:
+    """Interpolate functions between spaces on different meshes
+
+    Parameters
+    ----------
+    V_to: dolfinx FunctionSpace
+       target space
+    V_from: dolfinx FunctionSpace
+       source space, with the same value shape
+    padding: float, default=1e-14
+       padding of the bounding boxes used to locate points in the source
+       mesh; points outside the source mesh get zero values
+    """
+
+    def __init__(self, V_to, V_from, padding=1e-14):
+        self.V_to = V_to
+        self.V_from = V_from
+        msh = V_to.mesh
+        cmap = msh.topology.index_map(msh.topology.dim)
+        self.cells = np.arange(
+            cmap.size_local + cmap.num_ghosts, dtype=np.int32
+        )
+        self._data = fem.create_interpolation_data(
+            V_to, V_from, self.cells, padding=padding
+        )
+
+    def __call__(self, u_from, u_to=None):
+        """Interpolate a function
+
+        Parameters
+        ----------
+        u_from: dolfinx Function
+           function on the source space
+        u_to: dolfinx Function, optional
+           function on the target space to fill in; if not given, a new one
+           is made
+
+        Returns
+        -------
+        dolfinx Function
+           the interpolated function on the target space
+        """
+        if u_to is None:
+            u_to = fem.Function(self.V_to, name=u_from.name)
+        u_to.interpolate_nonmatching(
+            u_from, self.cells, interpolation_data=self._data
+        )
+        u_to.x.scatter_forward()
+
+        return u_to
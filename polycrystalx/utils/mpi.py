@@ -1,4 +1,6 @@
 """MPI Utilities"""
+import os
+
 import numpy  as np
 
 from dolfinx import log
@@ -10,7 +12,7 @@ commsize = MPI.COMM_WORLD.size
 TAG_SYNC = 500
 
 
-def mpi_sync(from_0=True):
+def mpi_sync(from_0=True, comm=MPI.COMM_WORLD):
     """Sync processes
 
     If we want processes to wait for process 0, we use from_0=True. If we
@@ -20,24 +22,56 @@ def mpi_sync(from_0=True):
     ----------
     from_0: bool, default=True
        if true, node 0 sends to all other nodes, else other send to 0
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes
     """
+    rank = comm.rank
     # Send random number each time so we can check for matching values.
     loglevel = log.LogLevel.INFO
     msg = np.random.random(1)
-    for i in range(1, commsize):
+    for i in range(1, comm.size):
         if from_0:
-            if myrank == 0:
-                MPI.COMM_WORLD.send(msg, i, tag=TAG_SYNC)
+            if rank == 0:
+                comm.send(msg, i, tag=TAG_SYNC)
                 log.log(loglevel,
-                        f"0: sending sync from {myrank} to {i}: {msg}"
+                        f"0: sending sync from {rank} to {i}: {msg}"
                         )
-            if myrank == i:
-                rmsg = MPI.COMM_WORLD.recv(source=0, tag=TAG_SYNC)
-                log.log(loglevel, f"{myrank}: receiving sync from 0: ({rmsg})")
+            if rank == i:
+                rmsg = comm.recv(source=0, tag=TAG_SYNC)
+                log.log(loglevel, f"{rank}: receiving sync from 0: ({rmsg})")
         else:
-            if myrank == 0:
-                rmsg = MPI.COMM_WORLD.recv(source=i, tag=TAG_SYNC)
+            if rank == 0:
+                rmsg = comm.recv(source=i, tag=TAG_SYNC)
                 log.log(loglevel, f"0: receiving sync from {i}: ({rmsg})")
-            if myrank == i:
-                MPI.COMM_WORLD.send(msg, 0, tag=TAG_SYNC)
-                log.log(loglevel, f"{myrank}: sending sync to 0: {msg}")
+            if rank == i:
+                comm.send(msg, 0, tag=TAG_SYNC)
+                log.log(loglevel, f"{rank}: sending sync to 0: {msg}")
+
+
+def threads_per_process(comm=MPI.COMM_WORLD):
+    """Number of cores available to each process of a node
+
+    If the process is bound to a subset of the cores, that subset is used;
+    otherwise, the cores of the node are shared by its processes.
+
+    Parameters
+    ----------
+    comm: MPI communicator, default=MPI.COMM_WORLD
+       communicator of the processes
+
+    Returns
+    -------
+    int
+       number of threads to use on this process
+    """
+    node = comm.Split_type(MPI.COMM_TYPE_SHARED)
+    num_local = node.size
+    node.Free()
+
+    num_cores = os.cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        bound = len(os.sched_getaffinity(0))
+        if bound < num_cores:
+            return bound
+
+    return max(1, num_cores // num_local)
@@ -0,0 +1,637 @@
+"""Output writers for process results
+
+Each writer is created with the mesh, the grain IDs and the list of functions
+to save. Calling `write` saves the current values of those functions at the
+given time, so a single writer can be used for a sequence of time or load
+steps. The writers are selected by the `output_format` option.
+
+Writes can also be done asynchronously by a background thread, so that the
+process can continue with its next task while the data is being written. In
+that case, the function values are copied to buffers when `write` is called,
+and the background thread writes the buffers. The number of pending writes is
+bounded, so `write` blocks when the queue is full. Call `flush_output` to wait
+for all pending writes to finish; this is also done at exit. The background
+thread writes from a copy of the mesh on a duplicate communicator, so its
+collective operations never mix with those of the main thread. An error in a
+background write is raised by the next `flush_output`.
+
+For suites of jobs on the same mesh, the XDMF output can refer to a shared
+mesh file instead of writing the mesh in each job's output. The shared file
+holds the mesh geometry, topology and grain IDs, and the job's output file
+refers to its HDF5 data.
+"""
+import atexit
+import os
+from pathlib import Path
+import queue
+import threading
+import traceback
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from dolfinx import fem, io, log
+from mpi4py import MPI
+
+from ..inputs.hashing import spec_hash, file_signature
+from ..inputs.polycrystal import microstructure_spec
+from .xdmffile_ext import index_functions
+
+
+class XDMFOutput:
+    """Write functions to an XDMF file with HDF5 data
+
+    The input indices of the nodes and cells are also written, so that the
+    functions can be read onto the mesh in another run (see
+    `XDMFFile_Ext.read_function`).
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    functions: list of dolfinx Function
+       functions to write
+    basename: str, default="output"
+       name of output file, without the suffix
+    comm: MPI communicator, optional
+       communicator for the file; defaults to the mesh communicator
+    shared_mesh: str or Path, optional
+       name of shared mesh file; if given, the mesh and grain IDs are written
+       there (unless it is already up to date) instead of in this file
+    indices: list of dolfinx Function, optional
+       functions with the input indices of the nodes and cells; by default,
+       they are made from the mesh (see `index_functions`)
+    """
+
+    def __init__(self, msh, cell_tags, functions, basename="output",
+                 comm=None, shared_mesh=None, indices=None):
+        self.functions = functions
+        self.filename = Path(f"{basename}.xdmf").resolve()
+        self._comm = msh.comm if comm is None else comm
+        self.shared_mesh = shared_mesh
+
+        if shared_mesh is None:
+            self._file = io.XDMFFile(self._comm, self.filename, "w")
+            self._file.write_mesh(msh)
+            self._file.write_meshtags(cell_tags, msh.geometry)
+        else:
+            self.shared_mesh = Path(shared_mesh).resolve()
+            write_shared_mesh(self.shared_mesh, msh, cell_tags, self._comm)
+            self._file = io.XDMFFile(self._comm, self.filename, "w")
+        if indices is None:
+            indices = index_functions(msh)
+        for f in indices:
+            self._file.write_function(f)
+
+    def write(self, t=0.0):
+        """Write current values of the functions
+
+        Parameters
+        ----------
+        t: float, default=0.0
+           time or load step value
+        """
+        for f in self.functions:
+            self._file.write_function(f, t)
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+        if self.shared_mesh is not None:
+            self._comm.Barrier()
+            if self._comm.rank == 0:
+                link_shared_mesh(self.filename, self.shared_mesh)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class VTXOutput:
+    """Write functions to ADIOS2 (BP) files using the VTX writer
+
+    The VTX writer requires all functions in a file to use the same kind of
+    element, so the output is split into two files: `<basename>-cells.bp`
+    holds the grain IDs and all cellwise (DG0) functions, and
+    `<basename>-nodes.bp` holds the nodal functions. The mesh is written once
+    and reused for each subsequent call to `write`.
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    functions: list of dolfinx Function
+       functions to write
+    basename: str, default="output"
+       base name of output files
+    comm: MPI communicator, optional
+       communicator for the files; defaults to the mesh communicator
+    """
+
+    def __init__(self, msh, cell_tags, functions, basename="output",
+                 comm=None):
+        self.functions = functions
+        comm = msh.comm if comm is None else comm
+        self.grain_ids = grain_id_function(msh, cell_tags)
+
+        cellwise = [self.grain_ids]
+        nodal = []
+        for f in functions:
+            if is_cellwise(f):
+                cellwise.append(f)
+            else:
+                nodal.append(f)
+
+        policy = io.VTXMeshPolicy.reuse
+        self.filenames = [Path(f"{basename}-cells.bp").resolve()]
+        self._writers = [
+            io.VTXWriter(comm, self.filenames[0], cellwise,
+                         mesh_policy=policy)
+        ]
+        if nodal:
+            self.filenames.append(Path(f"{basename}-nodes.bp").resolve())
+            self._writers.append(
+                io.VTXWriter(comm, self.filenames[1], nodal,
+                             mesh_policy=policy)
+            )
+
+    def write(self, t=0.0):
+        """Write current values of the functions
+
+        Parameters
+        ----------
+        t: float, default=0.0
+           time or load step value
+        """
+        for w in self._writers:
+            w.write(t)
+
+    def close(self):
+        """Close the files"""
+        for w in self._writers:
+            w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncOutput:
+    """Write output asynchronously in a background thread
+
+    The underlying writer is given copies of the functions to write, on a
+    copy of the mesh whose communicator is a duplicate of the mesh's, so that
+    the background writes do not interfere with communication in the main
+    thread. Each process keeps its cells in the copy. On each call to
+    `write`, the current function values are copied to numpy arrays, and the
+    background thread moves them into the copies and writes them.
+
+    Parameters
+    ----------
+    writer: class
+       output writer class, `XDMFOutput` or `VTXOutput`
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    functions: list of dolfinx Function
+       functions to write
+    basename: str, default="output"
+       base name of output files
+    background: BackgroundWriter
+       the background writer thread
+    **kwargs:
+       other keyword arguments for the writer
+    """
+
+    def __init__(self, writer, msh, cell_tags, functions, basename="output",
+                 background=None, **kwargs):
+        from ..loaders.mesh.grain_partition import copy_mesh
+
+        self.functions = functions
+        self.background = background
+        self._comm = msh.comm.Dup()
+        out_mesh, out_tags = copy_mesh(msh, cell_tags, self._comm)
+
+        self._dofs = []
+        buffers = []
+        for f in functions:
+            b, dofs = _copy_function(f, out_mesh)
+            buffers.append(b)
+            self._dofs.append(dofs)
+        if writer is XDMFOutput:
+            # The copy's indices are not the input indices of the mesh.
+            indices = []
+            for f in index_functions(msh):
+                b, (src, dst) = _copy_function(f, out_mesh)
+                b.x.array[dst] = f.x.array[src]
+                b.x.scatter_forward()
+                indices.append(b)
+            kwargs["indices"] = indices
+        self.output = writer(
+            out_mesh, out_tags, buffers, basename=basename, comm=self._comm,
+            **kwargs
+        )
+
+    def write(self, t=0.0):
+        """Copy current values of the functions and queue them for writing
+
+        Parameters
+        ----------
+        t: float, default=0.0
+           time or load step value
+        """
+        snapshot = [
+            f.x.array[src] for f, (src, dst) in zip(self.functions, self._dofs)
+        ]
+        self.background.submit(lambda: self._write(snapshot, t))
+
+    def _write(self, snapshot, t):
+        for b, values, (src, dst) in zip(
+                self.output.functions, snapshot, self._dofs
+        ):
+            b.x.array[dst] = values
+            b.x.scatter_forward()
+        self.output.write(t)
+
+    def close(self):
+        """Queue closing of the files"""
+        self.background.submit(self._close)
+
+    def _close(self):
+        self.output.close()
+        self._comm.Free()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BackgroundWriter:
+    """Thread for running output tasks in the background
+
+    When a task fails, its traceback is printed, the error is kept, and the
+    remaining tasks are skipped until the error is raised by `flush`.
+
+    Parameters
+    ----------
+    maxsize: int, default=2
+       maximum number of pending tasks; `submit` blocks when this is reached
+    """
+
+    def __init__(self, maxsize=2):
+        self._queue = queue.Queue(maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def submit(self, task):
+        """Add task to the queue, waiting if the queue is full
+
+        Parameters
+        ----------
+        task: callable
+           function of no arguments to run in the background
+        """
+        self._queue.put(task)
+
+    def flush(self, comm=None):
+        """Wait for all pending tasks to finish
+
+        Parameters
+        ----------
+        comm: MPI communicator, optional
+           communicator of the processes writing the output; if given, an
+           error on any of them is raised on all of them
+
+        Raises
+        ------
+        RuntimeError
+           if a task failed since the last flush
+        """
+        self._queue.join()
+        error, self._error = self._error, None
+        failed = error is not None
+        if comm is not None:
+            failed = comm.allreduce(failed, op=MPI.MAX)
+        if failed:
+            raise RuntimeError("background output failed") from error
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if self._error is None:
+                    task()
+            except Exception as e:
+                traceback.print_exc()
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+
+_background = None
+
+
+def background_writer(maxsize=2):
+    """Return the background writer, starting it if needed
+
+    Parameters
+    ----------
+    maxsize: int, default=2
+       maximum number of pending writes; only used when starting the writer
+
+    Returns
+    -------
+    BackgroundWriter or None
+       the background writer, or None if MPI does not support threads
+    """
+    global _background
+
+    if _background is None:
+        if MPI.Query_thread() < MPI.THREAD_MULTIPLE:
+            log.log(
+                log.LogLevel.WARNING,
+                "MPI_THREAD_MULTIPLE not available: writing output in "
+                "main thread"
+            )
+            return None
+        _background = BackgroundWriter(maxsize)
+        atexit.register(flush_output)
+
+    return _background
+
+
+def flush_output(comm=None):
+    """Wait for all background output to be written
+
+    Parameters
+    ----------
+    comm: MPI communicator, optional
+       communicator of the processes writing the output; if given, an error
+       in the background output of any of them is raised on all of them
+
+    Raises
+    ------
+    RuntimeError
+       if a background write failed since the last flush
+    """
+    if _background is not None:
+        _background.flush(comm)
+
+
+output_writers = {
+    "xdmf": XDMFOutput,
+    "vtx": VTXOutput,
+}
+
+
+def open_output(output_format, msh, cell_tags, functions, basename="output",
+                async_output=False, queue_size=2, shared_mesh=None):
+    """Return output writer for the given format
+
+    Parameters
+    ----------
+    output_format: {"xdmf", "vtx"}
+       the output format
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    functions: list of dolfinx Function
+       functions to write
+    basename: str, default="output"
+       base name of output files
+    async_output: bool, default=False
+       if True, write the output in a background thread
+    queue_size: int, default=2
+       maximum number of pending background writes
+    shared_mesh: str or Path, optional
+       name of shared mesh file (only used for "xdmf" output)
+
+    Returns
+    -------
+    XDMFOutput | VTXOutput | AsyncOutput
+       the output writer
+    """
+    try:
+        writer = output_writers[output_format]
+    except KeyError:
+        raise ValueError(f"output format ({output_format}) not available")
+
+    kwargs = {}
+    if shared_mesh is not None and output_format == "xdmf":
+        kwargs["shared_mesh"] = shared_mesh
+
+    if async_output:
+        background = background_writer(queue_size)
+        if background is not None:
+            return AsyncOutput(
+                writer, msh, cell_tags, functions, basename=basename,
+                background=background, **kwargs
+            )
+
+    return writer(msh, cell_tags, functions, basename=basename, **kwargs)
+
+
+def _copy_function(f, msh):
+    """Function like `f` on a copy of its mesh, with matching dofs
+
+    The copy must keep the cells of each process, with the global index of
+    each cell in the original mesh as its original cell index (see
+    `loaders.mesh.grain_partition.copy_mesh`). The cells keep their vertex
+    order, so the dofs of matching cells are in the same order.
+
+    Returns
+    -------
+    copy: dolfinx Function
+       the function on the copy, with the same name
+    (src, dst): tuple of arrays
+       indices in `f.x.array` and in `copy.x.array` of the owned cells' dofs
+    """
+    V = f.function_space
+    W = fem.functionspace(msh, V.ufl_element())
+    copy = fem.Function(W, name=f.name)
+
+    tdim = msh.topology.dim
+    cell_map = V.mesh.topology.index_map(tdim)
+    num_cells = msh.topology.index_map(tdim).size_local
+    original = np.asarray(msh.topology.original_cell_index)[:num_cells]
+    cells = original - cell_map.local_range[0]
+
+    bs = V.dofmap.index_map_bs
+    blocks = np.arange(bs)
+    src = V.dofmap.list[cells][..., None] * bs + blocks
+    dst = W.dofmap.list[:num_cells][..., None] * bs + blocks
+
+    return copy, (src.ravel(), dst.ravel())
+
+
+def is_cellwise(f):
+    """Return True if function is cellwise constant (DG0)"""
+    return f.function_space.ufl_element().degree == 0
+
+
+def grain_id_function(msh, cell_tags):
+    """Return grain IDs as a DG0 function
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+
+    Returns
+    -------
+    dolfinx Function
+       scalar DG0 function with value of grain ID on each cell
+    """
+    V = fem.functionspace(msh, ("DG", 0))
+    gids = fem.Function(V, name="grain-ids")
+    gids.x.array[cell_tags.indices] = cell_tags.values
+    gids.x.scatter_forward()
+
+    return gids
+
+
+ET.register_namespace("xi", "http://www.w3.org/2001/XInclude")
+
+
+def shared_mesh_file(job, comm):
+    """Return name of shared mesh file for a job
+
+    The shared mesh depends on the mesh and polycrystal inputs and the
+    options that change the grain IDs or the partition, and since the data
+    is written in the distributed ordering, also on the number of processes.
+    The file is in the "meshes" directory of the suite, and its name is given
+    relative to the output directory of the job.
+
+    Parameters
+    ----------
+    job: inputs.job.Job
+       the job
+    comm: MPI communicator
+       the communicator for the job
+
+    Returns
+    -------
+    str
+       name of shared mesh file, relative to the job's output directory
+    """
+    opts = job.run_options
+    mesh_spec = (job.mesh_input,)
+    if job.mesh_input.file is not None:
+        mesh_spec += file_signature(job.mesh_input.file)
+    # Grain IDs read with the mesh do not depend on the microstructure.
+    pinput = job.polycrystal_input
+    grains = None
+    if not pinput.use_meshtags:
+        grains = microstructure_spec(pinput.polycrystal)
+    key = spec_hash((
+        mesh_spec, grains, opts.grain_partition, opts.mesh_cache,
+        opts.subcell
+    ))
+    name = (
+        f"{job.mesh_input.name}-{job.polycrystal_input.name}"
+        f"-{key}-np{comm.size}.xdmf"
+    )
+    filename = job.suite_directory / "meshes" / name
+
+    return os.path.relpath(filename, job.output_directory)
+
+
+def write_shared_mesh(filename, msh, cell_tags, comm=None):
+    """Write mesh and grain IDs to shared file if it is not up to date
+
+    Parameters
+    ----------
+    filename: Path
+       name of shared mesh file
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    comm: MPI communicator, optional
+       communicator for the file; defaults to the mesh communicator
+    """
+    comm = msh.comm if comm is None else comm
+    num_cells = msh.topology.index_map(msh.topology.dim).size_global
+
+    current = None
+    if comm.rank == 0:
+        current = _shared_mesh_current(filename, num_cells)
+        if not current:
+            filename.parent.mkdir(parents=True, exist_ok=True)
+    current = comm.bcast(current, root=0)
+    if current:
+        return
+
+    # Write in a temporary directory first, so other jobs never read a
+    # partially written file. The XDMF file refers to the HDF5 file by name,
+    # so both keep their names, and the XDMF file is moved last.
+    tmpdir = filename.parent / f".{filename.stem}.{comm.bcast(os.getpid())}"
+    if comm.rank == 0:
+        tmpdir.mkdir(exist_ok=True)
+    comm.Barrier()
+    with io.XDMFFile(comm, tmpdir / filename.name, "w") as xfile:
+        xfile.write_mesh(msh)
+        xfile.write_meshtags(cell_tags, msh.geometry)
+    comm.Barrier()
+    if comm.rank == 0:
+        h5name = filename.with_suffix(".h5").name
+        os.replace(tmpdir / h5name, filename.parent / h5name)
+        os.replace(tmpdir / filename.name, filename)
+        tmpdir.rmdir()
+    comm.Barrier()
+
+
+def _shared_mesh_current(filename, num_cells):
+    """Check that shared mesh file exists and has the right number of cells"""
+    if not (filename.exists() and filename.with_suffix(".h5").exists()):
+        return False
+    try:
+        domain = ET.parse(filename).getroot()[0]
+        topo = domain.find("Grid").find("Topology")
+        return int(topo.get("Dimensions").split()[0]) == num_cells
+    except (ET.ParseError, AttributeError, TypeError, ValueError):
+        return False
+
+
+def link_shared_mesh(filename, shared_mesh):
+    """Add the grids of the shared mesh file to an XDMF output file
+
+    The mesh and meshtags grids of the shared mesh file are copied to the
+    start of the output file, with their HDF5 data paths pointing to the
+    shared HDF5 file. The output file then has the same structure as one
+    written with the mesh, but the mesh data is not duplicated.
+
+    Parameters
+    ----------
+    filename: Path
+       name of XDMF output file
+    shared_mesh: Path
+       name of shared mesh file
+    """
+    prefix = Path(os.path.relpath(shared_mesh.parent, filename.parent))
+    shared_domain = ET.parse(shared_mesh).getroot()[0]
+
+    tree = ET.parse(filename)
+    domain = tree.getroot()[0]
+    for i, grid in enumerate(shared_domain.findall("Grid")):
+        for item in grid.iter("DataItem"):
+            if item.get("Format") == "HDF":
+                h5file, h5path = item.text.strip().split(":")
+                item.text = f"{(prefix / h5file).as_posix()}:{h5path}"
+        domain.insert(i, grid)
+
+    tree.write(filename, xml_declaration=True, encoding="utf-8")
@@ -0,0 +1,137 @@
+"""Field values at probe points and on slices
+
+The cells containing the probe points are found with a bounding box tree of
+the mesh. The tree and the cells found for each set of points are cached
+with the mesh, so jobs that use the same mesh locate the points only once.
+"""
+import weakref
+
+import numpy as np
+
+from dolfinx.geometry import (
+    bb_tree, compute_collisions_points, compute_colliding_cells
+)
+
+
+_cache = weakref.WeakKeyDictionary()
+
+
+def locate_points(msh, points):
+    """Find local cells containing points
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    points: array (n, 3)
+       points to locate
+
+    Returns
+    -------
+    found: array
+       indices of points in cells owned by this process
+    cells: array
+       cell containing each found point
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    tdim = msh.topology.dim
+    mesh_cache = _cache.setdefault(msh, {})
+    key = points.tobytes()
+    if key in mesh_cache:
+        return mesh_cache[key]
+
+    if "tree" not in mesh_cache:
+        num_cells = msh.topology.index_map(tdim).size_local
+        mesh_cache["tree"] = bb_tree(
+            msh, tdim, np.arange(num_cells, dtype=np.int32)
+        )
+
+    candidates = compute_collisions_points(mesh_cache["tree"], points)
+    colliding = compute_colliding_cells(msh, candidates, points)
+    found, cells = [], []
+    for i in range(len(points)):
+        links = colliding.links(i)
+        if len(links) > 0:
+            found.append(i)
+            cells.append(links[0])
+
+    located = (
+        np.array(found, dtype=np.int32), np.array(cells, dtype=np.int32)
+    )
+    mesh_cache[key] = located
+
+    return located
+
+
+def evaluate(functions, points):
+    """Evaluate functions at points, gathering the values on process 0
+
+    Parameters
+    ----------
+    functions: dict
+       dolfinx Functions on the same mesh, by name
+    points: array (n, 3)
+       the points
+
+    Returns
+    -------
+    dict
+       arrays (n, m) of values by name, where `m` is the number of components;
+       points outside the mesh have NaN values; None except on process 0
+    """
+    if not functions:
+        return {}
+    msh = next(iter(functions.values())).function_space.mesh
+    found, cells = locate_points(msh, points)
+
+    local = {}
+    for name, f in functions.items():
+        if len(found) > 0:
+            local[name] = f.eval(points[found], cells)
+        else:
+            local[name] = np.zeros((0, f.function_space.dofmap.index_map_bs))
+
+    gathered = msh.comm.gather((found, local), root=0)
+    if msh.comm.rank != 0:
+        return None
+
+    values = {}
+    for name, f in functions.items():
+        bs = f.function_space.dofmap.index_map_bs
+        values[name] = np.full((len(points), bs), np.nan)
+        for found_r, local_r in gathered:
+            values[name][found_r] = local_r[name].reshape(len(found_r), bs)
+
+    return values
+
+
+def probe_values(probes, functions):
+    """Evaluate functions for a list of probes and slices
+
+    Parameters
+    ----------
+    probes: list of inputs.options.Probe or inputs.options.Slice
+       the probes
+    functions: dict
+       dolfinx Functions by name
+
+    Returns
+    -------
+    dict
+       arrays of values keyed by "<probe name>-<field name>", with the probe
+       points under "<probe name>-points"; for slices, the arrays are shaped
+       by the grid of points; empty except on process 0
+    """
+    results = {}
+    for probe in probes:
+        points = np.asarray(probe.points, dtype=np.float64)
+        names = functions if probe.fields is None else probe.fields
+        values = evaluate({n: functions[n] for n in names}, points)
+        if values is None:
+            continue
+        shape = getattr(probe, "shape", (len(points),))
+        results[f"{probe.name}-points"] = points.reshape(shape + (3,))
+        for name, v in values.items():
+            results[f"{probe.name}-{name}"] = v.reshape(shape + (-1,))
+
+    return results
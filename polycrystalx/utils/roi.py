@@ -0,0 +1,102 @@
+"""Region of interest output
+
+A region of interest (ROI) is given by a list of grain IDs, a bounding box,
+or both, in which case cells must satisfy both. The fields are transferred
+to a submesh of the ROI cells, so the output holds only those cells.
+"""
+import numpy as np
+
+from dolfinx import fem
+from dolfinx.mesh import compute_midpoints, create_submesh, meshtags
+
+
+def roi_cells(msh, cell_tags, grains=None, box=None):
+    """Find local cells in a region of interest
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    grains: list of int, optional
+       grain IDs of the region
+    box: array (d, 2), optional
+       lower and upper bounds of cell midpoints in each direction
+
+    Returns
+    -------
+    array
+       indices of local cells in the region
+    """
+    tdim = msh.topology.dim
+    num_cells = msh.topology.index_map(tdim).size_local
+    keep = np.ones(num_cells, dtype=bool)
+
+    if grains is not None:
+        in_grains = np.zeros(num_cells, dtype=bool)
+        owned = cell_tags.indices < num_cells
+        cells = cell_tags.indices[owned]
+        in_grains[cells] = np.isin(cell_tags.values[owned], grains)
+        keep &= in_grains
+
+    if box is not None:
+        box = np.asarray(box, dtype=np.float64)
+        dim = len(box)
+        x = compute_midpoints(
+            msh, tdim, np.arange(num_cells, dtype=np.int32)
+        )[:, :dim]
+        keep &= np.all((x >= box[:, 0]) & (x <= box[:, 1]), axis=1)
+
+    return np.flatnonzero(keep).astype(np.int32)
+
+
+def region_of_interest(msh, cell_tags, functions, grains=None, box=None):
+    """Transfer grain IDs and functions to a submesh of a region of interest
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh
+    cell_tags: dolfinx MeshTags
+       grain IDs
+    functions: list of dolfinx Function
+       functions to transfer
+    grains: list of int, optional
+       grain IDs of the region
+    box: array (d, 2), optional
+       lower and upper bounds of cell midpoints in each direction
+
+    Returns
+    -------
+    submesh: dolfinx Mesh
+       mesh of the region
+    sub_tags: dolfinx MeshTags
+       grain IDs on the submesh
+    sub_functions: list of dolfinx Function
+       functions on the submesh, with the same names and elements
+    """
+    tdim = msh.topology.dim
+    cells = roi_cells(msh, cell_tags, grains, box)
+    submesh, parent_cells, _, _ = create_submesh(msh, tdim, cells)
+    parent_cells = np.asarray(parent_cells, dtype=np.int32)
+
+    num_sub = submesh.topology.index_map(tdim).size_local
+    num_cells = msh.topology.index_map(tdim).size_local
+    gids = np.full(num_cells, -1, dtype=np.int32)
+    owned = cell_tags.indices < num_cells
+    gids[cell_tags.indices[owned]] = cell_tags.values[owned]
+    sub_gids = gids[parent_cells[:num_sub]]
+    tagged = np.flatnonzero(sub_gids >= 0).astype(np.int32)
+    sub_tags = meshtags(submesh, tdim, tagged, sub_gids[tagged])
+    sub_tags.name = cell_tags.name
+
+    sub_cells = np.arange(len(parent_cells), dtype=np.int32)
+    sub_functions = []
+    for f in functions:
+        V = fem.functionspace(submesh, f.function_space.ufl_element())
+        sub_f = fem.Function(V, name=f.name)
+        sub_f.interpolate(f, cells0=sub_cells, cells1=parent_cells)
+        sub_functions.append(sub_f)
+
+    return submesh, sub_tags, sub_functions
@@ -1,14 +1,60 @@
-"""Extended XDMFFile class to include read_function capability"""
+"""Extended XDMFFile class to include read_function capability
+
+dolfinx writes the rows of mesh and function data in the order of the
+distributed mesh of the writing run, which is not the input order of the
+nodes and cells. So the output also holds the input index of each node and
+cell as functions (see `index_functions`), and functions are read through
+them onto any distribution of the same mesh.
+"""
 from pathlib import Path
 import xml.etree.ElementTree as ET
 
 import numpy as np
 import h5py
 
-from dolfinx import fem, io
+from dolfinx import fem, io, log
 from mpi4py import MPI
 
 
+# Names of the functions holding the input indices, by data center.
+index_names = {
+    "Node": "input_node_index",
+    "Cell": "original_cell_index",
+}
+
+
+def index_functions(msh):
+    """Functions with the input indices of the nodes and cells
+
+    Parameters
+    ----------
+    msh: dolfinx Mesh
+       the mesh, with a degree 1 geometry
+
+    Returns
+    -------
+    list of dolfinx Function
+       P1 function of input node indices and DG0 function of original cell
+       indices
+    """
+    tdim = msh.topology.dim
+    num_cells = msh.topology.index_map(tdim).size_local
+
+    V = fem.functionspace(msh, ("Lagrange", 1))
+    nodes = fem.Function(V, name=index_names["Node"])
+    input_nodes = np.asarray(msh.geometry.input_global_indices)
+    # P1 dofs and geometry nodes follow the same cell vertex order.
+    nodes.x.array[V.dofmap.list] = input_nodes[msh.geometry.dofmap]
+
+    W = fem.functionspace(msh, ("DG", 0))
+    cells = fem.Function(W, name=index_names["Cell"])
+    original = np.asarray(msh.topology.original_cell_index)[:num_cells]
+    cells.x.array[W.dofmap.list[:num_cells, 0]] = original
+    cells.x.scatter_forward()
+
+    return [nodes, cells]
+
+
 class XDMFFile_Ext(io.XDMFFile):
     """XDMFFile extension for reading functions"""
 
@@ -24,7 +70,12 @@ class XDMFFile_Ext(io.XDMFFile):
         super().__init__(comm, filename, file_mode)
 
     def read_function(self, msh, name):
-        """Read function"""
+        """Read function
+
+        The input indices written with the function (see `index_functions`)
+        give the row of each node or cell of `msh`. Files without them are
+        taken to be in input order.
+        """
         # Read XML tree to find data element.
         tree = ET.parse(self._filename)
         root = tree.getroot()
@@ -39,36 +90,106 @@ class XDMFFile_Ext(io.XDMFFile):
         data_dims = data_item.get("Dimensions")
         nv, nc = shp = [int(i) for i in data_dims.split()]
 
-        root_path = Path(self._filename).parent
-        data_path = data_item.text
-        f, p = data_path.split(":")
-
-        # Now, load function data serially from HDF5.
-        with h5py.File(root_path / f, "r") as hfile:
-            dg = hfile[p]
-            values = dg[:].flatten()
-
         # Create fenicsx Function.
         V = self._fspace(msh, att_type, att_cent, shp)
         u = fem.Function(V)
 
+        num_cells = msh.topology.index_map(msh.topology.dim).size_local
         if att_cent == "Node":
             original_ind = np.array(msh.geometry.input_global_indices)
         elif att_cent == "Cell":
-            original_ind = np.array(msh.topology.original_cell_index)
+            original_ind = np.array(
+                msh.topology.original_cell_index
+            )[:num_cells]
         else:
             raise ValueError("Attribute center must be 'Node' or 'Cell'")
 
-        ind = np.tile(nc * original_ind, (nc, 1))
-        if nc > 1:
-            for i in range(1, nc):
-                ind[i, :] += i
-
-        u.x.array[:] = values[ind.T.flatten()]
+        # Now, load the local function data from HDF5.
+        try:
+            index_att = self._find_att(domain, index_names[att_cent])
+        except ValueError:
+            log.log(
+                log.LogLevel.WARNING,
+                f"{self._filename} has no input indices: reading {name} "
+                "in input order"
+            )
+            rows = original_ind
+        else:
+            f, p = self._data_path(index_att)
+            with h5py.File(f, "r") as hfile:
+                rows = self._find_rows(hfile[p], original_ind)
+        f, p = self._data_path(att)
+        with h5py.File(f, "r") as hfile:
+            values = self._read_rows(hfile[p], rows)
+
+        # The rows are for geometry nodes or owned cells; put them on the
+        # dofs.
+        dofs = u.x.array.reshape(-1, V.dofmap.index_map_bs)
+        if att_cent == "Node":
+            dofs[V.dofmap.list] = values[msh.geometry.dofmap]
+        else:
+            dofs[V.dofmap.list[:num_cells, 0]] = values
+        u.x.scatter_forward()
 
         return u
 
-    def _find_att(self, elem,  name):
+    def _data_path(self, att):
+        """HDF5 file and dataset path of an attribute"""
+        f, p = att[0].text.strip().split(":")
+        return Path(self._filename).parent / f, p
+
+    @staticmethod
+    def _find_rows(dset, indices, block_size=2**20):
+        """Find the rows of a dataset of indices holding the given indices
+
+        The dataset is read in blocks of rows, so the whole dataset is never
+        in memory at once.
+        """
+        rows = np.full(len(indices), -1, dtype=np.int64)
+        if len(indices) == 0:
+            return rows
+
+        order = np.argsort(indices)
+        sindices = indices[order]
+        for start in range(0, dset.shape[0], block_size):
+            block = np.rint(dset[start:start + block_size, 0]).astype(
+                np.int64
+            )
+            pos = np.minimum(
+                np.searchsorted(sindices, block), len(sindices) - 1
+            )
+            found = np.flatnonzero(sindices[pos] == block)
+            rows[order[pos[found]]] = start + found
+
+        if np.any(rows < 0):
+            raise ValueError("input indices not found in output file")
+
+        return rows
+
+    @staticmethod
+    def _read_rows(dset, rows, block_size=2**20):
+        """Read selected rows of a dataset
+
+        The dataset is read in blocks of rows, and only the blocks between
+        the smallest and largest selected rows are read, so the whole dataset
+        is never in memory at once.
+        """
+        values = np.empty((len(rows), dset.shape[1]), dtype=dset.dtype)
+        if len(rows) == 0:
+            return values
+
+        order = np.argsort(rows)
+        srows = rows[order]
+        for start in range(srows[0], srows[-1] + 1, block_size):
+            stop = min(start + block_size, dset.shape[0])
+            lo, hi = np.searchsorted(srows, [start, stop])
+            if hi > lo:
+                block = dset[start:stop]
+                values[order[lo:hi]] = block[srows[lo:hi] - start]
+
+        return values
+
+    def _find_att(self, elem, name):
         """find Attribute of elem with given name"""
         # First, find Grid by that name.
         grid = None
@@ -92,3 +213,4 @@ class XDMFFile_Ext(io.XDMFFile):
             etype += (((3, 3),),)
 
         return fem.functionspace(msh, etype)
+
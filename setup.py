@@ -8,6 +8,10 @@ entry_points = {
         "pxx_job = polycrystalx.scripts.run_job:main",
         "pxx_mpijob = polycrystalx.scripts.run_mpijob:main",
         "pxx_suite = polycrystalx.scripts.run_suite:main",
+        "pxx_worker = polycrystalx.scripts.run_worker:main",
+        "pxx_farm = polycrystalx.scripts.run_farm:main",
+        "pxx_post = polycrystalx.scripts.run_post:main",
+        "pxx_convert = polycrystalx.scripts.run_convert:main",
     ]
 }
 
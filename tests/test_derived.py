@@ -0,0 +1,62 @@
+"""Tests for derived quantities"""
+import numpy as np
+import pytest
+
+from polycrystalx import derived
+
+
+@pytest.fixture
+def stresses():
+    rng = np.random.default_rng(7)
+    a = rng.normal(size=(10, 3, 3))
+    return a + a.transpose(0, 2, 1)
+
+
+def test_uniaxial():
+
+    sig = np.zeros((1, 3, 3))
+    sig[0, 0, 0] = 2.
+    assert np.allclose(derived.von_mises(sig), 2.)
+    assert np.allclose(derived.pressure(sig), -2./3)
+    assert np.allclose(derived.invariants(sig), [[2., 4./3, 16./27]])
+
+
+def test_principal(stresses):
+
+    values, directions = derived.principal(stresses)
+    assert np.all(np.diff(values, axis=1) <= 0.)
+
+    diag = np.einsum("nji,njk,nkl->nil", directions, stresses, directions)
+    assert np.allclose(diag, values[:, :, None] * np.identity(3))
+
+
+def test_von_mises(stresses):
+
+    inv = derived.invariants(stresses)
+    assert np.allclose(derived.von_mises(stresses), np.sqrt(3 * inv[:, 1]))
+
+    shifted = stresses + 5. * np.identity(3)
+    assert np.allclose(derived.von_mises(shifted), derived.von_mises(stresses))
+
+
+def test_hotspots():
+
+    values = np.array([1., 5., 3., 2., 4., 0.])
+    gids = np.array([0, 1, 0, 1, 0, 2])
+
+    sel = derived.hotspots(values, gids, 2)
+    assert np.all(sel == [4, 2, 1, 3, 5])
+
+
+def test_compute(stresses):
+
+    fields = derived.compute(
+        ["principal_stress", "strain_energy"], stresses, stresses
+    )
+    assert set(fields) == {
+        "principal_stress", "principal_directions", "strain_energy"
+    }
+    assert fields["principal_stress"].shape == (10, 3)
+
+    with pytest.raises(ValueError, match="not available"):
+        derived.compute(["tresca"], stresses, stresses)
@@ -0,0 +1,50 @@
+"""Tests for grain-sorted layout"""
+import numpy as np
+
+from polycrystalx import grain_layout
+
+
+def test_positions():
+
+    gids = np.array([2, 0, 1, 0, 2, 2])
+    order, starts, counts, offsets = grain_layout.grain_positions(gids, 4)
+
+    assert np.all(order == [1, 3, 2, 0, 4, 5])
+    assert np.all(counts == [2, 1, 3, 0])
+    assert np.all(offsets == [0, 2, 3, 6, 6])
+    assert np.all(starts == offsets[:-1])
+
+
+def test_destinations():
+
+    # Grains of equal weight stay whole.
+    gids = np.repeat([2, 0, 1], 60)
+    assert np.all(grain_layout.grain_destinations(gids, 3) == 0)
+    dest = grain_layout.grain_destinations(gids, 3, num_parts=3)
+    for g in range(3):
+        assert len(np.unique(dest[gids == g])) == 1
+    assert sorted(np.unique(dest)) == [0, 1, 2]
+
+    # The heavy grain is split into three pieces on different parts, and the
+    # light grains share the fourth part. Untagged cells do not move.
+    gids = np.concatenate([np.repeat([0, 1, 2], [100, 20, 20]), [-1]])
+    dest = grain_layout.grain_destinations(gids, 3, num_parts=4)
+    assert np.all(np.bincount(dest[:-1]) == [34, 34, 32, 40])
+    assert np.all(dest[100:140] == 3)
+    assert dest[-1] == 0
+
+
+def test_write_read(tmp_path):
+
+    fname = tmp_path / "grain-sorted.h5"
+    gids = np.array([2, 0, 1, 0, 2, 2])
+    cells = np.arange(6) + 10
+    stress = np.arange(6 * 9, dtype=float).reshape(6, 3, 3)
+    grain_layout.write(fname, gids, cells, {"stress": stress}, 4)
+
+    gsf = grain_layout.GrainSortedFile(fname)
+    assert gsf.num_grains == 4
+    assert gsf.fields() == ["stress"]
+    assert np.all(gsf.cells(2) == [10, 14, 15])
+    assert np.all(gsf.grain(0, "stress") == stress[[1, 3]].reshape(2, 9))
+    assert gsf.grain(3, "stress").shape == (0, 9)
@@ -0,0 +1,107 @@
+"""Tests for input hashing"""
+import threading
+
+import numpy as np
+import pytest
+
+from polycrystalx import inputs
+from polycrystalx.inputs.hashing import spec_hash, file_signature
+from polycrystalx.inputs.polycrystal import microstructure_spec
+
+
+def box(divisions=(2, 2, 2)):
+    return inputs.mesh.Mesh(
+        name="box", source="box", extents=[[0, 1], [0, 1], [0, 1]],
+        divisions=divisions, celltype="tetrahedron",
+    )
+
+
+def test_spec_hash():
+
+    assert spec_hash(box()) == spec_hash(box())
+    assert spec_hash(box()) != spec_hash(box((2, 2, 3)))
+    assert spec_hash(np.zeros(3)) != spec_hash(np.zeros(4))
+
+    on_x = lambda x: x[0] < 0.5
+    on_y = lambda x: x[1] < 0.5
+    assert spec_hash(on_x) != spec_hash(on_y)
+
+
+def test_object_hash():
+
+    class Seeds:
+        def __init__(self, seeds):
+            self.seeds = seeds
+
+    assert spec_hash(Seeds(np.zeros(3))) == spec_hash(Seeds(np.zeros(3)))
+    assert spec_hash(Seeds(np.zeros(3))) != spec_hash(Seeds(np.ones(3)))
+
+
+def test_file_signature(tmp_path):
+
+    fname = tmp_path / "mesh.msh"
+    assert len(file_signature(fname)) == 1
+
+    fname.write_text("mesh")
+    assert file_signature(fname)[1] == 4
+
+
+def test_microstructure_spec(tmp_path):
+
+    fname = tmp_path / "grains.npy"
+    np.save(fname, np.zeros((2, 2, 2), dtype=np.int32))
+    voxels = inputs.polycrystal.Voxels(str(fname), np.zeros((1, 3, 3)))
+    spec = microstructure_spec(voxels)
+
+    # Orientations do not change the grain IDs; the image file does.
+    reoriented = voxels._replace(orientations=np.ones((1, 3, 3)))
+    assert spec_hash(microstructure_spec(reoriented)) == spec_hash(spec)
+    np.save(fname, np.zeros((2, 2, 3), dtype=np.int32))
+    assert spec_hash(microstructure_spec(voxels)) != spec_hash(spec)
+
+
+def test_function_hash():
+
+    make = lambda xmax: (lambda x: np.isclose(x[0], xmax))
+    assert spec_hash(make(1.)) == spec_hash(make(1.))
+    assert spec_hash(make(1.)) != spec_hash(make(2.))
+
+    def f(x, a=1.):
+        return a * x
+
+    def g(x, a=2.):
+        return a * x
+
+    g.__qualname__ = f.__qualname__
+    assert spec_hash(f) != spec_hash(g)
+
+    ns1, ns2 = {"xmax": 1.}, {"xmax": 2.}
+    source = "def on_right(x):\n    return x[0] > xmax\n"
+    exec(source, ns1)
+    exec(source, ns2)
+    assert spec_hash(ns1["on_right"]) != spec_hash(ns2["on_right"])
+
+
+def test_unhashable():
+
+    with pytest.raises(TypeError):
+        spec_hash(threading.Lock())
+
+
+def test_self_reference():
+
+    class Node:
+        pass
+
+    node = Node()
+    node.parent = node
+    loop = [1]
+    loop.append(loop)
+    with pytest.raises(TypeError, match="refers to itself"):
+        spec_hash(node)
+    with pytest.raises(TypeError, match="refers to itself"):
+        spec_hash({"a": loop})
+
+    # Shared values are not loops.
+    shared = [1, 2]
+    assert spec_hash([shared, shared]) == spec_hash([[1, 2], [1, 2]])
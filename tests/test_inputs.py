@@ -1,4 +1,6 @@
 """Tests for inputs"""
+import json
+
 import numpy as np
 import pytest
 
@@ -75,3 +77,148 @@ class TestFunctionInputs:
 
         with pytest.raises(RuntimeError, match='no valid'):
             inp = inputs.function.Function(source="something-else")
+
+
+class TestOptionsInputs:
+
+    def test_defaults(self):
+
+        opts = inputs.options.Options(name="test")
+        assert opts.output_format == "xdmf"
+
+    def test_check_inputs(self):
+
+        with pytest.raises(RuntimeError, match="output format"):
+            inp = inputs.options.Options(name="test", output_format="vtk")
+
+        with pytest.raises(RuntimeError, match="output_queue_size"):
+            inp = inputs.options.Options(name="test", output_queue_size=0)
+
+        with pytest.raises(RuntimeError, match="derived field"):
+            inp = inputs.options.Options(name="test", derived_fields=["vm"])
+
+        with pytest.raises(RuntimeError, match="hotspots"):
+            inp = inputs.options.Options(name="test", hotspots=-1)
+
+        with pytest.raises(RuntimeError, match="roi_box"):
+            inp = inputs.options.Options(name="test", roi_box=[[1, 0]])
+
+        with pytest.raises(RuntimeError, match="adaptive marker"):
+            inp = inputs.options.Options(
+                name="test", adaptive=inputs.options.Adaptive(marker="zz")
+            )
+
+        with pytest.raises(RuntimeError, match="subcell mixing"):
+            inp = inputs.options.Options(
+                name="test", subcell=inputs.options.Subcell(mixing="mean")
+            )
+
+        with pytest.raises(RuntimeError, match="num_threads"):
+            inp = inputs.options.Options(name="test", num_threads=0)
+
+        study = inputs.options.Convergence(divisions=[4, 8, 16])
+        with pytest.raises(RuntimeError, match="cannot be used together"):
+            inp = inputs.options.Options(
+                name="test", convergence=study,
+                adaptive=inputs.options.Adaptive()
+            )
+
+        with pytest.raises(RuntimeError, match="shared_mesh"):
+            inp = inputs.options.Options(
+                name="test", convergence=study, shared_mesh=True
+            )
+
+        with pytest.raises(RuntimeError, match="submodel extents"):
+            inp = inputs.options.Options(
+                name="test", submodel=inputs.options.Submodel(
+                    extents=[[0, 1], [1, 0], [0, 1]], divisions=8
+                )
+            )
+
+        with pytest.raises(RuntimeError, match="convergence fields"):
+            inp = inputs.options.Options(
+                name="test", convergence=study._replace(fields=["vm"])
+            )
+
+    def test_roi(self):
+
+        assert not inputs.options.Options(name="test").roi
+        assert inputs.options.Options(name="test", roi_grains=[3]).roi
+
+
+class TestProbeInputs:
+
+    def test_slice_points(self):
+
+        slc = inputs.options.Slice(
+            name="mid", origin=[0.5, 0.5, 0.5], normal=[0, 0, 2],
+            extents=[[-0.5, 0.5], [-0.5, 0.5]], divisions=(4, 2)
+        )
+        axes = slc.axes
+        assert np.allclose(axes @ axes.T, np.identity(2))
+        assert np.allclose(axes @ [0, 0, 1], 0.)
+
+        points = slc.points
+        assert slc.shape == (5, 3)
+        assert points.shape == (15, 3)
+        assert np.allclose(points[:, 2], 0.5)
+
+
+class TestJobInputs:
+
+    @pytest.fixture
+    def job(self):
+        return inputs.job.Job(
+            suite="test-suite",
+            process="linear-elasticity",
+            mesh_input=inputs.mesh.Mesh(
+                name="mesh", source="box", extents=[[0, 1], [0, 1], [0, 1]],
+                divisions=(2, 2, 2), celltype="tetrahedron",
+            ),
+            material_input=inputs.material.LinearElasticity(
+                name="matl", materials=[]
+            ),
+            polycrystal_input=inputs.polycrystal.Polycrystal(
+                name="poly", polycrystal=None
+            ),
+            deformation_input=inputs.deformation.LinearElasticity(
+                name="defm"
+            ),
+        )
+
+    def test_output_names(self, job):
+
+        assert str(job.suite_directory) == "Outputs/test-suite"
+        assert job.results_key == "linear-elasticity/matl-mesh-poly-defm"
+        assert job.run_options is inputs.options.default_options
+
+    def test_completion(self, job, tmp_path, monkeypatch):
+
+        record = job.input_record
+        assert record["version"] == inputs.job.package_version()
+        mesh_input = job.mesh_input._replace(divisions=(2, 2, 3))
+        changed = job._replace(mesh_input=mesh_input).input_record
+        assert changed["input_hash"] != record["input_hash"]
+        assert changed["material"] == record["material"]
+
+        monkeypatch.chdir(tmp_path)
+        assert not job.is_complete()
+        job.output_directory.mkdir(parents=True)
+        with open(job.completion_file, "w") as f:
+            json.dump(record, f)
+        assert job.is_complete()
+        assert not job._replace(mesh_input=mesh_input).is_complete()
+
+    def test_voxel_file_record(self, job, tmp_path):
+
+        npy = tmp_path / "grains.npy"
+        np.save(npy, np.zeros((2, 2, 2), dtype=int))
+        voxels = inputs.polycrystal.Voxels(str(npy), np.identity(3)[None])
+        poly_input = job.polycrystal_input._replace(polycrystal=voxels)
+        job = job._replace(polycrystal_input=poly_input)
+        record = job.input_record
+
+        np.save(npy, np.zeros((2, 2, 3), dtype=int))
+        changed = job.input_record
+        assert changed["polycrystal"] != record["polycrystal"]
+        assert changed["input_hash"] != record["input_hash"]
@@ -1,10 +1,13 @@
 """Tests for loaders"""
+from types import SimpleNamespace
+
 import numpy as np
 import pytest
 from dolfinx import fem
+from mpi4py import MPI
 import ufl
 
-from polycrystalx import inputs
+from polycrystalx import inputs, processes
 from polycrystalx.loaders.mesh import MeshLoader
 from polycrystalx.loaders.function import FunctionLoader
 from polycrystalx.loaders.deformation import (
@@ -106,6 +109,220 @@ def test_mesh(mesh_loader):
     )
 
 
+def test_boundary_sections(mesh_loader):
+
+    import dolfinx
+
+    msh, bdim = mesh_loader.mesh, mesh_loader.bdim
+    bd = mesh_loader.boundary_dict
+    on_xmax = lambda x: np.isclose(x[0], 1.)
+    expected = dolfinx.mesh.locate_entities_boundary(msh, bdim, on_xmax)
+    assert np.all(np.sort(bd["xmax"]) == np.sort(expected))
+
+    on_corner = lambda x: (x[0] < 0.6) & (x[2] < 0.7)
+    bd.add("corner", on_corner)
+    expected = dolfinx.mesh.locate_entities_boundary(msh, bdim, on_corner)
+    assert len(expected) > 0
+    assert np.all(np.sort(bd["corner"]) == np.sort(expected))
+
+
+def test_mesh_communicator(mesh_input):
+
+    loader = MeshLoader(mesh_input, comm=MPI.COMM_SELF)
+    assert loader.mesh.comm.size == 1
+    assert loader.cache_key.endswith("-np1")
+    assert loader.mesh.topology.index_map(3).size_local == 6 * 30
+
+
+def test_mesh_cache(mesh_input, tmp_path):
+
+    first = MeshLoader(mesh_input, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.h5"))) == 1
+
+    second = MeshLoader(mesh_input, cache_dir=tmp_path)
+    m1, m2 = first.mesh, second.mesh
+    imap1 = m1.topology.index_map(3)
+    imap2 = m2.topology.index_map(3)
+    assert imap1.size_global == imap2.size_global
+    assert np.all(
+        np.sort(m1.topology.original_cell_index[:imap1.size_local])
+        == np.sort(m2.topology.original_cell_index[:imap2.size_local])
+    )
+    assert set(second.boundary_dict) == set(first.boundary_dict)
+
+
+def test_repartition_by_grain(mesh_loader):
+
+    import dolfinx
+    from polycrystalx.loaders.mesh.grain_partition import grain_fragmentation
+
+    msh = mesh_loader.mesh
+    num_cells = msh.topology.index_map(3).size_local
+    cells = np.arange(num_cells, dtype=np.int32)
+    x = dolfinx.mesh.compute_midpoints(msh, 3, cells)
+    gids = np.floor(x[:, 2]).astype(np.int32)
+    tags = dolfinx.mesh.meshtags(msh, 3, cells, gids)
+
+    new_tags = mesh_loader.repartition_by_grain(tags, 3)
+    new_mesh = mesh_loader.mesh
+    new_num = new_mesh.topology.index_map(3).size_local
+    comm = new_mesh.comm
+    assert comm.allreduce(new_num) == comm.allreduce(num_cells)
+    assert comm.allreduce(len(new_tags.values)) == comm.allreduce(len(gids))
+
+    stats = grain_fragmentation(comm, new_tags, new_num, 3)
+    if comm.size <= 2:
+        assert stats["split_grains"] == 0
+
+
+def test_voxel_aligned_tags(mesh_input):
+
+    from polycrystalx.loaders.polycrystal import Polycrystal
+
+    hex_input = mesh_input._replace(celltype="hexahedron")
+    loader = MeshLoader(hex_input)
+    image = np.arange(30).reshape(2, 3, 5)
+    voxels = inputs.polycrystal.Voxels(
+        image, np.tile(np.identity(3), (30, 1, 1)), spacing=[0.5, 2/3, 0.6]
+    )
+    pdata = Polycrystal(
+        inputs.polycrystal.Polycrystal(name="voxels", polycrystal=voxels)
+    )
+    grid = loader.structured_grid
+    assert pdata.voxel_aligned(grid)
+    assert MeshLoader(mesh_input).structured_grid is None
+
+    fast = pdata.grain_cell_tags(loader.mesh, grid)
+    slow = pdata.grain_cell_tags(loader.mesh)
+    assert np.all(fast.values == slow.values)
+
+
+def test_subcell_samples(mesh_loader):
+
+    from polycrystalx.loaders.polycrystal import Polycrystal
+
+    # Grain boundary at z = 1.5, through the middle of a layer of cells.
+    voxels = inputs.polycrystal.Voxels(
+        np.array([[[0, 1]]]), np.tile(np.identity(3), (2, 1, 1)),
+        spacing=[1., 2., 1.5]
+    )
+    pdata = Polycrystal(
+        inputs.polycrystal.Polycrystal(name="voxels", polycrystal=voxels)
+    )
+    samples, fractions = pdata.sample_grains(mesh_loader.mesh, 2)
+    assert np.isclose(np.sum(fractions), 1.)
+    assert samples.shape[1] == len(fractions)
+
+    # The straddling layer of cells is split between the grains.
+    from polycrystalx.utils import grain_averages
+    msh = mesh_loader.mesh
+    tags = pdata.grain_cell_tags(msh, samples=(samples, fractions))
+    x = ufl.SpatialCoordinate(msh)
+    volumes, _ = grain_averages(
+        msh, tags, 2, {"z": x[2]}, samples=(samples, fractions)
+    )
+    assert np.isclose(np.sum(volumes), 6.)
+    assert np.all(np.abs(volumes - 3.) < 0.6)
+
+    gids = Polycrystal.dominant_grain(
+        np.array([[0, 1, 1], [2, 2, 0]]), np.array([0.5, 0.25, 0.25])
+    )
+    assert np.all(gids == [0, 2])
+
+
+def test_chunked_grain_lookup(mesh_loader):
+
+    import dolfinx
+    from polycrystalx.loaders.polycrystal import Polycrystal
+
+    class Seeds:
+        seeds = np.random.default_rng(0).random((20, 3)) * [1, 2, 3]
+        num_grains = 20
+        orientation_list = np.tile(np.identity(3), (20, 1, 1))
+
+        def grain(self, x):
+            d = np.linalg.norm(x[:, None, :] - self.seeds[None], axis=2)
+            return np.argmin(d, axis=1)
+
+    poly_input = inputs.polycrystal.Polycrystal(
+        name="seeds", polycrystal=Seeds()
+    )
+    msh = mesh_loader.mesh
+    whole = Polycrystal(poly_input, chunk_size=10**6, num_threads=1)
+    chunked = Polycrystal(
+        poly_input._replace(voronoi_seeds=True), chunk_size=7, num_threads=4
+    )
+    tags = chunked.grain_cell_tags(msh)
+
+    num_cells = msh.topology.index_map(3).size_local
+    x = dolfinx.mesh.compute_midpoints(
+        msh, 3, np.arange(num_cells, dtype=np.int32)
+    )
+    assert np.all(tags.values == Seeds().grain(x))
+    assert np.all(whole.grain_cell_tags(msh).values == tags.values)
+
+
+def test_tag_cache(mesh_input, tmp_path):
+
+    from polycrystalx.loaders.polycrystal import Polycrystal
+    from polycrystalx.loaders.tag_cache import (
+        load_grain_tags, tag_cache_key
+    )
+
+    image = np.arange(8).reshape(2, 2, 2)
+    voxels = inputs.polycrystal.Voxels(
+        image, np.tile(np.identity(3), (8, 1, 1)), spacing=[0.5, 1., 1.5]
+    )
+    rotated = voxels._replace(orientations=np.zeros((8, 3, 3)))
+    assert tag_cache_key("m", voxels) == tag_cache_key("m", rotated)
+    assert tag_cache_key("m", voxels) != tag_cache_key("m", voxels, 2)
+
+    pdata = Polycrystal(
+        inputs.polycrystal.Polycrystal(name="voxels", polycrystal=voxels)
+    )
+    msh = MeshLoader(mesh_input).mesh
+    fname = tmp_path / "tags.h5"
+    tags, samples = load_grain_tags(pdata, msh, filename=fname)
+    assert samples is None
+
+    msh2 = MeshLoader(mesh_input).mesh
+    tags2, _ = load_grain_tags(pdata, msh2, filename=fname)
+    assert np.all(tags2.values == tags.values)
+
+
+def test_function_round_trip(mesh_input, mesh_loader, tmp_path):
+
+    import dolfinx
+    from polycrystalx.utils import XDMFFile_Ext
+    from polycrystalx.utils.output import XDMFOutput
+
+    def u_value(x):
+        return np.array([x[0], x[1] + 2 * x[2], x[0] * x[2]])
+
+    def functions(msh):
+        u = fem.Function(fem.functionspace(msh, ("P", 1, (3,))), name="u")
+        u.interpolate(u_value)
+        s = fem.Function(fem.functionspace(msh, ("DG", 0)), name="s")
+        s.interpolate(lambda x: x[0] + 10 * x[1] + 100 * x[2])
+        return u, s
+
+    msh = mesh_loader.mesh
+    num_cells = msh.topology.index_map(3).size_local
+    cells = np.arange(num_cells, dtype=np.int32)
+    tags = dolfinx.mesh.meshtags(msh, 3, cells, np.zeros_like(cells))
+    basename = str(tmp_path / "output")
+    with XDMFOutput(msh, tags, functions(msh), basename=basename) as output:
+        output.write()
+
+    # The data is read onto a new distribution of the same mesh.
+    new_mesh = MeshLoader(mesh_input).mesh
+    expected = functions(new_mesh)
+    with XDMFFile_Ext(new_mesh.comm, basename + ".xdmf", "r") as xfile:
+        for f in expected:
+            g = xfile.read_function(new_mesh, f.name)
+            assert np.allclose(g.x.array, f.x.array)
+
+
 class TestLinearElasticity:
 
     @pytest.fixture
@@ -181,3 +398,47 @@ class TestHeatTransfer:
 
         flux_bc0 = ldr.flux_bcs(V, bdict)[0]
         assert isinstance(flux_bc0.ds, ufl.Measure)
+
+
+def test_warm_worker(mesh_input, vector_function, tensor_function, tmp_path,
+                     monkeypatch):
+    """A reused problem gives the same solution as a new one"""
+    def job(name, thermal_expansion):
+        crystal = SimpleNamespace(stiffness=np.identity(6))
+        voxels = inputs.polycrystal.Voxels(
+            np.zeros((1, 1, 1), dtype=int), np.identity(3)[None],
+            spacing=3.0,
+        )
+        return inputs.job.Job(
+            suite="warm",
+            process="linear-elasticity",
+            mesh_input=mesh_input,
+            material_input=inputs.material.LinearElasticity(
+                name="matl", materials=[crystal]
+            ),
+            polycrystal_input=inputs.polycrystal.Polycrystal(
+                name="poly", polycrystal=voxels
+            ),
+            deformation_input=inputs.deformation.LinearElasticity(
+                name=name,
+                force_density=vector_function,
+                thermal_expansion=thermal_expansion,
+                displacement_bcs=[inputs.deformation.DisplacementBC(
+                    "xmin", inputs.deformation.boundary_values_template
+                )],
+            ),
+        )
+
+    def displacement(worker, job):
+        worker.run(job)
+        return worker.loaders[job.process].linear_problem.u.x.array.copy()
+
+    monkeypatch.chdir(tmp_path)
+    warm = processes.Worker(comm=MPI.COMM_SELF)
+    displacement(warm, job("thermal", tensor_function))
+    u_warm = displacement(warm, job("force", None))
+    u_cold = displacement(
+        processes.Worker(comm=MPI.COMM_SELF), job("force", None)
+    )
+
+    assert np.allclose(u_warm, u_cold)
@@ -0,0 +1,62 @@
+"""Tests for stiffness mixing"""
+import numpy as np
+import pytest
+
+from polycrystalx import mixing
+
+
+def rotation(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, -s, 0.], [s, c, 0.], [0., 0., 1.]])
+
+
+def to6(A):
+    r2 = np.sqrt(2.)
+    return np.array([
+        A[0, 0], A[1, 1], A[2, 2], r2 * A[1, 2], r2 * A[2, 0], r2 * A[0, 1]
+    ])
+
+
+def cubic(c11, c12, c44):
+    C = np.full((3, 3), c12) + (c11 - c12) * np.identity(3)
+    return np.block([
+        [C, np.zeros((3, 3))], [np.zeros((3, 3)), 2 * c44 * np.identity(3)]
+    ])
+
+
+def test_mandel_rotation():
+
+    R = rotation(0.3)
+    A = np.array([[1., 2., 3.], [2., 4., 5.], [3., 5., 6.]])
+    Q = mixing.mandel_rotation(R[None])[0]
+
+    assert np.allclose(Q @ to6(A), to6(R @ A @ R.T))
+    assert np.allclose(Q @ Q.T, np.identity(6))
+
+
+def test_frames():
+
+    C = cubic(3., 1., 0.5)[None]
+    R = rotation(0.7)[None]
+
+    assert np.allclose(mixing.to_crystal(mixing.to_sample(C, R), R), C)
+
+
+def test_mix():
+
+    C = np.stack([cubic(3., 1., 0.5), cubic(6., 2., 1.)])[None]
+    f = np.array([[0.25, 0.75]])
+
+    voigt = mixing.mix(C, f, "voigt")
+    reuss = mixing.mix(C, f, "reuss")
+    hill = mixing.mix(C, f, "hill")
+    assert np.allclose(voigt[0], cubic(5.25, 1.75, 0.875))
+    # Compliances scale inversely, so Reuss is the harmonic mean.
+    assert np.allclose(reuss[0], cubic(3., 1., 0.5) / (0.25 + 0.75 / 2))
+    assert np.allclose(hill, 0.5 * (voigt + reuss))
+
+    same = mixing.mix(np.stack([C[0, 0], C[0, 0]])[None], f)
+    assert np.allclose(same[0], C[0, 0])
+
+    with pytest.raises(ValueError, match="mixing rule"):
+        mixing.mix(C, f, "average")
@@ -0,0 +1,60 @@
+"""Tests for suite results store"""
+import numpy as np
+import pytest
+
+from polycrystalx.results import ResultsStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(tmp_path / "results.h5", chunks=(2, 2))
+
+
+def averages(num_grains, scale):
+    return {
+        "volume": scale * np.arange(num_grains),
+        "strain": scale * np.ones((num_grains, 6)),
+    }
+
+
+def test_append(store):
+
+    store.append("job-0", averages(5, 1.))
+    store.append("job-1", averages(5, 2.))
+
+    assert store.keys() == ["job-0", "job-1"]
+    assert set(store.quantities()) == {"volume", "strain"}
+
+    job = store.job("job-1")
+    assert np.all(job["strain"] == 2.)
+
+    g3 = store.grain(3, "volume")
+    assert np.all(g3 == [3., 6.])
+
+    strain = store.read("strain", jobs=["job-1"], grains=slice(0, 2))
+    assert strain.shape == (1, 2, 6)
+
+    with pytest.raises(KeyError, match="not found"):
+        store.job("job-2")
+
+
+def test_replace(store):
+
+    store.append("job-0", averages(5, 1.))
+    store.append("job-0", averages(5, 3.))
+
+    assert store.keys() == ["job-0"]
+    assert np.all(store.job("job-0")["strain"] == 3.)
+
+
+def test_missing_values(store):
+
+    store.append("job-0", averages(3, 1.))
+    store.append("job-1", {"temperature": np.ones(5)})
+
+    job0 = store.job("job-0")
+    assert np.all(np.isnan(job0["temperature"]))
+    assert np.all(np.isnan(job0["volume"][3:]))
+
+    job1 = store.job("job-1")
+    assert np.all(np.isnan(job1["strain"]))
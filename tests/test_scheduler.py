@@ -0,0 +1,72 @@
+"""Tests for the concurrent job scheduler"""
+import sys
+
+import numpy as np
+
+from polycrystalx import scheduler
+from polycrystalx.inputs.mesh import Mesh
+
+
+def test_estimate_cells():
+
+    extents = [[0., 1.], [0., 1.], [0., 1.]]
+    tet = Mesh("tet", "box", extents, (2, 3, 4), "tetrahedron")
+    assert scheduler.estimate_cells(tet) == 6 * 24
+    hex_ = Mesh("hex", "box", extents, 5, "hexahedron")
+    assert scheduler.estimate_cells(hex_) == 125
+    msh = Mesh("file", "gmsh", file="grains.msh")
+    assert scheduler.estimate_cells(msh) is None
+
+
+def test_choose_ranks():
+
+    assert scheduler.choose_ranks(100, 1000, 8) == 1
+    assert scheduler.choose_ranks(2500, 1000, 8) == 3
+    assert scheduler.choose_ranks(10**6, 1000, 8) == 8
+    assert scheduler.choose_ranks(None, 1000, 8, default=4) == 4
+
+
+def test_run_jobs(tmp_path):
+
+    def job(name, ranks, code):
+        cmd = [
+            sys.executable, "-c", f"print('{name}'); exit({code})", "{cores}"
+        ]
+        return scheduler.ScheduledJob(
+            name, cmd, ranks, tmp_path / name / "job.log"
+        )
+
+    # The large job asks for more than the cores and runs alone.
+    jobs = [job("a", 2, 0), job("b", 3, 1), job("c", 1, 0), job("d", 9, 0)]
+    summary = scheduler.run_jobs(jobs, 4)
+
+    assert summary["returncodes"] == [0, 1, 0, 0]
+    for name in "abcd":
+        assert (tmp_path / name / "job.log").read_text().strip() == name
+    assert 0. < summary["utilization"] <= 1.
+    assert np.isclose(
+        summary["jobs_per_hour"], 3600. * 4 / summary["elapsed"]
+    )
+
+
+def test_job_cores(tmp_path):
+
+    def job(name, ranks):
+        cmd = [sys.executable, "-c", "import sys; print(sys.argv[1])",
+               "{cores}"]
+        return scheduler.ScheduledJob(
+            name, cmd, ranks, tmp_path / name / "job.log"
+        )
+
+    # The first two jobs run together on their own cores.
+    jobs = [job("a", 2), job("b", 3), job("c", 1), job("d", 9)]
+    scheduler.run_jobs(jobs, 4)
+
+    core_ids = {}
+    for name in "abcd":
+        text = (tmp_path / name / "job.log").read_text().strip()
+        core_ids[name] = [int(c) for c in text.split(",")]
+    assert core_ids["a"] == [0, 1]
+    assert core_ids["c"] == [2]
+    assert len(core_ids["b"]) == 3
+    assert core_ids["d"] == [0, 1, 2, 3]
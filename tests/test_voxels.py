@@ -0,0 +1,94 @@
+"""Tests for voxel image microstructures"""
+import numpy as np
+import h5py
+
+from polycrystalx import inputs
+from polycrystalx.loaders.voxels import VoxelMicrostructure, voxel_indices
+
+
+ORIENTATIONS = np.tile(np.identity(3), (24, 1, 1))
+
+
+def image():
+    return np.arange(24).reshape(2, 3, 4)
+
+
+def points():
+    return np.array([
+        [0.1, 0.1, 0.1],
+        [1.9, 2.9, 3.9],
+        [1.5, 0.5, 2.5],
+        [5.0, -1.0, 2.5],
+    ])
+
+
+def test_indices():
+
+    ijk = voxel_indices(points(), np.zeros(3), 1.0, (2, 3, 4))
+    assert np.all(ijk == [[0, 0, 0], [1, 2, 3], [1, 0, 2], [1, 0, 2]])
+
+
+def test_array():
+
+    vx = inputs.polycrystal.Voxels(image(), ORIENTATIONS)
+    ms = VoxelMicrostructure(vx)
+
+    assert ms.num_grains == 24
+    assert np.all(ms.grain(points()) == [0, 23, 14, 14])
+    assert np.all(ms.phase(np.array([3])) == 0)
+
+
+def test_origin_spacing():
+
+    vx = inputs.polycrystal.Voxels(
+        image(), ORIENTATIONS, origin=[1., 1., 1.], spacing=[0.5, 1., 2.]
+    )
+    ms = VoxelMicrostructure(vx)
+    p = np.array([[1.6, 2.5, 3.5]])
+
+    assert np.all(ms.grain(p) == image()[1, 1, 1])
+
+
+def test_files(tmp_path):
+
+    npy = tmp_path / "grains.npy"
+    np.save(npy, image())
+    h5 = tmp_path / "grains.h5"
+    with h5py.File(h5, "w") as f:
+        f["ids"] = image().T
+
+    ms_npy = VoxelMicrostructure(
+        inputs.polycrystal.Voxels(str(npy), ORIENTATIONS)
+    )
+    ms_h5 = VoxelMicrostructure(
+        inputs.polycrystal.Voxels(
+            str(h5), ORIENTATIONS, dataset="ids", order="zyx"
+        )
+    )
+    expected = [0, 23, 14, 14]
+
+    assert np.all(ms_npy.grain(points()) == expected)
+    assert np.all(ms_h5.grain(points()) == expected)
+
+
+def test_aligned():
+
+    vx = inputs.polycrystal.Voxels(
+        image(), ORIENTATIONS, origin=[1., 1., 1.], spacing=0.5
+    )
+    ms = VoxelMicrostructure(vx)
+    lower = np.ones(3)
+
+    assert ms.aligned((lower, np.full(3, 0.5), (2, 3, 4)))
+    assert not ms.aligned((lower, np.full(3, 0.5), (4, 3, 2)))
+    assert not ms.aligned((lower, np.full(3, 0.25), (2, 3, 4)))
+
+
+def test_voxel_grain():
+
+    ms = VoxelMicrostructure(inputs.polycrystal.Voxels(image(), ORIENTATIONS))
+    # Flat index ix + nx * (iy + ny * iz), as for hexahedral box meshes.
+    ix, iy, iz = 1, 2, 3
+    index = np.array([0, ix + 2 * (iy + 3 * iz)])
+
+    assert np.all(ms.voxel_grain(index) == [0, image()[ix, iy, iz]])